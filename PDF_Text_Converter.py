@@ -1,63 +1,458 @@
 import os
-import PyPDF2
 import re
+import sys
+import signal
+import multiprocessing
+import threading
+import time
 
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() + '\n\n'
-    return text
+from chunk_writer import TextChunkWriter
+from near_duplicates import NearDuplicateIndex
+from pdf_engines import (DEFAULT_ENGINE, EngineStats, extract_range_with_fallback, extract_with_fallback,
+                         make_engines, rank_engines)
+from pdf_manifest import MANIFEST_FILENAME, PdfManifest
+import metrics
 
-def process_text(text, pdf_path):
+# PDFs of at least this many bytes are memory-mapped and extracted a range of
+# pages at a time, their text streamed to the output page by page
+LARGE_PDF_BYTES = 10 * 1024 * 1024
+# Pages per range; with a process pool each range is a separate task
+PAGES_PER_TASK = 50
+# Seconds allowed per PDF (or range) in the pool. A PDF that kills its worker
+# never sends a result, so there is always a limit on waiting for one
+EXTRACTION_TIMEOUT = 300
+# Extra seconds to wait for a result past the timeout before counting it lost
+RESULT_MARGIN = 5
+
+def join_pages(pages):
+    return ''.join(page + '\n\n' for page in pages)
+
+def extract_text_from_pdf(pdf_path, engine=DEFAULT_ENGINE):
+    """Text of pdf_path; engine is one or more engines as for pdf_engines.make_engines"""
+    pages, engine_name, attempts = extract_with_fallback(pdf_path, make_engines(engine))
+    return join_pages(pages)
+
+def plan_page_ranges(pdf_path, engines, stats, large_pdf_bytes, pages_per_task=PAGES_PER_TASK):
+    """
+    (engines, ranges) to extract a large PDF in: the engines ranked for it,
+    the first being one that could split it into ranges of (start, stop,
+    detail). None to extract pdf_path whole: when it is small, or when no
+    engine can read its pages this way (extracting it whole then reports the
+    error).
+    """
+    if not is_large_pdf(pdf_path, large_pdf_bytes):
+        return None
+    attempts = []
+    ranked = rank_engines(pdf_path, engines, attempts)
+    stats.record(pdf_path, attempts)
+    for position, engine in enumerate(ranked):
+        try:
+            ranges = engine.page_ranges(pdf_path, pages_per_task)
+        except Exception:
+            continue
+        return [engine] + ranked[:position] + ranked[position + 1:], ranges
+    return None
+
+def is_large_pdf(pdf_path, large_pdf_bytes):
+    return large_pdf_bytes is not None and os.path.getsize(pdf_path) >= large_pdf_bytes
+
+def document_header(pdf_path):
+    return f"{'=' * 80}\n{os.path.basename(pdf_path)}\n{'=' * 80}\n\n"
+
+def normalize_text(text):
     text = re.sub(r'\n\s*\n', '\n\n', text)
-    text = text.replace('\r\n', '\n')
-    text = f"{'=' * 80}\n{os.path.basename(pdf_path)}\n{'=' * 80}\n\n{text}\n\n"
-    return text
+    return text.replace('\r\n', '\n')
+
+def format_document(pdf_path, body):
+    return f"{document_header(pdf_path)}{body}\n\n"
+
+def process_text(text, pdf_path):
+    return format_document(pdf_path, normalize_text(text))
+
+def stream_body(page_texts):
+    """The body process_text would make of the pages' text, one page at a time"""
+    for text in page_texts:
+        yield normalize_text(text + '\n\n')
+
+def stream_document(pdf_path, pieces):
+    yield document_header(pdf_path)
+    yield from pieces
+    yield '\n\n'
 
-def spider_directory(directory):
-    all_text = ""
+def cached_document(pdf_path, manifest, engines, large_pdf_bytes):
+    """
+    (content hash, document) of pdf_path from the manifest; the document is
+    None unless one of engines extracted it before, and streamed from the
+    manifest for a large PDF. The hash is None if the file cannot be read.
+    """
+    try:
+        file_hash = manifest.file_hash(pdf_path)
+    except OSError:
+        return None, None
+    if not manifest.has_text(file_hash, {engine.name for engine in engines}):
+        return file_hash, None
+    if is_large_pdf(pdf_path, large_pdf_bytes):
+        return file_hash, stream_document(pdf_path, manifest.iter_text(file_hash))
+    return file_hash, format_document(pdf_path, manifest.text(file_hash))
+
+def cache_pieces(manifest, file_hash, pieces, engine_name, failures):
+    if manifest is None or file_hash is None:
+        return pieces
+    return manifest.store_pieces(file_hash, pieces, engine_name, failures)
+
+def find_pdfs(directory):
+    """All PDFs under directory, in a stable (sorted) order"""
+    pdf_paths = []
     for root, dirs, files in os.walk(directory):
-        for file in files:
+        dirs.sort()
+        for file in sorted(files):
             if file.lower().endswith('.pdf'):
-                pdf_path = os.path.join(root, file)
-                print(f"Processing: {pdf_path}")
-                
-                try:
-                    pdf_text = extract_text_from_pdf(pdf_path)
-                    processed_text = process_text(pdf_text, pdf_path)
-                    all_text += processed_text
-                except Exception as e:
-                    print(f"Error processing {pdf_path}: {str(e)}")
-    
-    return all_text
+                pdf_paths.append(os.path.join(root, file))
+    return pdf_paths
 
-def save_text_to_file(text, output_file, max_size_mb=5):
-    max_size_bytes = max_size_mb * 1024 * 1024
-    text_bytes = text.encode('utf-8')
-    total_chunks = -(-len(text_bytes) // max_size_bytes)  # Ceiling division
-    
-    for i in range(total_chunks):
-        chunk_start = i * max_size_bytes
-        chunk_end = (i + 1) * max_size_bytes
-        chunk = text_bytes[chunk_start:chunk_end].decode('utf-8', errors='ignore')
-        
-        if total_chunks > 1:
-            chunk_file = f"{os.path.splitext(output_file)[0]}_{i+1}{os.path.splitext(output_file)[1]}"
+def _raise_timeout(signum, frame):
+    raise TimeoutError("extraction timed out")
+
+def _run_in_worker(timeout, func, *args):
+    """
+    func(*args) inside a pool worker, as (result, error, seconds taken).
+    Where the platform has SIGALRM, it is interrupted after timeout seconds.
+    """
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    started = time.perf_counter()
+    try:
+        return func(*args), None, time.perf_counter() - started
+    except Exception as e:
+        return None, f"{type(e).__name__}: {str(e)}", time.perf_counter() - started
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def extract_body(pdf_path, engines):
+    pages, engine_name, attempts = extract_with_fallback(pdf_path, engines)
+    return normalize_text(join_pages(pages)), engine_name, attempts
+
+def extract_pdf_worker(pdf_path, engines, timeout=None):
+    """
+    Extract one PDF inside a pool worker. Returns ((body text, engine name,
+    engine attempts), error, seconds taken).
+    """
+    return _run_in_worker(timeout, extract_body, pdf_path, engines)
+
+def extract_page_range_worker(pdf_path, engines, page_range, timeout=None):
+    """extract_range_with_fallback inside a pool worker; returns its result, error and seconds taken"""
+    return _run_in_worker(timeout, extract_range_with_fallback, pdf_path, engines, *page_range)
+
+def spider_directory(directory, workers=1, timeout=EXTRACTION_TIMEOUT, writer=None, near_duplicate_threshold=None,
+                     large_pdf_bytes=LARGE_PDF_BYTES, pages_per_task=PAGES_PER_TASK, engine=DEFAULT_ENGINE,
+                     manifest=None):
+    """
+    Extract the text of every PDF under directory, on a process pool when
+    workers > 1, writing each document to writer as soon as it is ready or
+    else returning the combined text. timeout caps each PDF, or each page
+    range of one of large_pdf_bytes or more; a PDF without a result by then
+    counts as failed.
+    """
+    pdf_paths = find_pdfs(directory)
+    engines = make_engines(engine)
+    stats = EngineStats()
+    if workers > 1:
+        documents = iter_extracted_parallel(pdf_paths, workers, engines, stats, timeout, large_pdf_bytes,
+                                            pages_per_task, manifest)
+    else:
+        documents = iter_extracted(pdf_paths, engines, stats, large_pdf_bytes, pages_per_task, manifest)
+    if near_duplicate_threshold:
+        documents = drop_near_duplicates(documents, near_duplicate_threshold)
+
+    # A document is its text, or for a large PDF an iterator of its pieces
+    if writer is not None:
+        for pdf_path, processed_text in documents:
+            if isinstance(processed_text, str):
+                writer.write(processed_text)
+            else:
+                for piece in processed_text:
+                    writer.write(piece)
+        text = None
+    else:
+        text = ''.join(processed_text if isinstance(processed_text, str) else ''.join(processed_text)
+                       for pdf_path, processed_text in documents)
+    stats.print_summary()
+    if manifest is not None:
+        manifest.prune(pdf_paths)
+    return text
+
+def drop_near_duplicates(documents, threshold):
+    """
+    Leave out documents at least threshold (0-1) similar to one already
+    passed on, e.g. another revision of it; streamed large PDFs are not checked
+    """
+    index = NearDuplicateIndex(threshold)
+    for pdf_path, processed_text in documents:
+        if not isinstance(processed_text, str):
+            yield pdf_path, processed_text
+            continue
+        with metrics.stage('dedup'):
+            original = index.check(pdf_path, processed_text)
+        if original is None:
+            yield pdf_path, processed_text
         else:
-            chunk_file = output_file
-        
-        with open(chunk_file, 'w', encoding='utf-8') as file:
-            file.write(chunk)
+            print(f"Skipped near-duplicate of {original}: {pdf_path}")
+
+def iter_extracted(pdf_paths, engines, stats, large_pdf_bytes=LARGE_PDF_BYTES, pages_per_task=PAGES_PER_TASK,
+                   manifest=None):
+    for pdf_path in pdf_paths:
+        file_hash = None
+        if manifest is not None:
+            file_hash, document = cached_document(pdf_path, manifest, engines, large_pdf_bytes)
+            if document is not None:
+                print(f"Text already extracted: {pdf_path}")
+                metrics.count('pdfs_cached')
+                yield pdf_path, document
+                continue
+        print(f"Processing: {pdf_path}")
         
-        print(f"Chunk {i+1} saved to {chunk_file}")
+        try:
+            plan = plan_page_ranges(pdf_path, engines, stats, large_pdf_bytes, pages_per_task)
+            if plan is not None:
+                ranked, ranges = plan
+                failures = []
+                pieces = stream_body(iter_page_ranges(pdf_path, ranked, ranges, stats, failures))
+                metrics.count('pdfs_processed')
+                yield pdf_path, stream_document(pdf_path, cache_pieces(manifest, file_hash, pieces, ranked[0].name,
+                                                                       failures))
+                continue
+            with metrics.stage('pdf_extraction'):
+                body, engine_name, attempts = extract_body(pdf_path, engines)
+            stats.record(pdf_path, attempts, engine_name)
+            if file_hash is not None:
+                manifest.store_text(file_hash, body, engine_name)
+            metrics.count('pdfs_processed')
+            yield pdf_path, format_document(pdf_path, body)
+        except Exception as e:
+            metrics.error('pdf_extraction', e)
+            print(f"Error processing {pdf_path}: {str(e)}")
 
-if __name__ == "__main__":
+def iter_page_ranges(pdf_path, engines, ranges, stats, failures):
+    """Text of each page in ranges, extracted here one range at a time; ranges that fail are added to failures"""
+    for start, stop, detail in ranges:
+        try:
+            with metrics.stage('pdf_page_range'):
+                texts, engine_name, attempts = extract_range_with_fallback(pdf_path, engines, start, stop, detail)
+        except Exception as e:
+            metrics.error('pdf_page_range', e)
+            print(f"Error processing {pdf_path} pages {start + 1}-{stop}: {str(e)}")
+            failures.append((start, stop))
+            continue
+        stats.record(f"{pdf_path} pages {start + 1}-{stop}", attempts, engine_name)
+        yield from texts
+
+def result_wait(timeout):
+    """Seconds to wait for a pool result, never unbounded: a crashed worker's task never completes"""
+    return (timeout or EXTRACTION_TIMEOUT) + RESULT_MARGIN
+
+def report_worker_error(stage, description, error):
+    error_type = error.split(':', 1)[0] if ':' in error else 'Timeout'
+    metrics.count('errors', stage=stage, type=error_type)
+    print(f"Error processing {description}: {error}")
+
+def collect_page_ranges(pdf_path, ranges, results, stats, failures, timeout=EXTRACTION_TIMEOUT):
+    """Text of each page in ranges, from the pool's results for them in order; ranges that failed are added to failures"""
+    for (start, stop, detail), result in zip(ranges, results):
+        description = f"{pdf_path} pages {start + 1}-{stop}"
+        try:
+            extracted, error, seconds = result.get(result_wait(timeout))
+            metrics.observe('stage_seconds', seconds, stage='pdf_page_range')
+        except multiprocessing.TimeoutError:
+            extracted, error = None, f"no result after {result_wait(timeout)} seconds, skipped"
+        if error:
+            report_worker_error('pdf_page_range', description, error)
+            failures.append((start, stop))
+        else:
+            texts, engine_name, attempts = extracted
+            stats.record(description, attempts, engine_name)
+            yield from texts
+
+def iter_extracted_parallel(pdf_paths, workers, engines, stats, timeout=EXTRACTION_TIMEOUT,
+                            large_pdf_bytes=LARGE_PDF_BYTES, pages_per_task=PAGES_PER_TASK, manifest=None):
+    with multiprocessing.Pool(workers) as pool:
+        tasks = []
+        for pdf_path in pdf_paths:
+            file_hash = None
+            if manifest is not None:
+                file_hash, document = cached_document(pdf_path, manifest, engines, large_pdf_bytes)
+                if document is not None:
+                    tasks.append((pdf_path, file_hash, 'cached', document))
+                    continue
+            plan = plan_page_ranges(pdf_path, engines, stats, large_pdf_bytes, pages_per_task)
+            if plan is None:
+                result = pool.apply_async(extract_pdf_worker, (pdf_path, engines, timeout))
+                tasks.append((pdf_path, file_hash, 'whole', result))
+            else:
+                ranked, ranges = plan
+                results = [pool.apply_async(extract_page_range_worker, (pdf_path, ranked, page_range, timeout))
+                           for page_range in ranges]
+                tasks.append((pdf_path, file_hash, 'ranges', (ranked, ranges, results)))
+
+        # Collect in submission order. Tasks start in that order too, so once
+        # every earlier PDF is done this one is running and timeout bounds the
+        # wait, which also catches a worker that crashed outright.
+        for pdf_path, file_hash, kind, task in tasks:
+            if kind == 'cached':
+                print(f"Text already extracted: {pdf_path}")
+                metrics.count('pdfs_cached')
+                yield pdf_path, task
+                continue
+            print(f"Processing: {pdf_path}")
+            if kind == 'ranges':
+                ranked, ranges, results = task
+                failures = []
+                pieces = stream_body(collect_page_ranges(pdf_path, ranges, results, stats, failures, timeout))
+                metrics.count('pdfs_processed')
+                yield pdf_path, stream_document(pdf_path, cache_pieces(manifest, file_hash, pieces, ranked[0].name,
+                                                                       failures))
+                continue
+            try:
+                extracted, error, seconds = task.get(result_wait(timeout))
+                # Timed in the worker; the pool's processes have no sinks of their own
+                metrics.observe('stage_seconds', seconds, stage='pdf_extraction')
+            except multiprocessing.TimeoutError:
+                extracted, error = None, f"no result after {result_wait(timeout)} seconds, skipped"
+
+            if error:
+                report_worker_error('pdf_extraction', pdf_path, error)
+            else:
+                body, engine_name, attempts = extracted
+                stats.record(pdf_path, attempts, engine_name)
+                if file_hash is not None:
+                    manifest.store_text(file_hash, body, engine_name)
+                metrics.count('pdfs_processed')
+                yield pdf_path, format_document(pdf_path, body)
+
+class ExtractionQueue:
+    """
+    Extracts PDFs into a PdfManifest on a process pool as they are added, e.g.
+    by download_pdfs as each download finishes, so that spider_directory with
+    the manifest later finds their text cached. PDFs already cached are
+    skipped, and large ones are left to spider_directory, which streams them.
+    close() waits for everything queued, at most timeout per PDF; a PDF with
+    no result by then (its worker crashed) counts as failed.
+    """
+
+    def __init__(self, manifest, workers=1, engine=DEFAULT_ENGINE, timeout=EXTRACTION_TIMEOUT,
+                 large_pdf_bytes=LARGE_PDF_BYTES):
+        self.manifest = manifest
+        self.engines = make_engines(engine)
+        self.engine_names = {engine.name for engine in self.engines}
+        self.timeout = timeout
+        self.large_pdf_bytes = large_pdf_bytes
+        self.stats = EngineStats()
+        self.pool = multiprocessing.Pool(workers)
+        self.lock = threading.Lock()
+        self.queued = set()
+        # (pdf_path, AsyncResult) of each PDF handed to the pool
+        self.results = []
+        self.extracted = 0
+
+    def add(self, pdf_path, file_hash=None):
+        """Queue pdf_path; file_hash saves reading it again when the caller already hashed it (md5)"""
+        if is_large_pdf(pdf_path, self.large_pdf_bytes):
+            return
+        if file_hash is None:
+            file_hash = self.manifest.file_hash(pdf_path)
+        else:
+            self.manifest.record_file(pdf_path, file_hash)
+        with self.lock:
+            if file_hash in self.queued or self.manifest.has_text(file_hash, self.engine_names):
+                return
+            self.queued.add(file_hash)
+        result = self.pool.apply_async(extract_pdf_worker, (pdf_path, self.engines, self.timeout),
+                                       callback=lambda outcome: self._extracted(pdf_path, file_hash, outcome))
+        with self.lock:
+            self.results.append((pdf_path, result))
+
+    def _extracted(self, pdf_path, file_hash, outcome):
+        # Runs on the pool's result thread
+        extracted, error, seconds = outcome
+        metrics.observe('stage_seconds', seconds, stage='pdf_extraction')
+        if error:
+            report_worker_error('pdf_extraction', pdf_path, error)
+            return
+        body, engine_name, attempts = extracted
+        self.stats.record(pdf_path, attempts, engine_name)
+        self.manifest.store_text(file_hash, body, engine_name)
+        metrics.count('pdfs_processed')
+        self.extracted += 1
+
+    def close(self):
+        self.pool.close()
+        # In the order queued, as the pool runs them; the callback never fires
+        # for a PDF whose worker died, so join() alone could wait forever
+        lost = 0
+        for pdf_path, result in self.results:
+            result.wait(result_wait(self.timeout))
+            if not result.ready():
+                lost += 1
+                report_worker_error('pdf_extraction', pdf_path,
+                                    f"no result after {result_wait(self.timeout)} seconds, skipped")
+        if lost:
+            self.pool.terminate()
+        self.pool.join()
+        self.manifest.commit()
+        print(f"Extracted the text of {self.extracted} PDFs in the background")
+        self.stats.print_summary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def save_text_to_file(text, output_file, max_size_mb=5):
+    with TextChunkWriter(output_file, max_size_mb * 1024 * 1024) as writer:
+        writer.write(text)
+
+def convert_directory(directory, output_file, workers=None, timeout=EXTRACTION_TIMEOUT,
+                      near_duplicate_threshold=None, large_pdf_bytes=LARGE_PDF_BYTES,
+                      pages_per_task=PAGES_PER_TASK, engine=DEFAULT_ENGINE, incremental=True):
+    """
+    Extract every PDF under directory into output_file. Documents are written
+    out as they are extracted, rotating files every 5MB. workers defaults to
+    one process per CPU. With incremental, extracted text is kept in a
+    manifest in the directory and only new or changed PDFs are extracted on
+    later runs.
+    """
+    manifest = None
+    if incremental and os.path.isdir(directory):
+        manifest = PdfManifest(os.path.join(directory, MANIFEST_FILENAME))
+    try:
+        with TextChunkWriter(output_file) as writer:
+            spider_directory(directory, workers=workers or os.cpu_count() or 1, timeout=timeout, writer=writer,
+                             near_duplicate_threshold=near_duplicate_threshold, large_pdf_bytes=large_pdf_bytes,
+                             pages_per_task=pages_per_task, engine=engine, manifest=manifest)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+def main():
     directory_to_spider = input("Enter the directory path to spider for PDFs: ")
     output_file = input("Enter the output file name (e.g., output.txt): ")
     
-    combined_text = spider_directory(directory_to_spider)
-    save_text_to_file(combined_text, output_file)
+    convert_directory(directory_to_spider, output_file)
     
-    print(f"Text extraction complete. Output saved to {output_file} (and possibly additional numbered files)")
\ No newline at end of file
+    print(f"Text extraction complete. Output saved to {output_file} (and possibly additional numbered files)")
+
+if __name__ == "__main__":
+    # Metrics sinks are set with CONTENT_SLURPERS_METRICS, see metrics.configure_from_env
+    metrics.configure_from_env()
+    try:
+        if len(sys.argv) > 1:
+            # Arguments run the non-interactive CLI, see slurp.py
+            import slurp
+            slurp.main(['convert'] + sys.argv[1:])
+        else:
+            main()
+    finally:
+        metrics.shutdown()
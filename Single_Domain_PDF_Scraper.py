@@ -1,96 +1,554 @@
 import os
-import requests
+import sys
 import hashlib
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+
+import requests
+
+from crawl_frontier import Frontier, normalize_url
+from crawl_journal import CrawlJournal, ask_to_resume
+from fetching import DEFAULT_MAX_PAGE_BYTES, DEFAULT_TIMEOUT, ContentTypeMemory, SkippedResponse, fetch_page, make_session
+from html_parsing import parse_page
+from http_cache import HttpCache, cached_get
+from pdf_engines import DEFAULT_ENGINE
+from pdf_manifest import MANIFEST_FILENAME, PdfManifest
+import metrics
 
 def get_file_hash(content):
     file_hash = hashlib.md5()
     file_hash.update(content)
     return file_hash.hexdigest()
 
-def spider_domain(url):
-    visited = set()
-    to_visit = [url]
+def spider_domain(url, visited_set='set', journal=None, resume=False, cache=None, max_depth=None, max_pages=None,
+                  max_bytes=None, session=None, max_page_bytes=DEFAULT_MAX_PAGE_BYTES):
+    """
+    Crawl the domain and return the set of PDF URLs linked from it. With a
+    CrawlJournal the frontier and PDFs found are recorded as the crawl goes,
+    and resume continues an interrupted crawl from the journal. With an
+    HttpCache, pages unchanged since the last run reuse their links unparsed.
+
+    max_depth stops following links that many clicks from the start page
+    (PDFs linked there are still collected); max_pages and max_bytes stop the
+    crawl once that many pages were fetched or bytes downloaded.
+
+    Only HTML is parsed: a response whose headers say otherwise is dropped
+    before its body is downloaded, pages over max_page_bytes are abandoned,
+    and URL patterns that keep serving files are no longer requested (see
+    fetching.fetch_page).
+    """
+    session = session or make_session()
+    fetched_pages = fetched_bytes = 0
+    content_types = ContentTypeMemory()
+    skipped = Counter()
+    frontier = Frontier(visited=visited_set)
     pdf_urls = set()
 
-    while to_visit:
-        current_url = to_visit.pop(0)
-        if current_url in visited:
-            continue
+    if journal and resume and journal.has_state():
+        for visited_url in journal.visited_urls():
+            frontier.mark_visited(visited_url)
+        for pending_url, depth in journal.pending_with_depth():
+            frontier.add(pending_url, depth)
+        pdf_urls = journal.found_urls()
+        print(f"Resuming spider: {len(frontier)} pages left to visit, {len(pdf_urls)} PDFs already found")
+    else:
+        if journal:
+            journal.reset()
+        queued = frontier.add(url)
+        if journal:
+            journal.add_pending(queued)
 
-        print(f"Visiting: {current_url}")
-        visited.add(current_url)
+    try:
+        while frontier:
+            if (max_pages is not None and fetched_pages >= max_pages) or \
+                    (max_bytes is not None and fetched_bytes >= max_bytes):
+                print(f"Stopped at the crawl limit: {fetched_pages} pages fetched, {fetched_bytes} bytes")
+                break
+            current_url, depth = frontier.pop_with_depth()
+            metrics.gauge('queue_depth', len(frontier))
+            if content_types.should_skip(current_url):
+                # Known to serve files, not pages; don't even request it
+                skipped['pattern'] += 1
+                metrics.count('pages_skipped', reason='pattern')
+                if journal:
+                    journal.mark_done(current_url)
+                continue
+            print(f"Visiting: {current_url}")
 
-        try:
-            response = requests.get(current_url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            for link in soup.find_all('a'):
-                href = link.get('href')
-                if href:
-                    full_url = urljoin(current_url, href)
-                    if urlparse(full_url).netloc == urlparse(url).netloc:
-                        if full_url.lower().endswith('.pdf'):
-                            pdf_urls.add(full_url)
-                        elif full_url not in visited:
-                            to_visit.append(full_url)
+            try:
+                fetched_pages += 1
+                response = fetch_page(session, current_url, cache, content_types, max_page_bytes)
+                links = None
+                if getattr(response, 'from_cache', False):
+                    links = cache.derived(current_url, 'links')
+                else:
+                    # A body replayed from the cache was not downloaded
+                    fetched_bytes += len(response.content)
+                if links is None:
+                    with metrics.stage('parse'):
+                        links = [href for href in parse_page(response.text, extract_content=False).links if href]
+                    if cache:
+                        cache.store_derived(current_url, 'links', links)
 
-        except Exception as e:
-            print(f"Error processing {current_url}: {str(e)}")
+                for href in links:
+                    if href:
+                        full_url = urljoin(current_url, href)
+                        if urlparse(full_url).netloc == urlparse(url).netloc:
+                            if full_url.lower().endswith('.pdf'):
+                                pdf_url = normalize_url(full_url)
+                                if journal and pdf_url not in pdf_urls:
+                                    journal.add_found(pdf_url)
+                                pdf_urls.add(pdf_url)
+                            elif max_depth is None or depth < max_depth:
+                                queued = frontier.add(full_url, depth + 1)
+                                if journal and queued:
+                                    journal.add_pending(queued, depth + 1)
+
+            except SkippedResponse as skip:
+                skipped[skip.reason] += 1
+            except Exception as e:
+                metrics.error('spider', e)
+                print(f"Error processing {current_url}: {str(e)}")
+
+            metrics.count('pages_processed')
+            if journal:
+                journal.mark_done(current_url)
+
+        if journal:
+            journal.set_meta('spider_complete', True)
+        if skipped:
+            print(f"Skipped without parsing: {skipped['content_type']} non-HTML responses (bodies not downloaded), "
+                  f"{skipped['pattern']} URLs of patterns serving no HTML (not requested), "
+                  f"{skipped['too_large'] + skipped['too_slow']} pages too large or slow to read")
+    finally:
+        if journal:
+            journal.commit()
 
     return pdf_urls
 
-def download_pdfs(pdf_urls, folder):
+# Journal of a scrape, kept in the folder the PDFs are saved to
+JOURNAL_FILENAME = '.pdf_scraper_journal.sqlite'
+
+# Bytes read from the socket and hashed per write while streaming a PDF
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+def part_filename(folder, pdf_url):
+    """Temporary file a PDF is streamed into; named per URL so a rerun can resume it"""
+    url_hash = hashlib.md5(pdf_url.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(folder, f".{url_hash}.part")
+
+def head_key(response):
+    """
+    (ETag, Content-Length) of a HEAD response, or None when the server sends
+    no ETag. Two URLs with the same key serve the same file.
+    """
+    etag = response.headers.get('ETag')
+    length = response.headers.get('Content-Length')
+    if response.status_code != 200 or not etag or not length:
+        return None
+    return etag, length
+
+def part_md5(part_path):
+    """md5 object holding what a .part file contains so far"""
+    file_hash = hashlib.md5()
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash
+
+def range_total(response):
+    """Full length of the file from a Content-Range header such as "bytes */1234", or None"""
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+class PdfDownloader:
+    """
+    Downloads PDFs into a folder, one file per distinct content. Each PDF is
+    streamed to a .part file and hashed as it arrives, so memory use does not
+    depend on file size; a .part left by an interrupted run is resumed with an
+    HTTP Range request, guarded by If-Range so a changed file starts over.
+    Safe to call download() from several threads: URLs serving the same file
+    by their HEAD wait for one download of it instead of each fetching it.
+    on_saved, if given, is called with the filename and md5 of each PDF saved.
+    """
+
+    def __init__(self, folder, total, journal=None, cache=None, workers=1, head_check=True, on_saved=None):
+        self.folder = folder
+        self.total = total
+        self.journal = journal
+        self.cache = cache
+        self.head_check = head_check
+        self.on_saved = on_saved
+        self.session = make_session(pool_size=max(10, workers))
+        self.lock = threading.Lock()
+        self.downloaded_hashes = journal.downloaded_hashes() if journal else set()
+        # (ETag, Content-Length) -> hash of the file downloaded for it
+        self.head_hashes = {}
+        # (ETag, Content-Length) -> Event set once the download under way for it ends
+        self.head_downloads = {}
+        self.processed = 0
+        self.downloaded_count = 0
+
+    def download(self, pdf_url):
+        try:
+            self._download(pdf_url)
+        except Exception as e:
+            metrics.error('download', e)
+            print(f"Error downloading {pdf_url}: {str(e)}")
+        with self.lock:
+            self.processed += 1
+            i = self.processed
+        metrics.gauge('queue_depth', self.total - i)
+        print(f"Progress: {i}/{self.total} ({i/self.total:.1%}) PDFs processed")
+
+    def _download(self, pdf_url):
+        part_path = part_filename(self.folder, pdf_url)
+        if os.path.exists(part_path):
+            self._save(pdf_url, part_path, self._resume_request(pdf_url, part_path))
+            return
+
+        key = None
+        if self.head_check and not (self.cache and self.cache.entry(pdf_url)):
+            # A HEAD is cheap next to a PDF; it spots copies of files already saved
+            try:
+                key = head_key(self.session.head(pdf_url, allow_redirects=True, timeout=DEFAULT_TIMEOUT))
+            except requests.RequestException as e:
+                # Only an optimization: servers that reject HEAD still get the GET
+                print(f"HEAD request failed for {pdf_url}, downloading it anyway: {str(e)}")
+            if key and not self._claim(pdf_url, key):
+                return
+
+        try:
+            # Only validators are cached, the PDF itself is the copy in the folder
+            response = cached_get(self.session, pdf_url, self.cache, store_body=False,
+                                  stream=True, timeout=DEFAULT_TIMEOUT)
+            if getattr(response, 'from_cache', False):
+                previous = self.cache.derived(pdf_url, 'pdf')
+                if previous and (previous['filename'] is None or os.path.exists(previous['filename'])):
+                    if previous['filename']:
+                        with self.lock:
+                            self.downloaded_hashes.add(previous['file_hash'])
+                            cached_key = head_key(response)
+                            if cached_key:
+                                self.head_hashes[cached_key] = previous['file_hash']
+                    print(f"Unchanged since last run: {pdf_url}")
+                    return
+                response = self.session.get(pdf_url, stream=True, timeout=DEFAULT_TIMEOUT)
+            self._save(pdf_url, part_path, response, key)
+        finally:
+            if key:
+                self._release(key)
+
+    def _claim(self, pdf_url, key):
+        """
+        Make this thread the one downloading the file behind a HEAD key.
+        Another thread already downloading it is waited for, and the URL
+        is then skipped as its duplicate; returns False in that case. If
+        that download failed, this thread takes over.
+        """
+        while True:
+            with self.lock:
+                known_hash = self.head_hashes.get(key)
+                in_flight = self.head_downloads.get(key)
+                if known_hash is None and in_flight is None:
+                    self.head_downloads[key] = threading.Event()
+                    return True
+            if known_hash:
+                self._skip_duplicate(pdf_url, known_hash)
+                return False
+            in_flight.wait()
+
+    def _release(self, key):
+        with self.lock:
+            in_flight = self.head_downloads.pop(key, None)
+        if in_flight:
+            in_flight.set()
+
+    def _save(self, pdf_url, part_path, response, key=None):
+        """Stream a response into the .part file and keep it unless its content was already saved"""
+        if response is None:
+            # The part left by the last run already holds the whole file
+            file_hash = part_md5(part_path).hexdigest()
+        else:
+            with response:
+                response.raise_for_status()
+                file_hash = self._stream_to_part(response, part_path)
+
+        filename = None
+        with self.lock:
+            if key:
+                self.head_hashes[key] = file_hash
+            duplicate = file_hash in self.downloaded_hashes
+            if not duplicate:
+                self.downloaded_hashes.add(file_hash)
+                self.downloaded_count += 1
+                downloaded_count = self.downloaded_count
+
+        if duplicate:
+            os.remove(part_path)
+            self._skip_duplicate(pdf_url, file_hash)
+        else:
+            filename = os.path.join(self.folder, pdf_url.split('/')[-1])
+            os.replace(part_path, filename)
+            if self.journal:
+                self.journal.record_download(pdf_url, 'downloaded', file_hash, filename)
+            print(f"Downloaded ({downloaded_count}/{self.total}, {downloaded_count/self.total:.1%}): {filename}")
+            if self.on_saved:
+                self.on_saved(filename, file_hash)
+
+        if self.cache:
+            self.cache.store_derived(pdf_url, 'pdf', {'file_hash': file_hash, 'filename': filename})
+
+    def _resume_request(self, pdf_url, part_path):
+        """
+        Request the rest of the file a .part holds the start of. Returns the
+        response, or None when the part turns out to be the whole file. The
+        part is only continued if the file provably has not changed since it
+        was started; without a validator to check that it is started over.
+        """
+        offset = os.path.getsize(part_path)
+        entry = self.cache.entry(pdf_url) if self.cache else None
+        validator = entry and (entry['headers'].get('ETag') or entry['headers'].get('Last-Modified'))
+        if not validator:
+            print(f"Cannot tell whether {pdf_url} changed since it was started, downloading it again")
+            os.remove(part_path)
+            return self.session.get(pdf_url, stream=True, timeout=DEFAULT_TIMEOUT)
+
+        # If-Range: a changed file comes back whole (200) and replaces the part
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+        print(f"Resuming {pdf_url} from {offset / 1024:.0f} KB")
+        response = self.session.get(pdf_url, headers=headers, stream=True, timeout=DEFAULT_TIMEOUT)
+        if response.status_code == 416:
+            # Nothing left past the offset: the part is complete, unless the file shrank
+            response.close()
+            if range_total(response) == offset:
+                return None
+            os.remove(part_path)
+            response = self.session.get(pdf_url, stream=True, timeout=DEFAULT_TIMEOUT)
+        if response.status_code in (200, 206) and self.cache:
+            # Keep the validators so an unchanged file is skipped next run
+            self.cache.store(pdf_url, response)
+        return response
+
+    def _stream_to_part(self, response, part_path):
+        """Write the body to part_path, appending for a 206, and return its md5"""
+        file_hash = hashlib.md5()
+        mode = 'wb'
+        if response.status_code == 206 and os.path.exists(part_path):
+            mode = 'ab'
+            file_hash = part_md5(part_path)
+
+        started = time.perf_counter()
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                file_hash.update(chunk)
+                metrics.count('bytes_fetched', len(chunk))
+        # The whole transfer; 'fetch' only covers the wait for the response headers
+        metrics.observe('stage_seconds', time.perf_counter() - started, stage='download')
+        return file_hash.hexdigest()
+
+    def _skip_duplicate(self, pdf_url, file_hash):
+        if self.journal:
+            self.journal.record_download(pdf_url, 'duplicate', file_hash)
+        print(f"Skipped duplicate: {pdf_url}")
+
+def download_pdfs(pdf_urls, folder, journal=None, cache=None, workers=1, head_check=True, on_saved=None):
+    """
+    Download each PDF once, skipping files whose content was already saved.
+    With workers > 1 downloads run on that many threads sharing one session.
+    With a CrawlJournal every finished URL is recorded, so a resumed run skips
+    URLs handled by an earlier run and still dedups against their files. With
+    an HttpCache, PDFs unchanged since the last run are not downloaded again.
+    head_check sends a HEAD first so a URL whose ETag and size match a file
+    already downloaded is skipped without transferring it. on_saved(filename,
+    md5) is called as each new file is saved, e.g. ExtractionQueue.add to
+    extract it straight away.
+    """
     if not pdf_urls:
         print("No PDFs were found during the spidering process.")
         return 0
 
-    downloaded_hashes = set()
-    total_pdfs = len(pdf_urls)
-    downloaded_count = 0
+    finished = set()
+    if journal:
+        finished = journal.finished_downloads()
+        if finished:
+            print(f"Skipping {len(finished)} PDFs handled by a previous run")
 
-    for i, pdf_url in enumerate(pdf_urls, 1):
-        try:
-            response = requests.get(pdf_url)
-            content = response.content
-            file_hash = get_file_hash(content)
-
-            if file_hash not in downloaded_hashes:
-                filename = os.path.join(folder, pdf_url.split('/')[-1])
-                with open(filename, 'wb') as f:
-                    f.write(content)
-                downloaded_hashes.add(file_hash)
-                downloaded_count += 1
-                print(f"Downloaded ({downloaded_count}/{total_pdfs}, {downloaded_count/total_pdfs:.1%}): {filename}")
-            else:
-                print(f"Skipped duplicate ({i}/{total_pdfs}, {i/total_pdfs:.1%}): {pdf_url}")
+    todo = [pdf_url for pdf_url in pdf_urls if pdf_url not in finished]
+    downloader = PdfDownloader(folder, len(todo) or 1, journal, cache, workers, head_check, on_saved)
 
-        except Exception as e:
-            print(f"Error downloading {pdf_url}: {str(e)}")
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(downloader.download, todo))
+    else:
+        for pdf_url in todo:
+            downloader.download(pdf_url)
 
-        print(f"Progress: {i}/{total_pdfs} ({i/total_pdfs:.1%}) PDFs processed")
+    if journal:
+        journal.set_meta('download_complete', True)
+        journal.commit()
 
-    return downloaded_count
+    return downloader.downloaded_count
 
-if __name__ == "__main__":
-    domain_url = input("Enter the URL of the domain to spider: ")
-    save_folder = input("Enter the name of the folder to save PDFs: ")
+class PdfDownloadQueue:
+    """
+    Downloads PDFs into save_folder on a pool of threads as their links are
+    added, so a crawl that is fetching pages for something else can collect
+    them in the same pass (see Web_to_Single_HTML_File_Spider.create_sitemap's
+    on_pdf). Each URL is downloaded once. Like scrape_pdfs, progress is
+    journaled in the folder, so with resume the PDFs found but not finished
+    by an interrupted run are queued again, and validators are cached there.
+    With text_output each PDF saved is extracted on extraction_workers
+    processes straight away, and close() writes the text of the folder's
+    PDFs to text_output. close() waits for everything queued and returns the
+    number of PDFs downloaded.
+    """
+
+    def __init__(self, save_folder, workers=8, resume=False, text_output=None, extraction_workers=None,
+                 engine=DEFAULT_ENGINE):
+        os.makedirs(save_folder, exist_ok=True)
+        self.save_folder = save_folder
+        self.text_output = text_output
+        self.engine = engine
+        self.journal = CrawlJournal(os.path.join(save_folder, JOURNAL_FILENAME))
+        if not resume:
+            self.journal.reset()
+        self.cache = HttpCache(os.path.join(save_folder, '.http_cache'))
+        self.extraction = self.manifest = None
+        self.extraction_workers = extraction_workers or os.cpu_count() or 1
+        if text_output:
+            import PDF_Text_Converter as pdf_converter
+            self.manifest = PdfManifest(os.path.join(save_folder, MANIFEST_FILENAME))
+            self.extraction = pdf_converter.ExtractionQueue(self.manifest, self.extraction_workers, engine)
+        self.downloader = PdfDownloader(save_folder, 0, self.journal, self.cache, workers,
+                                        on_saved=self.extraction.add if self.extraction else None)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.seen = set(self.journal.finished_downloads())
+        if self.seen:
+            print(f"Skipping {len(self.seen)} PDFs handled by a previous run")
+        for pdf_url in self.journal.found_urls():
+            self.add(pdf_url)
+
+    def add(self, pdf_url):
+        pdf_url = normalize_url(pdf_url)
+        with self.lock:
+            if pdf_url in self.seen:
+                return
+            self.seen.add(pdf_url)
+        with self.downloader.lock:
+            self.downloader.total += 1
+        self.journal.add_found(pdf_url)
+        self.executor.submit(self.downloader.download, pdf_url)
+
+    def close(self):
+        try:
+            self.executor.shutdown(wait=True)
+            self.journal.set_meta('download_complete', True)
+            print(f"\nDownloaded {self.downloader.downloaded_count} unique PDFs out of {self.downloader.total} found.")
+            self.cache.print_report()
+        finally:
+            self.journal.close()
+            if self.extraction:
+                self.extraction.close()
+                self.manifest.close()
+
+        if self.text_output:
+            import PDF_Text_Converter as pdf_converter
+            print("\nWriting the text of the PDFs...")
+            # Only what the queue did not already extract is extracted here
+            pdf_converter.convert_directory(self.save_folder, self.text_output, self.extraction_workers,
+                                            engine=self.engine)
+            print(f"Text saved to {self.text_output} (and possibly additional numbered files)")
+        return self.downloader.downloaded_count
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc_info):
+        self.close()
+
+def scrape_pdfs(domain_url, save_folder, resume=False, workers=8, max_depth=None, max_pages=None, max_bytes=None,
+                text_output=None, extraction_workers=None, engine=DEFAULT_ENGINE, max_page_bytes=DEFAULT_MAX_PAGE_BYTES):
+    """
+    Spider a domain for PDFs and download them into save_folder. Progress is
+    journaled in the folder, so resume continues an interrupted run, and
+    validators are cached there so re-runs skip unchanged pages and PDFs.
+    With text_output, each PDF's text is extracted into the folder's manifest
+    (see PDF_Text_Converter) on extraction_workers processes as soon as it is
+    downloaded, and the text of all the PDFs in the folder is then written to
+    text_output. Pages over max_page_bytes are not read, see spider_domain.
+    Returns the number of PDFs downloaded.
+    """
     if not os.path.exists(save_folder):
         os.makedirs(save_folder)
 
-    print("\nStep 1: Spidering the domain...")
-    pdf_urls = spider_domain(domain_url)
-    
-    if not pdf_urls:
-        print("\nNo PDFs were found on the specified domain.")
-    else:
-        print(f"\nSpidering completed. Found {len(pdf_urls)} unique PDF URLs.")
+    journal = CrawlJournal(os.path.join(save_folder, JOURNAL_FILENAME))
+    cache = HttpCache(os.path.join(save_folder, '.http_cache'))
+    downloaded_count = 0
+    extraction = None
+    if text_output:
+        import PDF_Text_Converter as pdf_converter
+        extraction_workers = extraction_workers or os.cpu_count() or 1
+        manifest = PdfManifest(os.path.join(save_folder, MANIFEST_FILENAME))
+        extraction = pdf_converter.ExtractionQueue(manifest, extraction_workers, engine)
+
+    try:
+        if resume and journal.get_meta('spider_complete', False):
+            print("\nStep 1: Spidering already completed by the previous run")
+            pdf_urls = journal.found_urls()
+        else:
+            print("\nStep 1: Spidering the domain...")
+            pdf_urls = spider_domain(domain_url, journal=journal, resume=resume, cache=cache, max_depth=max_depth,
+                                     max_pages=max_pages, max_bytes=max_bytes, max_page_bytes=max_page_bytes)
+
+        if not pdf_urls:
+            print("\nNo PDFs were found on the specified domain.")
+        else:
+            print(f"\nSpidering completed. Found {len(pdf_urls)} unique PDF URLs.")
 
-        print("\nStep 2: Downloading PDFs...")
-        downloaded_count = download_pdfs(pdf_urls, save_folder)
+            print("\nStep 2: Downloading PDFs...")
+            downloaded_count = download_pdfs(pdf_urls, save_folder, journal, cache, workers=workers,
+                                             on_saved=extraction.add if extraction else None)
 
-        print(f"\nDownload completed. Downloaded {downloaded_count} unique PDFs out of {len(pdf_urls)} found.")
-        if len(pdf_urls) > 0:
-            print(f"Download efficiency: {downloaded_count/len(pdf_urls):.1%}")
+            print(f"\nDownload completed. Downloaded {downloaded_count} unique PDFs out of {len(pdf_urls)} found.")
+            if len(pdf_urls) > 0:
+                print(f"Download efficiency: {downloaded_count/len(pdf_urls):.1%}")
+        cache.print_report()
+    finally:
+        journal.close()
+        if extraction:
+            extraction.close()
+            manifest.close()
+
+    if text_output:
+        print("\nStep 3: Writing the text of the PDFs...")
+        # Only what the queue did not already extract is extracted here
+        pdf_converter.convert_directory(save_folder, text_output, extraction_workers, engine=engine)
+        print(f"Text saved to {text_output} (and possibly additional numbered files)")
+    return downloaded_count
+
+def main(resume=False):
+    domain_url = input("Enter the URL of the domain to spider: ")
+    save_folder = input("Enter the name of the folder to save PDFs: ")
+
+    # Progress is journaled in the save folder so an interrupted run can be resumed
+    resume = ask_to_resume(os.path.join(save_folder, JOURNAL_FILENAME), 'download', resume)
+    scrape_pdfs(domain_url, save_folder, resume)
+
+if __name__ == "__main__":
+    # Metrics sinks are set with CONTENT_SLURPERS_METRICS, see metrics.configure_from_env
+    metrics.configure_from_env()
+    try:
+        if sys.argv[1:] and sys.argv[1:] != ['--resume']:
+            # Arguments run the non-interactive CLI, see slurp.py
+            import slurp
+            slurp.main(['pdfs'] + sys.argv[1:])
+        else:
+            main(resume='--resume' in sys.argv[1:])
+    finally:
+        metrics.shutdown()
@@ -1,13 +1,13 @@
 import hashlib
 from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-import fasttext
-FASTTEXT_MODEL = fasttext.load_model("lid.176.bin")
+from language_detection import FASTTEXT_MODEL_PATH, init_fasttext_worker, make_detector, predict_english
+from near_duplicates import NearDuplicateIndex, minhash_signature
 
 def is_english_fasttext(text):
     try:
-        prediction = FASTTEXT_MODEL.predict(text.strip().replace("\n", " ")[:1000])
-        return prediction[0][0] == "__label__en"
+        return predict_english([text])[0]
     except:
         return False
 
@@ -22,31 +22,78 @@ def analyze_page(page_data):
     h = content_hash(text)
     return (h, url, text)
 
-def filter_unique_english_pages(page_contents):
-    with ProcessPoolExecutor(max_workers=8) as executor:
-        results = list(executor.map(analyze_page, page_contents))
+def analyze_batch(texts, signatures=False):
+    """
+    (content hash, MinHash signature or None) for each English text in a
+    batch, None for the others
+    """
+    try:
+        english = predict_english(texts)
+    except:
+        english = [False] * len(texts)
+    return [(content_hash(text), minhash_signature(text) if signatures else None) if is_en else None
+            for text, is_en in zip(texts, english)]
+
+def filter_unique_english_pages(page_contents, workers=8, batch_size=256, model_path=FASTTEXT_MODEL_PATH,
+                                near_duplicate_threshold=None):
+    """
+    Keep the first copy of each English page. Pages are classified in batches
+    of batch_size by a pool of `workers` processes, each loading the model once;
+    workers only send back hashes, not the page texts. With
+    near_duplicate_threshold, pages at least that similar to an earlier page
+    (estimated Jaccard similarity of their word shingles) are dropped too.
+    """
+    page_contents = list(page_contents)
+    batches = [[text for _, text in page_contents[i:i + batch_size]]
+               for i in range(0, len(page_contents), batch_size)]
+    analyze = partial(analyze_batch, signatures=bool(near_duplicate_threshold))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_fasttext_worker,
+                             initargs=(model_path,)) as executor:
+        results = [result for batch in executor.map(analyze, batches) for result in batch]
 
     seen_hashes = set()
+    near_duplicates = NearDuplicateIndex(near_duplicate_threshold) if near_duplicate_threshold else None
     unique_pages = []
 
-    for result in results:
+    for result, (url, text) in zip(results, page_contents):
         if not result:
             continue
-        h, url, text = result
-        if h not in seen_hashes:
-            seen_hashes.add(h)
-            unique_pages.append((url, text))
+        h, signature = result
+        if h in seen_hashes:
+            continue
+        if near_duplicates is not None:
+            if near_duplicates.query(signature) is not None:
+                continue
+            near_duplicates.add(url, signature)
+        seen_hashes.add(h)
+        unique_pages.append((url, text))
     return unique_pages
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse, parse_qs
+from urllib.parse import urljoin, urlparse
 import os
-from langdetect import detect, LangDetectException
-from collections import Counter
-import xml.etree.ElementTree as ET
+import sys
+from collections import Counter, deque
 import hashlib
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+import metrics
+from chunk_writer import ChunkWriter
+from content_spool import ContentSpool
+from crawl_frontier import Frontier, normalize_url
+from crawl_journal import CrawlJournal, ask_to_resume
+from fetching import (DEFAULT_MAX_PAGE_BYTES, DEFAULT_TIMEOUT, ContentTypeMemory, SkippedResponse, fetch_page, is_html,
+                      make_session)
+from html_parsing import extract_formatted_content, parse_page
+from request_scheduler import RobotsDisallowed
+from response_archive import ResponseArchive, read_index, read_record
+from sitemaps import SitemapReader, find_sitemaps
+from url_language import UrlLanguageClassifier, classify_url
+from http_cache import HttpCache
+
 # List of file extensions to skip
 SKIP_EXTENSIONS = {
     '.pdf', '.mp3', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.wav',
@@ -70,78 +117,23 @@ def is_likely_english_url(url, domain):
         - True: URL is likely English
         - False: URL is likely non-English
         - None: Cannot determine from URL alone
+    See url_language.classify_url; a crawl's SitemapCrawl also learns path
+    prefixes as it goes.
     """
-    parsed = urlparse(url)
-    path = parsed.path.strip('/')
-    path_parts = path.split('/')
-    netloc_parts = parsed.netloc.split('.')
-    
-    # Check for language subdomain patterns (en.example.com, english.example.com)
-    if netloc_parts[0] in ['en', 'eng', 'english']:
-        return True
-    elif netloc_parts[0] in ['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl', 
-                         'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he', 
-                         'id', 'vi', 'uk', 'hi', 'espanol', 'francais', 'deutsch']:
-        return False
-    
-    # Check for language in path patterns (/en/, /en-us/, /english/)
-    if path_parts and path_parts[0] in ['en', 'eng', 'english', 'en-us', 'en-gb', 'en-au', 'en-ca']:
-        return True
-    elif path_parts and path_parts[0] in ['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl', 
-                                      'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he', 
-                                      'id', 'vi', 'uk', 'hi', 'es-mx', 'fr-ca', 'pt-br']:
-        return False
-    
-    # Check for language query parameters (?lang=en, ?locale=en_US)
-    query_params = parse_qs(parsed.query)
-    lang_params = query_params.get('lang', []) + query_params.get('locale', []) + query_params.get('language', [])
-    
-    for param in lang_params:
-        param = param.lower()
-        if param.startswith('en') or param == 'english':
-            return True
-        elif param in ['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl', 
-                   'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he', 
-                   'id', 'vi', 'uk', 'hi']:
-            return False
-    
-    # If domain ends with country TLD that typically uses English
-    english_tlds = ['.us', '.uk', '.ca', '.au', '.nz', '.ie', '.za']
-    for tld in english_tlds:
-        if parsed.netloc.endswith(tld):
-            return True
-    
-    # Non-English country TLDs
-    non_english_tlds = ['.mx', '.es', '.fr', '.de', '.it', '.ru', '.cn', '.jp', '.kr', '.br', '.pt', 
-                     '.sa', '.nl', '.se', '.dk', '.no', '.fi', '.pl', '.tr', '.cz', '.hu', '.th', 
-                     '.gr', '.il', '.id', '.vn', '.ua', '.in']
-    for tld in non_english_tlds:
-        if parsed.netloc.endswith(tld) and not parsed.netloc.endswith('.com' + tld):
-            return False
-    
-    # Check for common patterns in file names
-    if path:
-        filename = path_parts[-1] if path_parts else ""
-        if '-en.' in filename or '_en.' in filename or '-english.' in filename:
-            return True
-        elif any(f'-{lang}.' in filename or f'_{lang}.' in filename 
-                for lang in ['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt']):
-            return False
-            
-    # Cannot determine from URL alone
-    return None
-
-def get_homepage_links(url, domain):
+    return classify_url(url)
+
+def get_homepage_links(url, domain, session=None):
     """Get all unique content links from homepage"""
     visited = set()
     content_links = []
+    session = session or make_session()
     
     try:
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.text, 'html5lib')
+        response = session.get(url, timeout=DEFAULT_TIMEOUT)
+        page = parse_page(response.text, extract_content=False)
         
-        for link in soup.find_all('a', href=True):
-            href = urljoin(url, link['href'])
+        for link in page.links:
+            href = urljoin(url, link)
             if is_valid_url(href, domain) and href not in visited and not should_skip_url(href):
                 # Pre-filter URLs based on language patterns
                 if is_likely_english_url(href, domain) is not False:
@@ -153,316 +145,844 @@ def get_homepage_links(url, domain):
         print(f"Error processing homepage: {str(e)}")
         return []
 
-def find_sitemap(domain):
-    sitemap_urls = [
-        f"https://{domain}/sitemap.xml",
-        f"https://{domain}/sitemap_index.xml",
-        f"https://{domain}/sitemap-index.xml",
-        f"https://{domain}/sitemapindex.xml",
-        f"https://{domain}/sitemap.php",
-        f"https://{domain}/sitemap",
-    ]
-
-    for url in sitemap_urls:
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                return url
-        except requests.RequestException:
-            continue
-
-    return None
-
-def parse_sitemap(sitemap_url):
-    response = requests.get(sitemap_url, timeout=10)
-    root = ET.fromstring(response.content)
-
-    # Namespace dictionary
-    namespaces = {
-        'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'
-    }
-
-    urls = []
-
-    # Check if it's a sitemap index
-    sitemaps = root.findall('.//sm:sitemap', namespaces)
-    if sitemaps:
-        print(f"Found a sitemap index with {len(sitemaps)} sitemaps")
-        for sitemap in sitemaps:
-            sitemap_loc = sitemap.find('sm:loc', namespaces)
-            if sitemap_loc is not None:
-                urls.extend(parse_sitemap(sitemap_loc.text))
-    else:
-        # It's a regular sitemap
-        for url in root.findall('.//sm:url/sm:loc', namespaces):
-            if not should_skip_url(url.text):
-                # Also check hreflang tags if they exist
-                url_elem = url.getparent() if hasattr(url, 'getparent') else None
-                if url_elem is not None:
-                    hreflang_tags = url_elem.findall('.//sm:link', namespaces)
-                    is_english_page = False
-                    has_hreflang = len(hreflang_tags) > 0
-                    
-                    for hreflang in hreflang_tags:
-                        if 'hreflang' in hreflang.attrib and hreflang.attrib['hreflang'].startswith('en'):
-                            is_english_page = True
-                            break
-                    
-                    # Only skip if we have hreflang tags and none are English
-                    if has_hreflang and not is_english_page:
-                        continue
-                
-                urls.append(url.text)
+def find_sitemap(domain, session=None, scheme='https'):
+    """First sitemap of the site, see sitemaps.find_sitemaps"""
+    sitemap_urls = find_sitemaps(session or make_session(), domain, scheme)
+    return sitemap_urls[0] if sitemap_urls else None
 
-    return urls
-
-def extract_formatted_content(soup):
-    # Remove script, style, and nav elements
-    for element in soup(["script", "style", "nav"]):
-        element.decompose()
-    
-    # Extract the main content
-    main_content = soup.find('main') or soup.find('body')
-    
-    if main_content:
-        # Preserve only specific tags
-        allowed_tags = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'b', 'strong', 'i', 'em', 'table', 'tr', 'td', 'th']
-        for tag in main_content.find_all(True):
-            if tag.name not in allowed_tags:
-                tag.unwrap()
-    
-        # Convert table to simple format
-        for table in main_content.find_all('table'):
-            new_table = soup.new_tag('table')
-            for row in table.find_all('tr'):
-                new_row = soup.new_tag('tr')
-                for cell in row.find_all(['td', 'th']):
-                    new_cell = soup.new_tag('td')
-                    new_cell.string = cell.get_text(strip=True)
-                    new_row.append(new_cell)
-                new_table.append(new_row)
-            table.replace_with(new_table)
-        
-        return main_content
-    return None
+def parse_sitemap(sitemap_url, session=None, since=None):
+    """All page URLs in a sitemap or sitemap index, leaving out multimedia files"""
+    reader = SitemapReader(session or make_session(), since=since)
+    return [url for url in reader.urls([sitemap_url]) if not should_skip_url(url)]
 
 def is_english(text):
+    from langdetect import detect, LangDetectException
     try:
         return detect(text) == 'en'
     except LangDetectException:
         return False
 
 def save_chunks(content, base_filename, chunk_size=5*1024*1024):
-    chunk_number = 1
-    start = 0
-    while start < len(content):
-        end = start + chunk_size
-        chunk = content[start:end]
-        
-        if end < len(content):
-            # Find the last closing tag
-            last_tag = chunk.rfind('>')
-            if last_tag != -1:
-                end = start + last_tag + 1
-                chunk = content[start:end]
-        
-        filename = f"{base_filename}_{chunk_number}.html"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(f"<html><body>{chunk}</body></html>")
-        
-        print(f"Chunk {chunk_number} saved to {filename}")
-        print(f"File size: {os.path.getsize(filename) / 1024:.2f} KB")
-        
-        start = end
-        chunk_number += 1
+    with ChunkWriter(base_filename, chunk_size) as writer:
+        writer.write(content)
 
-def create_sitemap(start_url, use_existing_sitemap=False, homepage_only=False, homepage_links=None):
-    domain = urlparse(start_url).netloc
-    visited = set()
-    to_visit = homepage_links if homepage_only else [start_url]
-    sitemap = []
-    english_pages = []
-    non_english_pages = 0
-    skipped_files = 0
-    filtered_by_url = 0
-    content_hashes = set()
-    
-    # Track language determination statistics
-    url_pattern_detected_english = 0
-    url_pattern_detected_non_english = 0
-    content_detected_english = 0
-    content_detected_non_english = 0
-    html_tag_detected_english = 0
-    html_tag_detected_non_english = 0
-
-    if use_existing_sitemap and not homepage_only:
-        sitemap_url = find_sitemap(domain)
-        if sitemap_url:
-            print(f"Using existing sitemap: {sitemap_url}")
-            to_visit = parse_sitemap(sitemap_url)
-            print(f"Found {len(to_visit)} URLs in sitemap (after filtering out multimedia files)")
-            
+class PageAnalyzer:
+    """
+    What a crawl works out from one page, as a plain dict (see analyze),
+    without touching the crawl's state: the same object runs on the crawl's
+    thread or, pickled once, in each parse worker process.
+
+    signatures is (num_perm, shingle_size) of the NearDuplicateIndex when
+    near-duplicates are dropped, so workers compute the same MinHash
+    signatures; collect_pdfs adds the page's PDF links to every result.
+    """
+
+    def __init__(self, domain, detector, parser='auto', keep_soup=False, signatures=None, collect_pdfs=False):
+        self.domain = domain
+        self.detector = detector
+        self.parser = parser
+        self.keep_soup = keep_soup
+        self.signatures = signatures
+        self.collect_pdfs = collect_pdfs
+
+    def parse(self, html):
+        # With lxml the content is extracted in the same pass
+        with metrics.stage('parse'):
+            return parse_page(html, self.parser, extract_content=not self.keep_soup)
+
+    def analyze(self, current_url, page, url_language, follow_links, content_hashes=(), near_duplicates=None):
+        """
+        Work out everything the crawl needs from a ParsedPage as a plain dict:
+        the language decision and, for English pages, the content hash, links
+        (when follow_links) and (unless soups are kept) the extracted content.
+        Pages whose hash is in content_hashes, or with a near-duplicate in
+        near_duplicates, are marked duplicate without the rest.
+        """
+        is_english_page, language_stat = self.is_english_page(page, url_language)
+        result = {'english': is_english_page, 'language_stat': language_stat,
+                  'settings': self.settings(follow_links)}
+        if self.collect_pdfs:
+            # Like Single_Domain_PDF_Scraper.spider_domain, PDFs are collected from every page
+            result['pdfs'] = self.find_pdf_links(current_url, page.links)
+        if not is_english_page:
+            return result
+
+        # Generate a hash of the page content to check for duplicates
+        text = page.text
+        with metrics.stage('hashing'):
+            result['hash'] = hashlib.md5(text.encode()).hexdigest()
+        if result['hash'] in content_hashes:
+            result['duplicate'] = True
+            return result
+
+        if self.signatures is not None:
+            with metrics.stage('dedup'):
+                result['signature'] = minhash_signature(text, *self.signatures)
+                near_duplicate = near_duplicates.query(result['signature']) if near_duplicates is not None else None
+            if near_duplicate is not None:
+                result['duplicate'] = True
+                return result
+
+        if follow_links:
+            result['links'] = self.find_links(current_url, page.links)
+
+        if not self.keep_soup:
+            result['content'] = page.content
+        return result
+
+    def settings(self, follow_links):
+        """
+        Everything a result depends on besides the page itself. It is stored
+        with the result, so a result cached by one crawl is only reused by a
+        crawl that would have worked out the same.
+        """
+        return {
+            'follow_links': bool(follow_links),
+            'signatures': list(self.signatures) if self.signatures is not None else None,
+            'parser': self.parser,
+            'detector': getattr(self.detector, 'name', type(self.detector).__name__),
+            'collect_pdfs': self.collect_pdfs,
+        }
+
+    def find_pdf_links(self, current_url, hrefs):
+        pdf_urls = []
+        for link in hrefs:
+            href = urljoin(current_url, link)
+            if is_valid_url(href, self.domain) and urlparse(href).path.lower().endswith('.pdf'):
+                pdf_urls.append(normalize_url(href))
+        return pdf_urls
+
+    def find_links(self, current_url, hrefs):
+        links = []
+        for link in hrefs:
+            href = urljoin(current_url, link)
+            if is_valid_url(href, self.domain) and not should_skip_url(href):
+                # Pre-filter new URLs
+                if classify_url(href) is not False:
+                    links.append(href)
+        return links
+
+    def is_english_page(self, page, url_language):
+        """
+        Returns (is_english, stat), where stat names the counter for the check
+        that decided it, or None when the URL pattern already had.
+        """
+        # Only check HTML language tags if URL pattern didn't definitively say it's English
+        if url_language is True:
+            return True, None
+
+        # Check for language meta tags
+        lang_value = page.lang
+        if lang_value:
+            if lang_value != 'en':
+                return False, 'html_tag_detected_non_english'
+            return True, 'html_tag_detected_english'
+
+        # Only perform content language detection if we couldn't determine from URL or HTML tags
+        with metrics.stage('language_detection'):
+            is_english_content = self.detector.is_english(page.text)
+        if is_english_content:
+            return True, 'content_detected_english'
+        return False, 'content_detected_non_english'
+
+# The PageAnalyzer of a parse worker process, set by init_parse_worker
+_worker_analyzer = None
+
+def init_parse_worker(analyzer):
+    """Pool initializer: the analyzer is sent once per worker process, not per page"""
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+def parse_in_worker(url, content, encoding, url_language, follow_links):
+    """
+    Runs in a parse worker process: decode, parse and analyze one page from
+    its raw bytes. Returns (result dict, seconds taken, (stage, seconds)
+    pairs of the stages timed on the way) for record_worker_timings; only
+    that compact dict, never a parsed tree, goes back to the crawl.
+    """
+    started = time.perf_counter()
+    with metrics.capture_stages() as stages:
+        # Decoded as requests would, detecting the charset when the headers give none
+        response = requests.Response()
+        response._content = content
+        response.encoding = encoding
+        page = _worker_analyzer.parse(response.text)
+        result = _worker_analyzer.analyze(url, page, url_language, follow_links)
+    return result, time.perf_counter() - started, stages
+
+def record_worker_timings(seconds, stages):
+    """Observe in this process's metrics the timings a parse worker sent back"""
+    metrics.observe('stage_seconds', seconds, stage='parse_worker')
+    for name, stage_seconds in stages:
+        metrics.observe('stage_seconds', stage_seconds, stage=name)
+
+class SitemapCrawl:
+    """
+    Crawl state and per-page logic shared by the sequential and concurrent crawl loops.
+
+    max_depth stops following links that many clicks from the start page;
+    max_pages and max_bytes stop the crawl once that many pages were fetched
+    or that many bytes downloaded (pages already in flight still finish).
+    Every page fetched is also written to archive (a ResponseArchive) if given.
+    """
+
+    def __init__(self, domain, discover_links, pbar, frontier, stream_extract=False, sitemap=None, journal=None,
+                 cache=None, detector=None, near_duplicates=None, parser='auto', max_depth=None, max_pages=None,
+                 max_bytes=None, max_page_bytes=DEFAULT_MAX_PAGE_BYTES, url_languages=None, on_pdf=None,
+                 parse_workers=0, archive=None):
+        self.domain = domain
+        self.discover_links = discover_links
+        self.pbar = pbar
+        self.frontier = frontier
+        self.stream_extract = stream_extract
+        self.journal = journal
+        self.cache = cache
+        self.detector = make_detector() if detector is None else detector
+        # NearDuplicateIndex of accepted pages, when near-duplicates are dropped too
+        self.near_duplicates = near_duplicates
+        self.parser = parser
+        # Only the html5lib backend gives BeautifulSoup trees to hand back unextracted,
+        # and they stay in the process that parsed them
+        self.keep_soup = not stream_extract and parser == 'html5lib' and not parse_workers
+        # Processes pages are parsed and analyzed in, 0 to do it on the crawl's threads
+        self.parse_workers = parse_workers
+        self.content_hashes = set()
+        self.sitemap = [] if sitemap is None else sitemap
+        self.sitemap_reader = None
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_page_bytes = max_page_bytes
+        # URL language patterns, and the path prefixes learned to be non-English
+        self.url_languages = UrlLanguageClassifier() if url_languages is None else url_languages
+        # Called with each PDF link found, when the crawl collects PDFs too
+        self.on_pdf = on_pdf
+        self.archive = archive
+        signatures = (near_duplicates.num_perm, near_duplicates.shingle_size) if near_duplicates is not None else None
+        self.analyzer = PageAnalyzer(domain, self.detector, parser, self.keep_soup, signatures, on_pdf is not None)
+        # Content types learned per URL pattern, to skip downloads without a request
+        self.content_types = ContentTypeMemory()
+        # Link depth of the pages being processed
+        self.depths = {}
+        self.stats = Counter()
+
+    def next_url(self):
+        current_url, depth = self.frontier.pop_with_depth()
+        self.depths[current_url] = depth
+        return current_url
+
+    def limit_reached(self):
+        if self.max_pages is not None and self.stats['fetched'] >= self.max_pages:
+            return True
+        return self.max_bytes is not None and self.stats['bytes_fetched'] >= self.max_bytes
+
+    def advance(self, current_url):
+        self.pbar.update(1)
+        self.depths.pop(current_url, None)
+        self.stats['processed'] += 1
+        metrics.count('pages_processed')
+        metrics.gauge('queue_depth', len(self.frontier))
+        if self.journal:
+            self.journal.mark_done(current_url)
+            if self.stats['processed'] % 100 == 0:
+                self.journal.set_meta('stats', self.stats)
+
+    def feed_sitemap(self, reader, sitemap_urls):
+        """Queue the pages of the site's sitemaps as they are read, so crawling starts right away"""
+        self.sitemap_reader = reader
+        self.frontier.feed(self.filter_sitemap_urls(reader.urls(sitemap_urls)), on_queued=self.sitemap_queued)
+
+    def filter_sitemap_urls(self, urls, batch_size=500):
+        urls = iter(urls)
+        while True:
+            batch = list(itertools.islice(urls, batch_size))
+            if not batch:
+                return
+            batch = [url for url in batch if not should_skip_url(url)]
             # Pre-filter URLs based on language patterns
-            filtered_to_visit = []
-            print("Pre-filtering URLs based on language patterns...")
-            for url in tqdm(to_visit, desc="Filtering URLs", unit="url"):
-                url_language = is_likely_english_url(url, domain)
-                if url_language is False:  # URL is definitely not English
-                    filtered_by_url += 1
+            for url, url_language in zip(batch, self.url_languages.classify_batch(batch)):
+                if url_language is False:
+                    self.stats['filtered_by_url'] += 1
                     continue
-                filtered_to_visit.append(url)
-            
-            print(f"Filtered out {filtered_by_url} likely non-English URLs based on URL patterns")
-            to_visit = filtered_to_visit
-        else:
-            print("No sitemap found. Falling back to manual spidering.")
+                yield url
 
-    # Create a progress bar for the main processing loop
-    total_urls = len(to_visit)
-    print(f"\nProcessing {total_urls} URLs...")
-    
-    # Create progress bar
-    pbar = tqdm(total=total_urls, desc="Processing pages", unit="page")
-    processed_count = 0
-    
-    while to_visit:
-        current_url = to_visit.pop(0)
-        if current_url in visited:
-            pbar.update(1)
-            processed_count += 1
-            continue
+    def sitemap_queued(self, queued, exhausted):
+        if queued:
+            if self.journal:
+                for url in queued:
+                    self.journal.add_pending(url)
+            self.pbar.total += len(queued)
+            self.pbar.refresh()
+        if exhausted:
+            stats = self.sitemap_reader.stats
+            self.pbar.write(f"Read {stats['urls']} URLs from {stats['sitemaps']} sitemaps "
+                            f"({stats['not_modified']} not modified since the last crawl, "
+                            f"{stats['not_english']} non-English by hreflang)")
+            if self.journal:
+                self.journal.set_meta('sitemap_enumerated', True)
 
-        visited.add(current_url)
-        
-        # Instead of printing each URL, update progress bar description occasionally
-        if processed_count % 10 == 0:
-            remaining = len(to_visit)
-            pbar.set_description(f"Processing pages ({remaining} remaining)")
-        
+    def precheck(self, current_url):
+        """
+        Decide whether a URL popped from the frontier needs to be fetched.
+        Returns (should_fetch, url_language).
+        """
         if should_skip_url(current_url):
-            # Update silent counter without verbose output
-            skipped_files += 1
-            pbar.update(1)
-            processed_count += 1
-            continue
-            
+            self.stats['skipped_files'] += 1
+            self.advance(current_url)
+            return False, None
+        if self.content_types.should_skip(current_url):
+            metrics.count('pages_skipped', reason='pattern')
+            self.skipped(SkippedResponse(current_url, 'pattern'))
+            self.advance(current_url)
+            return False, None
+
         # Check URL pattern for language before downloading
-        url_language = is_likely_english_url(current_url, domain)
+        url_language = self.url_languages.classify(current_url)
         if url_language is False:  # URL is definitely not English
-            non_english_pages += 1
-            url_pattern_detected_non_english += 1
-            filtered_by_url += 1
-            pbar.update(1)
-            processed_count += 1
-            continue
+            self.stats['non_english_pages'] += 1
+            self.stats['url_pattern_detected_non_english'] += 1
+            self.stats['filtered_by_url'] += 1
+            self.advance(current_url)
+            return False, None
         elif url_language is True:
-            url_pattern_detected_english += 1
+            self.stats['url_pattern_detected_english'] += 1
 
-        try:
-            response = requests.get(current_url, timeout=10, allow_redirects=True)
-            content_type = response.headers.get('Content-Type', '').lower()
-            
-            if 'text/html' not in content_type:
-                skipped_files += 1
-                pbar.update(1)
-                processed_count += 1
-                continue
+        self.stats['fetched'] += 1
+        return True, url_language
 
-            soup = BeautifulSoup(response.text, 'html5lib')
-            
-            # Only check HTML language tags if URL pattern didn't definitively say it's English
-            is_english_page = True  # Default to True if we already know from URL pattern
-            
-            if url_language is not True:  # If URL pattern didn't confirm English
-                # Check for language meta tags
-                html_lang = soup.find('html', attrs={'lang': True})
-                meta_lang = soup.find('meta', attrs={'http-equiv': 'content-language'}) or \
-                            soup.find('meta', attrs={'name': 'language'})
-                            
-                lang_value = None
-                if html_lang and html_lang.get('lang'):
-                    lang_value = html_lang.get('lang').lower().split('-')[0]
-                elif meta_lang and meta_lang.get('content'):
-                    lang_value = meta_lang.get('content').lower().split('-')[0]
-                    
-                if lang_value:
-                    if lang_value != 'en':
-                        non_english_pages += 1
-                        html_tag_detected_non_english += 1
-                        pbar.update(1)
-                        processed_count += 1
-                        continue
-                    else:
-                        html_tag_detected_english += 1
-                        is_english_page = True
-                else:
-                    # Only perform content language detection if we couldn't determine from URL or HTML tags
-                    text = soup.get_text()
-                    if is_english(text):
-                        content_detected_english += 1
-                        is_english_page = True
-                    else:
-                        content_detected_non_english += 1
-                        is_english_page = False
-            
-            if is_english_page:
-                # Generate a hash of the page content to check for duplicates
-                text = soup.get_text()
-                content_hash = hashlib.md5(text.encode()).hexdigest()
-                
-                if content_hash not in content_hashes:
-                    content_hashes.add(content_hash)
-                    english_pages.append(current_url)
-                    sitemap.append((current_url, soup))
-                    
-                    # If we're spidering and finding new links
-                    if not use_existing_sitemap and not homepage_only:
-                        new_links = []
-                        for link in soup.find_all('a', href=True):
-                            href = urljoin(current_url, link['href'])
-                            if is_valid_url(href, domain) and href not in visited and not should_skip_url(href):
-                                # Pre-filter new URLs
-                                if is_likely_english_url(href, domain) is not False:
-                                    new_links.append(href)
-                        
-                        # If we found new links, add them and update the progress bar total
-                        if new_links:
-                            to_visit.extend(new_links)
-                            # Update the total in the progress bar
-                            pbar.total += len(new_links)
-                            total_urls += len(new_links)
-                            pbar.refresh()
-            else:
-                non_english_pages += 1
+    def fetch(self, session, url):
+        """Fetch a page, reading its body only if the headers say it is HTML (see fetching.fetch_page)"""
+        response = fetch_page(session, url, self.cache, self.content_types, self.max_page_bytes)
+        if self.archive is not None:
+            self.archive.write(url, response)
+        return response
+
+    def skipped(self, skip):
+        self.stats['skipped_files'] += 1
+        self.stats[f'skipped_{skip.reason}'] += 1
+
+    def reused_result(self, current_url, response):
+        """
+        Last run's result for a page the HTTP cache reports as unchanged, when
+        it may stand in for parsing the page: it was worked out with the
+        settings this crawl would use for the page (see PageAnalyzer.settings).
+        """
+        if self.keep_soup or self.cache is None or not getattr(response, 'from_cache', False):
+            return None
+        result = self.cache.derived(current_url, 'page')
+        if result is None or result.get('settings') != self.analyzer.settings(self.follow_links(current_url)):
+            return None
+        return result
+
+    def handle_response(self, current_url, response, url_language, page=None, result=None):
+        """
+        Classify a fetched page, record it if it is new English content and
+        queue any newly discovered links on the frontier. Unless BeautifulSoup
+        trees are kept, the page's formatted content is extracted while it is
+        parsed, and pages the HTTP cache reports as unchanged reuse last run's
+        result without being parsed, if it was worked out with the same
+        settings (see reused_result). result is analyze_page's result when a
+        parse worker already worked it out.
+        """
+        # Bodies replayed from the HTTP cache or an archive were not downloaded
+        if not getattr(response, 'from_cache', False) and not getattr(response, 'from_archive', False):
+            self.stats['bytes_fetched'] += len(response.content)
+        if not is_html(response):
+            self.stats['skipped_files'] += 1
+            return
+
+        if result is None and page is None:
+            result = self.reused_result(current_url, response)
+            if result is not None:
+                self.cache.count('reparse_skipped')
+                self.apply_result(current_url, result, page)
+                return
+
+        if result is None:
+            if page is None:
+                page = self.parse(response.text)
+            result = self.analyze_page(current_url, page, url_language)
+        if self.cache is not None and not self.keep_soup and not result.get('duplicate'):
+            self.cache.store_derived(current_url, 'page', result)
+
+        self.apply_result(current_url, result, page)
+
+    def parse(self, html):
+        return self.analyzer.parse(html)
 
+    def analyze_page(self, current_url, page, url_language):
+        return self.analyzer.analyze(current_url, page, url_language, self.follow_links(current_url),
+                                     self.content_hashes, self.near_duplicates)
+
+    def follow_links(self, current_url):
+        return self.discover_links and not self.at_max_depth(current_url)
+
+    def apply_result(self, current_url, result, page):
+        for pdf_url in result.get('pdfs', ()):
+            self.stats['pdf_links'] += 1
+            self.on_pdf(pdf_url)
+        if result['language_stat']:
+            self.stats[result['language_stat']] += 1
+            # 'html_tag' or 'content'
+            source = result['language_stat'].split('_detected_', 1)[0]
+            self.url_languages.record(current_url, result['english'], source)
+        if not result['english']:
+            self.stats['non_english_pages'] += 1
+            return
+
+        if result['hash'] in self.content_hashes:
+            return
+
+        if self.near_duplicates is not None:
+            signature = result.get('signature')
+            if self.near_duplicates.query(signature) is not None:
+                self.stats['near_duplicate_pages'] += 1
+                return
+            self.near_duplicates.add(current_url, signature)
+            if self.journal and signature:
+                self.journal.add_signature(current_url, signature)
+
+        self.content_hashes.add(result['hash'])
+        self.stats['english_pages'] += 1
+        if self.journal:
+            self.journal.add_content_hash(result['hash'])
+
+        self.queue_links(result.get('links', []), self.depths.get(current_url, 0) + 1)
+
+        if self.keep_soup:
+            self.sitemap.append((current_url, page.soup))
+        elif result['content']:
+            self.sitemap.append((current_url, result['content']))
+
+    def at_max_depth(self, current_url):
+        return self.max_depth is not None and self.depths.get(current_url, 0) >= self.max_depth
+
+    def queue_links(self, links, depth=0):
+        new_links = 0
+        for href in links:
+            # The frontier drops links that were already seen
+            queued = self.frontier.add(href, depth)
+            if queued:
+                new_links += 1
+                if self.journal:
+                    self.journal.add_pending(queued, depth)
+
+        # If we found new links, update the total in the progress bar
+        if new_links:
+            self.pbar.total += new_links
+            self.pbar.refresh()
+
+    def print_summary(self):
+        stats = self.stats
+        print(f"\nSitemap creation complete.")
+        if self.limit_reached():
+            print(f"Stopped at the crawl limit: {stats['fetched']} pages fetched, {stats['bytes_fetched']} bytes")
+        print(f"Total unique English pages to be saved: {stats['english_pages']}")
+        print(f"Total non-English pages skipped: {stats['non_english_pages']}")
+        if self.near_duplicates is not None:
+            print(f"Total near-duplicate pages skipped: {stats['near_duplicate_pages']}")
+        print(f"Total files skipped based on extension or content type: {stats['skipped_files']}")
+        if stats['skipped_content_type'] or stats['skipped_pattern'] or stats['skipped_too_large'] or stats['skipped_too_slow']:
+            print(f"  - Not HTML by their headers, body not downloaded: {stats['skipped_content_type']}")
+            print(f"  - Not requested, URL pattern known to serve no HTML: {stats['skipped_pattern']}")
+            print(f"  - Larger than {self.max_page_bytes} bytes or too slow to read: "
+                  f"{stats['skipped_too_large'] + stats['skipped_too_slow']}")
+        print(f"Total pages disallowed by robots.txt: {stats['robots_disallowed']}")
+        if self.on_pdf is not None:
+            print(f"PDF links handed to the download queue: {stats['pdf_links']}")
+        print(f"Total pages filtered by URL pattern before processing: {stats['filtered_by_url']}")
+        learned = self.url_languages.stats
+        if learned['learned'] or self.url_languages.blocked:
+            print(f"  - Under path prefixes learned to be non-English: {learned['learned']} "
+                  f"({len(self.url_languages.blocked)} prefixes, {learned['prefixes_learned']} learned this crawl)")
+        print(f"\nLanguage Detection Statistics:")
+        print(f"URLs detected as English by pattern: {stats['url_pattern_detected_english']}")
+        print(f"URLs detected as non-English by pattern: {stats['url_pattern_detected_non_english']}")
+        print(f"Pages detected as English by HTML/meta tags: {stats['html_tag_detected_english']}")
+        print(f"Pages detected as non-English by HTML/meta tags: {stats['html_tag_detected_non_english']}")
+        print(f"Pages requiring full content language detection: {stats['content_detected_english'] + stats['content_detected_non_english']}")
+        print(f"  - Confirmed English by content: {stats['content_detected_english']}")
+        print(f"  - Determined non-English by content: {stats['content_detected_non_english']}")
+
+def crawl_sequential(crawl, session=None):
+    session = session or make_session(pool_size=1)
+    frontier = crawl.frontier
+
+    while frontier and not crawl.limit_reached():
+        current_url = crawl.next_url()
+
+        # Instead of printing each URL, update progress bar description occasionally
+        if crawl.stats['processed'] % 10 == 0:
+            crawl.pbar.set_description(f"Processing pages ({len(frontier)} remaining)")
+
+        should_fetch, url_language = crawl.precheck(current_url)
+        if not should_fetch:
+            continue
+
+        try:
+            response = crawl.fetch(session, current_url)
+            crawl.handle_response(current_url, response, url_language)
+        except SkippedResponse as skip:
+            crawl.skipped(skip)
+        except RobotsDisallowed:
+            crawl.stats['robots_disallowed'] += 1
         except Exception as e:
+            metrics.error('crawl', e)
             # Just log errors to the progress bar's display
-            pbar.write(f"Error processing {current_url}: {str(e)}")
-        
-        # Update progress bar
-        pbar.update(1)
-        processed_count += 1
-    
+            crawl.pbar.write(f"Error processing {current_url}: {str(e)}")
+
+        crawl.advance(current_url)
+
+def fetch_and_parse(crawl, session, url):
+    """Fetch a page and parse it if it is HTML; runs on a worker thread"""
+    response = crawl.fetch(session, url)
+    page = None
+    # Unchanged pages may not need parsing at all, handle_response decides
+    if is_html(response) and crawl.reused_result(url, response) is None:
+        page = crawl.parse(response.text)
+    return response, page
+
+async def crawl_concurrent(crawl, concurrency, per_host_limit, session=None, executor=None, parse_pool=None):
+    """
+    Crawl with a bounded pool of asyncio tasks. Fetching and parsing run on
+    a thread pool sharing one keep-alive Session, and at most per_host_limit
+    requests are in flight to any single host. A session and executor can be
+    passed in to share them between several crawls; they are left open.
+
+    With a parse_pool (a ProcessPoolExecutor set up by init_parse_worker) the
+    threads only fetch: each page's raw bytes go to a worker process, which
+    parses, detects the language, hashes, extracts the content and finds the
+    links, and sends back the compact result dict. Up to concurrency pages
+    are in flight across both stages, so keep it above the number of workers.
+    """
+    loop = asyncio.get_running_loop()
+    own_pools = executor is None
+    session = session or make_session(pool_size=concurrency)
+    executor = executor or ThreadPoolExecutor(max_workers=concurrency)
+    frontier = crawl.frontier
+    host_limits = {}
+
+    async def process(current_url):
+        should_fetch, url_language = crawl.precheck(current_url)
+        if not should_fetch:
+            return
+
+        host = urlparse(current_url).netloc
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(per_host_limit)
+
+        try:
+            async with host_limits[host]:
+                if parse_pool is None:
+                    response, page = await loop.run_in_executor(executor, fetch_and_parse, crawl, session, current_url)
+                else:
+                    response = await loop.run_in_executor(executor, crawl.fetch, session, current_url)
+                    page = None
+            result = None
+            if (parse_pool is not None and is_html(response)
+                    and crawl.reused_result(current_url, response) is None):
+                result, seconds, stages = await loop.run_in_executor(parse_pool, parse_in_worker, current_url,
+                                                                     response.content, response.encoding,
+                                                                     url_language, crawl.follow_links(current_url))
+                record_worker_timings(seconds, stages)
+            crawl.handle_response(current_url, response, url_language, page, result)
+        except SkippedResponse as skip:
+            crawl.skipped(skip)
+        except RobotsDisallowed:
+            crawl.stats['robots_disallowed'] += 1
+        except Exception as e:
+            metrics.error('crawl', e)
+            crawl.pbar.write(f"Error processing {current_url}: {str(e)}")
+
+        crawl.advance(current_url)
+        if crawl.stats['processed'] % 10 == 0:
+            crawl.pbar.set_description(f"Processing pages ({len(frontier)} remaining)")
+
+    in_flight = set()
+    # The next batch of sitemap URLs, read on a thread: the loop never waits
+    # on a sitemap download while pages are in flight (see Frontier.take_batch)
+    refill = None
+    try:
+        while True:
+            if refill is None and frontier.needs_refill() and not crawl.limit_reached():
+                refill = loop.run_in_executor(executor, frontier.take_batch)
+            while len(frontier) and len(in_flight) < concurrency and not crawl.limit_reached():
+                in_flight.add(asyncio.create_task(process(crawl.next_url())))
+            waiting = in_flight | {refill} if refill is not None else in_flight
+            if not waiting:
+                break
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if refill in done:
+                frontier.queue_batch(*refill.result())
+                refill = None
+            in_flight -= done
+            metrics.gauge('pages_in_flight', len(in_flight))
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        if own_pools:
+            executor.shutdown(wait=True)
+            session.close()
+
+class CrawlOptions:
+    """
+    Settings for create_sitemap. The defaults spider the whole domain one page
+    at a time, without a journal, cache or archive.
+
+    use_existing_sitemap reads the site's sitemaps into the frontier instead of
+    following links (sitemap_since skips older entries); homepage_only crawls
+    just homepage_links. concurrency > 1 fetches that many pages at once, at
+    most per_host_limit per host, and parse_workers > 0 parses pages in that
+    many processes. visited_set is 'set', 'hashed' or 'bloom' (see
+    crawl_frontier.make_visited_set). stream_extract extracts each page's
+    content as it arrives (spooled to spool_path if set) instead of keeping
+    html5lib soups. journal_path journals the crawl so resume can finish it,
+    cache_dir keeps an HttpCache, url_language_path the URL prefixes learned
+    to be non-English and archive_path every response fetched (see
+    replay_archive). language_detector, near_duplicate_threshold and parser
+    pick how pages are judged, and max_depth, max_pages, max_bytes and
+    max_page_bytes bound the crawl (see SitemapCrawl).
+    """
+
+    def __init__(self, use_existing_sitemap=False, homepage_only=False, homepage_links=None, concurrency=1,
+                 per_host_limit=4, visited_set='set', stream_extract=False, spool_path=None, journal_path=None,
+                 resume=False, cache_dir=None, language_detector='auto', near_duplicate_threshold=None,
+                 parser='auto', sitemap_since=None, max_depth=None, max_pages=None, max_bytes=None,
+                 max_page_bytes=DEFAULT_MAX_PAGE_BYTES, url_language_path=None, parse_workers=0,
+                 archive_path=None):
+        self.use_existing_sitemap = use_existing_sitemap
+        self.homepage_only = homepage_only
+        self.homepage_links = homepage_links
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.visited_set = visited_set
+        self.stream_extract = stream_extract
+        self.spool_path = spool_path
+        self.journal_path = journal_path
+        self.resume = resume
+        self.cache_dir = cache_dir
+        self.language_detector = language_detector
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.parser = parser
+        self.sitemap_since = sitemap_since
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_page_bytes = max_page_bytes
+        self.url_language_path = url_language_path
+        self.parse_workers = parse_workers
+        self.archive_path = archive_path
+
+def create_sitemap(start_url, options=None, on_pdf=None, session=None, executor=None):
+    """
+    Crawl a site as options (a CrawlOptions) say and return (url, html string)
+    pairs for its unique English pages; as_soups converts them for code that
+    expects the (url, soup) pairs earlier versions returned. on_pdf is called
+    with each same-domain PDF link found, and a session and executor can be
+    shared between crawls (see slurp.py).
+    """
+    options = options or CrawlOptions()
+    domain = urlparse(start_url).netloc
+    to_visit = list(options.homepage_links) if options.homepage_only else [start_url]
+    journal = CrawlJournal(options.journal_path) if options.journal_path else None
+    cache = HttpCache(options.cache_dir) if options.cache_dir else None
+    detector = make_detector(options.language_detector)
+    print(f"Content language detection: {getattr(detector, 'name', type(detector).__name__)}")
+    threshold = options.near_duplicate_threshold
+    near_duplicates = NearDuplicateIndex(threshold) if threshold else None
+    url_languages = UrlLanguageClassifier(options.url_language_path)
+    archive = ResponseArchive(options.archive_path, append=options.resume) if options.archive_path else None
+
+    limits = dict(max_depth=options.max_depth, max_pages=options.max_pages, max_bytes=options.max_bytes,
+                  max_page_bytes=options.max_page_bytes, parse_workers=options.parse_workers, archive=archive)
+    if journal and options.resume and journal.has_state():
+        return resume_sitemap(journal, domain, options, cache, detector, near_duplicates, limits, session,
+                              executor, url_languages, on_pdf)
+    if journal:
+        journal.reset()
+
+    sitemap_urls = None
+    if options.use_existing_sitemap and not options.homepage_only:
+        parts = urlparse(start_url)
+        sitemap_urls = find_sitemaps(make_session(), domain, parts.scheme or 'https')
+        if sitemap_urls:
+            print(f"Using existing sitemap: {', '.join(sitemap_urls)}")
+            to_visit = []
+        else:
+            print("No sitemap found. Falling back to manual spidering.")
+
+    frontier = Frontier(to_visit, visited=options.visited_set)
+
+    # Create a progress bar for the main processing loop
+    total_urls = len(frontier)
+    print(f"\nProcessing {total_urls} URLs...")
+    pbar = tqdm(total=total_urls, desc="Processing pages", unit="page")
+
+    # Only follow links when we are spidering rather than working from a fixed list
+    discover_links = not options.use_existing_sitemap and not options.homepage_only
+    stream_extract = options.stream_extract
+    if journal:
+        sitemap = journal.pages
+        stream_extract = True
+        journal.set_meta('discover_links', discover_links)
+        for url in frontier.queue:
+            journal.add_pending(url)
+        journal.commit()
+    else:
+        sitemap = ContentSpool(options.spool_path) if stream_extract and options.spool_path else None
+    crawl = SitemapCrawl(domain, discover_links, pbar, frontier, stream_extract, sitemap, journal, cache, detector,
+                         near_duplicates, options.parser, url_languages=url_languages, on_pdf=on_pdf, **limits)
+    if sitemap_urls:
+        since = options.sitemap_since
+        if journal:
+            journal.set_meta('sitemaps', sitemap_urls)
+            journal.set_meta('sitemap_since', str(since) if since else None)
+        crawl.feed_sitemap(SitemapReader(make_session(), since=since), sitemap_urls)
+
+    return run_crawl(crawl, options.concurrency, options.per_host_limit, session, executor)
+
+def resume_sitemap(journal, domain, options, cache=None, detector=None, near_duplicates=None, limits=None,
+                   session=None, executor=None, url_languages=None, on_pdf=None):
+    """Rebuild the crawl state saved in a journal and finish the crawl"""
+    frontier = Frontier(visited=options.visited_set)
+    for url in journal.visited_urls():
+        frontier.mark_visited(url)
+    for url, depth in journal.pending_with_depth():
+        frontier.add(url, depth)
+
+    print(f"Resuming crawl from {journal.path}: {len(frontier)} URLs left to process")
+    pbar = tqdm(total=len(frontier), desc="Processing pages", unit="page")
+
+    crawl = SitemapCrawl(domain, journal.get_meta('discover_links', True), pbar, frontier,
+                         stream_extract=True, sitemap=journal.pages, journal=journal, cache=cache,
+                         detector=detector, near_duplicates=near_duplicates, parser=options.parser,
+                         url_languages=url_languages, on_pdf=on_pdf, **(limits or {}))
+    crawl.content_hashes = journal.content_hashes()
+    if journal.get_meta('sitemaps') and not journal.get_meta('sitemap_enumerated'):
+        # Read the sitemaps again; the frontier drops pages already seen
+        reader = SitemapReader(make_session(), since=journal.get_meta('sitemap_since'))
+        crawl.feed_sitemap(reader, journal.get_meta('sitemaps'))
+    if near_duplicates is not None:
+        for url, signature in journal.signatures():
+            near_duplicates.add(url, signature)
+    crawl.stats.update(journal.get_meta('stats', {}))
+
+    return run_crawl(crawl, options.concurrency, options.per_host_limit, session, executor)
+
+def run_crawl(crawl, concurrency, per_host_limit, session=None, executor=None):
+    parse_pool = None
+    try:
+        if crawl.parse_workers:
+            parse_pool = ProcessPoolExecutor(max_workers=crawl.parse_workers, initializer=init_parse_worker,
+                                             initargs=(crawl.analyzer,))
+        if concurrency > 1 or parse_pool is not None:
+            asyncio.run(crawl_concurrent(crawl, concurrency, per_host_limit, session, executor, parse_pool))
+        else:
+            crawl_sequential(crawl, session)
+        if crawl.journal:
+            crawl.journal.set_meta('crawl_complete', True)
+    finally:
+        if parse_pool:
+            parse_pool.shutdown()
+        # Persist progress even when the crawl is interrupted
+        if crawl.journal:
+            crawl.journal.set_meta('stats', crawl.stats)
+            crawl.journal.commit()
+        crawl.url_languages.save()
+        if crawl.archive:
+            crawl.archive.close()
+
     # Close the progress bar
-    pbar.close()
-
-    print(f"\nSitemap creation complete.")
-    print(f"Total unique English pages to be saved: {len(english_pages)}")
-    print(f"Total non-English pages skipped: {non_english_pages}")
-    print(f"Total files skipped based on extension or content type: {skipped_files}")
-    print(f"Total pages filtered by URL pattern before processing: {filtered_by_url}")
-    print(f"\nLanguage Detection Statistics:")
-    print(f"URLs detected as English by pattern: {url_pattern_detected_english}")
-    print(f"URLs detected as non-English by pattern: {url_pattern_detected_non_english}")
-    print(f"Pages detected as English by HTML/meta tags: {html_tag_detected_english}")
-    print(f"Pages detected as non-English by HTML/meta tags: {html_tag_detected_non_english}")
-    print(f"Pages requiring full content language detection: {content_detected_english + content_detected_non_english}")
-    print(f"  - Confirmed English by content: {content_detected_english}")
-    print(f"  - Determined non-English by content: {content_detected_non_english}")
-
-    return sitemap
+    crawl.pbar.close()
+    crawl.print_summary()
+    if crawl.cache:
+        crawl.cache.print_report()
+
+    return crawl.sitemap
+
+def replay_archive(archive_path, options=None):
+    """
+    Process the pages of an archive written with CrawlOptions(archive_path=...)
+    again as the crawl did, offline, and return the (url, content) pairs.
+    options gives the language detector, threshold, parser and parse_workers.
+    """
+    options = options or CrawlOptions()
+    workers = options.parse_workers
+    entries = read_index(archive_path)
+    # A URL archived more than once (a resumed crawl) counts with its last response
+    latest = {entry[0]: i for i, entry in enumerate(entries)}
+    entries = [entry for i, entry in enumerate(entries) if latest[entry[0]] == i]
+    domain = urlparse(entries[0][0]).netloc if entries else ''
+    detector = make_detector(options.language_detector)
+    print(f"Content language detection: {getattr(detector, 'name', type(detector).__name__)}")
+    threshold = options.near_duplicate_threshold
+    near_duplicates = NearDuplicateIndex(threshold) if threshold else None
+
+    print(f"\nReplaying {len(entries)} archived responses from {archive_path}...")
+    pbar = tqdm(total=len(entries), desc="Replaying pages", unit="page")
+    crawl = SitemapCrawl(domain, False, pbar, Frontier(), stream_extract=True, detector=detector,
+                         near_duplicates=near_duplicates, parser=options.parser, parse_workers=workers)
+    parse_pool = None
+    if workers:
+        parse_pool = ProcessPoolExecutor(max_workers=workers, initializer=init_parse_worker,
+                                         initargs=(crawl.analyzer,))
+    # Pages handed to the workers, applied in archive order so the result does not depend on timing
+    in_flight = deque()
+
+    def finish(url, response, url_language, future):
+        try:
+            result = None
+            if future is not None:
+                result, seconds, stages = future.result()
+                record_worker_timings(seconds, stages)
+            crawl.handle_response(url, response, url_language, result=result)
+        except Exception as e:
+            crawl.pbar.write(f"Error processing {url}: {str(e)}")
+        crawl.advance(url)
+
+    try:
+        with open(archive_path, 'rb') as f:
+            for url, offset, length, status, content_type in entries:
+                response = read_record(f, offset, length).to_response()
+                # The crawl never fetched what its URL pattern said was not English
+                url_language = classify_url(url)
+                if url_language is False:
+                    crawl.stats['non_english_pages'] += 1
+                    crawl.stats['url_pattern_detected_non_english'] += 1
+                    crawl.advance(url)
+                    continue
+                elif url_language is True:
+                    crawl.stats['url_pattern_detected_english'] += 1
+                future = None
+                if parse_pool is not None and is_html(response):
+                    future = parse_pool.submit(parse_in_worker, url, response.content, response.encoding,
+                                               url_language, False)
+                in_flight.append((url, response, url_language, future))
+                while in_flight and (parse_pool is None or len(in_flight) > workers * 4):
+                    finish(*in_flight.popleft())
+            while in_flight:
+                finish(*in_flight.popleft())
+    finally:
+        if parse_pool:
+            parse_pool.shutdown()
+
+    crawl.pbar.close()
+    crawl.print_summary()
+    return crawl.sitemap
+
+def as_soups(sitemap):
+    """
+    (url, BeautifulSoup) pairs of the pages create_sitemap returned, for code
+    written when it returned soups; each soup holds the page's formatted
+    content rather than the whole page.
+    """
+    from bs4 import BeautifulSoup
+    for url, content in sitemap:
+        yield url, BeautifulSoup(content, 'html.parser') if isinstance(content, str) else content
 
 def remove_common_elements(contents):
+    from bs4 import BeautifulSoup
     # Convert BeautifulSoup objects to strings for comparison
     string_contents = [str(content) for content in contents]
     
@@ -485,56 +1005,148 @@ def remove_common_elements(contents):
     
     return cleaned_contents
 
-def process_content(sitemap, output_file):
+def line_fingerprint(line):
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest()
+
+def find_common_lines(contents):
+    """
+    First pass of the streaming boilerplate removal: count line occurrences by
+    fingerprint and return the fingerprints of lines seen more often than in
+    half the pages, the same rule remove_common_elements applies.
+    """
+    line_counter = Counter()
+    total_pages = 0
+    for content in contents:
+        line_counter.update(line_fingerprint(line) for line in content.split('\n'))
+        total_pages += 1
+    return {fingerprint for fingerprint, count in line_counter.items() if count > total_pages * 0.5}
+
+def write_without_common_lines(contents, common_lines, writer):
+    """Second pass: drop common lines from each page and stream it to the writer"""
+    for content in contents:
+        writer.write('\n'.join(line for line in content.split('\n') if line_fingerprint(line) not in common_lines))
+
+def page_content(soup):
+    """Formatted content of a crawled page; streamed crawls hand over content that was already extracted"""
+    if isinstance(soup, str):
+        return soup
+    with metrics.stage('extraction'):
+        return extract_formatted_content(soup)
+
+def process_content_two_pass(sitemap, output_file):
+    """
+    Disk-backed variant of process_content for large crawls: pages are spooled
+    as strings, common lines are counted in one pass and filtered out in a
+    second pass that writes straight to the chunk files, without re-parsing.
+    Already extracted content (a ContentSpool, journal pages or a list of
+    strings) is read twice in place.
+    """
+    spool = sitemap
+    first = next(iter(sitemap), None)
+    if first is not None and not isinstance(first[1], str):
+        spool = ContentSpool()
+        print("Extracting content from pages...")
+        for url, soup in tqdm(sitemap, desc="Extracting content", unit="page"):
+            content = page_content(soup)
+            if content:
+                spool.append((url, str(content)))
+
+    try:
+        print("\nCounting common elements (like menus and footers)...")
+        with metrics.stage('boilerplate_removal'):
+            common_lines = find_common_lines(content for url, content in spool)
+
+        print("Removing common elements and saving content...")
+        with ChunkWriter(output_file) as writer:
+            pages = tqdm(spool, total=len(spool), desc="Saving content", unit="page")
+            write_without_common_lines((content for url, content in pages), common_lines, writer)
+    finally:
+        if spool is not sitemap:
+            spool.close()
+
+    return len(spool)
+
+def process_content(sitemap, output_file, two_pass=False):
+    if two_pass:
+        return process_content_two_pass(sitemap, output_file)
+
     all_content = []
     total_pages = len(sitemap)
 
     print("Extracting content from pages...")
     # Create progress bar for content extraction
     for i, (url, soup) in enumerate(tqdm(sitemap, desc="Extracting content", unit="page")):
-        content = extract_formatted_content(soup)
+        content = page_content(soup)
         if content:
             all_content.append(content)
     
     print("\nRemoving common elements (like menus and footers)...")
     # We don't need a progress bar here since it's a single operation
-    cleaned_content = remove_common_elements(all_content)
-
-    print("Combining content...")
-    combined_content = ''.join(str(content) for content in cleaned_content)
+    with metrics.stage('boilerplate_removal'):
+        cleaned_content = remove_common_elements(all_content)
 
     print("Saving content...")
-    save_chunks(combined_content, output_file)
+    with ChunkWriter(output_file) as writer:
+        for content in cleaned_content:
+            writer.write(str(content))
     
     return len(all_content)
-def main():
+def main(resume=False):
     start_url = input("Enter the domain to spider (e.g., https://example.com): ")
-    spider_type = input("Would you like to spider: \n1. The entire domain\n2. Only links from homepage\nEnter 1 or 2: ")
-    
     domain = urlparse(start_url).netloc
-    use_existing_sitemap = False
+    journal_path = f"{domain.replace(':', '_')}.journal.sqlite"
+    # Path prefixes learned to be non-English, kept for the next crawl of the domain
+    url_language_path = f"{domain.replace(':', '_')}.url_languages.json"
+    # Responses are cached between runs so re-crawls only download what changed
+    cache_dir = '.http_cache'
+    # Only exact duplicates are dropped; e.g. 0.9 also drops pages at least 90%
+    # similar to one already kept
+    near_duplicate_threshold = None
+    resume = ask_to_resume(journal_path, resume=resume)
+
+    if not resume:
+        spider_type = input("Would you like to spider: \n1. The entire domain\n2. Only links from homepage\nEnter 1 or 2: ")
+    concurrency = input("How many pages should be fetched at once? (press Enter for 1): ")
+    concurrency = int(concurrency) if concurrency.strip().isdigit() else 1
     
-    if spider_type == "2":
+    options = CrawlOptions(concurrency=concurrency, journal_path=journal_path, resume=resume, cache_dir=cache_dir,
+                           near_duplicate_threshold=near_duplicate_threshold, url_language_path=url_language_path)
+    
+    if resume:
+        sitemap = create_sitemap(start_url, options)
+    elif spider_type == "2":
         print(f"\nAnalyzing homepage: {start_url}")
         homepage_links = get_homepage_links(start_url, domain)
         print(f"Found {len(homepage_links)} unique content links on homepage")
         
         # Create artificial sitemap from homepage links
-        sitemap = create_sitemap(start_url, use_existing_sitemap=False, homepage_only=True, homepage_links=homepage_links)
+        options.homepage_only = True
+        options.homepage_links = homepage_links
+        sitemap = create_sitemap(start_url, options)
     else:
-        sitemap_url = find_sitemap(urlparse(start_url).netloc)
+        sitemap_url = find_sitemap(domain, scheme=urlparse(start_url).scheme or 'https')
         if sitemap_url:
             print(f"Sitemap found at: {sitemap_url}")
             use_sitemap = input("Would you like to use this sitemap instead of manually spidering the site? (y/n): ")
-            use_existing_sitemap = use_sitemap.lower() == 'y'
-        sitemap = create_sitemap(start_url, use_existing_sitemap)
+            options.use_existing_sitemap = use_sitemap.lower() == 'y'
+        sitemap = create_sitemap(start_url, options)
     
     output_file = input("Enter the base filename to save the data (e.g., extracted_content): ")
     
     print("\nProcessing content...")
-    process_content(sitemap, output_file)
+    process_content(sitemap, output_file, two_pass=True)
     
     print("\nProcess complete.")
 
 if __name__ == "__main__":
-    main()
+    # Metrics sinks are set with CONTENT_SLURPERS_METRICS, see metrics.configure_from_env
+    metrics.configure_from_env()
+    try:
+        if sys.argv[1:] and sys.argv[1:] != ['--resume']:
+            # Arguments run the non-interactive CLI, see slurp.py
+            import slurp
+            slurp.main(['crawl'] + sys.argv[1:])
+        else:
+            main(resume='--resume' in sys.argv[1:])
+    finally:
+        metrics.shutdown()
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import metrics
+from request_scheduler import RequestScheduler, set_default_scheduler
+from synthetic_site import SyntheticSite, make_pdf_corpus
+
+STAGES = ('create_sitemap', 'process_content', 'spider_domain', 'download_pdfs', 'spider_directory')
+
+MB = 1024 * 1024
+
+
+def reset_peak_rss():
+    """Start a new peak RSS measurement where the OS allows it (Linux); returns whether it did"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, since the last reset_peak_rss on Linux"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def children_peak_rss_mb():
+    """Largest peak resident memory of any finished child process (e.g. extraction workers) in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def rate(amount, seconds):
+    return round(amount / seconds, 3) if seconds > 0 else None
+
+
+def run_stage(results, name, func):
+    """
+    Run one stage and record it in results. func returns a dict with 'count'
+    and 'unit' (what was processed), 'bytes' (how much data) and any extra
+    figures to report; wall and CPU time, throughput, peak memory and the
+    stage's metrics (time per step, bytes, errors) are added here. The
+    stage's own output goes to stderr so stdout stays JSON.
+    """
+    print(f"Running {name}...", file=sys.stderr)
+    metrics.reset()
+    peak_reset = reset_peak_rss()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    with contextlib.redirect_stdout(sys.stderr):
+        stage = func()
+    seconds = time.perf_counter() - started
+
+    stage['seconds'] = round(seconds, 3)
+    stage['cpu_seconds'] = round(time.process_time() - cpu_started, 3)
+    stage['per_sec'] = rate(stage['count'], seconds)
+    stage['mb'] = round(stage['bytes'] / MB, 3)
+    stage['mb_per_sec'] = rate(stage['bytes'] / MB, seconds)
+    stage['peak_rss_mb'] = peak_rss_mb()
+    # Without a reset the peak covers everything the process did so far
+    stage['peak_rss_is_stage_only'] = peak_reset
+    stage['children_peak_rss_mb'] = children_peak_rss_mb()
+    stage['breakdown'] = metrics_breakdown(metrics.snapshot())
+    results[name] = stage
+    print(f"{name}: {stage['count']} {stage['unit']}s in {seconds:.2f}s ({stage['per_sec']}/s)", file=sys.stderr)
+
+
+def metrics_breakdown(snapshot):
+    """The parts of a metrics snapshot worth keeping in a report: counters and histogram summaries"""
+    histograms = {
+        key: {field: histogram[field] for field in ('count', 'sum', 'mean', 'p50', 'p90', 'p99', 'max')}
+        for key, histogram in snapshot['histograms'].items()
+    }
+    return {'counters': snapshot['counters'], 'histograms': histograms}
+
+
+def served_since(site, before, kind):
+    return site.served[kind] - before[kind], site.served[kind + '_bytes'] - before[kind + '_bytes']
+
+
+def directory_size(directory):
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+def run_benchmark(pages=500, fan_out=5, duplicate_ratio=0.1, languages=None, pdf_ratio=0.1, pdf_pages=3,
+                  words=300, declare_language=0.5, delay=0.0, pdf_corpus=50, corpus_pages=5, concurrency=8,
+                  workers=4, stages=STAGES, polite=False, seed=0, work_dir=None, pdf_engine='pypdf2', parse_workers=0):
+    """
+    Serve a synthetic site locally, generate a PDF corpus, run the selected
+    stages against them and return the results as a JSON-ready dict. Unless
+    polite is set, the per-host rate limit is lifted so the numbers measure
+    the code rather than the scheduler's pacing.
+    """
+    import Web_to_Single_HTML_File_Spider as spider
+    import Single_Domain_PDF_Scraper as pdf_scraper
+    import PDF_Text_Converter as pdf_converter
+    from chunk_writer import TextChunkWriter
+
+    if not polite:
+        set_default_scheduler(RequestScheduler(rate=10000.0, burst=10000, max_rate=10000.0))
+
+    config = dict(pages=pages, fan_out=fan_out, duplicate_ratio=duplicate_ratio, languages=languages,
+                  pdf_ratio=pdf_ratio, pdf_pages=pdf_pages, words=words, declare_language=declare_language,
+                  delay=delay, pdf_corpus=pdf_corpus, corpus_pages=corpus_pages, concurrency=concurrency,
+                  workers=workers, stages=list(stages), polite=polite, seed=seed, pdf_engine=pdf_engine,
+                  parse_workers=parse_workers)
+    results = {}
+    report = {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'stages': results,
+    }
+
+    site = SyntheticSite(pages, fan_out, duplicate_ratio, languages, pdf_ratio, pdf_pages, words,
+                         declare_language, delay=delay, seed=seed)
+    with site, tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        config['languages'] = site.languages
+        sitemap = None
+        pdf_urls = None
+
+        if 'create_sitemap' in stages or 'process_content' in stages:
+            def crawl():
+                nonlocal sitemap
+                before = site.served.copy()
+                options = spider.CrawlOptions(concurrency=concurrency, parse_workers=parse_workers)
+                sitemap = spider.create_sitemap(site.url, options)
+                fetched, fetched_bytes = served_since(site, before, 'page')
+                return {'unit': 'page', 'count': fetched, 'bytes': fetched_bytes, 'pages_kept': len(sitemap)}
+            run_stage(results, 'create_sitemap', crawl)
+
+        if 'process_content' in stages:
+            def process():
+                output_file = os.path.join(scratch, 'content', 'extracted_content')
+                os.makedirs(os.path.dirname(output_file))
+                count = spider.process_content(sitemap, output_file)
+                return {'unit': 'page', 'count': count, 'bytes': directory_size(os.path.dirname(output_file))}
+            run_stage(results, 'process_content', process)
+        sitemap = None
+
+        if 'spider_domain' in stages or 'download_pdfs' in stages:
+            def spider_pdfs():
+                nonlocal pdf_urls
+                before = site.served.copy()
+                pdf_urls = pdf_scraper.spider_domain(site.url)
+                fetched, fetched_bytes = served_since(site, before, 'page')
+                return {'unit': 'page', 'count': fetched, 'bytes': fetched_bytes, 'pdfs_found': len(pdf_urls)}
+            run_stage(results, 'spider_domain', spider_pdfs)
+
+        if 'download_pdfs' in stages:
+            def download():
+                folder = os.path.join(scratch, 'downloads')
+                os.makedirs(folder)
+                before = site.served.copy()
+                saved = pdf_scraper.download_pdfs(pdf_urls, folder, workers=concurrency)
+                fetched, fetched_bytes = served_since(site, before, 'pdf')
+                return {'unit': 'pdf', 'count': fetched, 'bytes': fetched_bytes, 'pdfs_saved': saved}
+            run_stage(results, 'download_pdfs', download)
+
+        if 'spider_directory' in stages:
+            corpus = os.path.join(scratch, 'corpus')
+            paths, total_pages, total_bytes = make_pdf_corpus(corpus, pdf_corpus, corpus_pages, words,
+                                                              duplicate_ratio, seed=seed)
+
+            def extract():
+                output_file = os.path.join(scratch, 'pdf_text', 'output.txt')
+                os.makedirs(os.path.dirname(output_file))
+                with TextChunkWriter(output_file) as writer:
+                    pdf_converter.spider_directory(corpus, workers=workers, writer=writer, engine=pdf_engine)
+                return {'unit': 'pdf', 'count': len(paths), 'bytes': total_bytes, 'pdf_pages': total_pages,
+                        'text_bytes': directory_size(os.path.dirname(output_file))}
+            run_stage(results, 'spider_directory', extract)
+            stage = results['spider_directory']
+            stage['pdf_pages_per_sec'] = rate(total_pages, stage['seconds'])
+
+        report['requests_served'] = dict(site.served)
+    peaks = [stage['peak_rss_mb'] for stage in results.values() if stage['peak_rss_mb'] is not None]
+    report['peak_rss_mb'] = max(peaks) if peaks else None
+    return report
+
+
+def parse_languages(value):
+    """'en=0.9,fr=0.1' as {'en': 0.9, 'fr': 0.1}"""
+    languages = {}
+    for part in value.split(','):
+        language, _, share = part.partition('=')
+        languages[language.strip()] = float(share) if share else 1.0
+    return languages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the spiders and the PDF converter on a local synthetic site.")
+    parser.add_argument('--pages', type=int, default=500, help="pages on the synthetic site")
+    parser.add_argument('--fan-out', type=int, default=5, help="links from each page to other pages")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help="share of pages and PDFs repeating another's text")
+    parser.add_argument('--languages', type=parse_languages, default=None, help="share of pages per language, e.g. en=0.9,fr=0.1")
+    parser.add_argument('--pdf-ratio', type=float, default=0.1, help="share of pages linking a PDF")
+    parser.add_argument('--pdf-pages', type=int, default=3, help="pages in each PDF on the site")
+    parser.add_argument('--words', type=int, default=300, help="words of text per page")
+    parser.add_argument('--declare-language', type=float, default=0.5, help="share of pages with <html lang>")
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds the server waits before each response")
+    parser.add_argument('--pdf-corpus', type=int, default=50, help="PDFs in the generated directory for spider_directory")
+    parser.add_argument('--corpus-pages', type=int, default=5, help="pages in each generated PDF")
+    parser.add_argument('--concurrency', type=int, default=8, help="pages and PDFs fetched at once")
+    parser.add_argument('--workers', type=int, default=4, help="PDF extraction processes")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="processes create_sitemap parses pages in (0 parses on its fetch threads)")
+    parser.add_argument('--pdf-engine', default='pypdf2', help="PDF extraction engine(s) for spider_directory, or 'auto'")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('--polite', action='store_true', help="keep the default per-host rate limits")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    report = run_benchmark(args.pages, args.fan_out, args.duplicate_ratio, args.languages, args.pdf_ratio,
+                           args.pdf_pages, args.words, args.declare_language, args.delay, args.pdf_corpus,
+                           args.corpus_pages, args.concurrency, args.workers, stages, args.polite, args.seed,
+                           pdf_engine=args.pdf_engine, parse_workers=args.parse_workers)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+
+import metrics
+
+
+class ChunkWriter:
+    """
+    Writes documents to numbered chunk files as they arrive, rotating to a new
+    file before chunk_size bytes of content. Nothing is buffered beyond the
+    document being written: bytes go straight to the open chunk file.
+
+    A document that does not fit is cut just after the last `boundary` (for
+    HTML, the end of a tag) that fits; if there is none, the chunk is closed and
+    the document starts a fresh one instead. Only a single span of chunk_size
+    bytes with no boundary at all is cut elsewhere, and even then never inside
+    a UTF-8 character.
+    """
+
+    def __init__(self, base_filename, chunk_size=5*1024*1024, extension='.html',
+                 header='<html><body>', footer='</body></html>', boundary=b'>', single_filename=None):
+        self.base_filename = base_filename
+        self.chunk_size = chunk_size
+        self.extension = extension
+        self.header = header.encode('utf-8')
+        self.footer = footer.encode('utf-8')
+        self.boundary = boundary
+        # When set, output that fits in one chunk is saved under this name instead
+        self.single_filename = single_filename
+        self.chunk_number = 0
+        self.filenames = []
+        self._file = None
+        self._size = 0
+
+    def _chunk_filename(self, number):
+        return f"{self.base_filename}_{number}{self.extension}"
+
+    def write(self, content):
+        if os.linesep != '\n':
+            # Keep the platform line endings the files got when written in text mode
+            content = content.replace('\n', os.linesep)
+        data = content.encode('utf-8')
+        metrics.count('bytes_written', len(data))
+        with metrics.stage('write'):
+            self._write(data)
+
+    def _write(self, data):
+        while data:
+            if self._file is None:
+                self._open_chunk()
+            room = self.chunk_size - self._size
+            if len(data) <= room:
+                self._write_bytes(data)
+                return
+
+            cut = data.rfind(self.boundary, 0, room) + 1 if self.boundary else 0
+            if cut == 0:
+                if self._size:
+                    # Rather cut between documents than inside one
+                    self._finish_chunk()
+                    continue
+                cut = utf8_boundary(data, room)
+            self._write_bytes(data[:cut])
+            data = data[cut:]
+            self._finish_chunk()
+
+    def _open_chunk(self):
+        self.chunk_number += 1
+        self._file = open(self._chunk_filename(self.chunk_number), 'wb')
+        self._file.write(self.header)
+        self._size = 0
+
+    def _write_bytes(self, data):
+        self._file.write(data)
+        self._size += len(data)
+
+    def _finish_chunk(self, last=False):
+        self._file.write(self.footer)
+        self._file.close()
+        self._file = None
+
+        filename = self._chunk_filename(self.chunk_number)
+        if last and self.single_filename and self.chunk_number == 1:
+            os.replace(filename, self.single_filename)
+            filename = self.single_filename
+        self.filenames.append(filename)
+
+        print(f"Chunk {self.chunk_number} saved to {filename}")
+        print(f"File size: {os.path.getsize(filename) / 1024:.2f} KB")
+
+    def close(self):
+        if self._file is not None:
+            self._finish_chunk(last=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextChunkWriter(ChunkWriter):
+    """
+    ChunkWriter for plain text output: chunks are cut at line ends, and the
+    output is a single output_file unless it needs more than one chunk, in
+    which case the files are numbered output_1.txt, output_2.txt, ...
+    """
+
+    def __init__(self, output_file, chunk_size=5*1024*1024):
+        base_filename, extension = os.path.splitext(output_file)
+        super().__init__(base_filename, chunk_size, extension, header='', footer='',
+                         boundary=b'\n', single_filename=output_file)
+
+
+def utf8_boundary(data, position):
+    """
+    Largest position <= position that does not fall inside a UTF-8 character,
+    or the end of the first character when position is inside it.
+    """
+    cut = position
+    while cut > 0 and (data[cut] & 0xC0) == 0x80:
+        cut -= 1
+    if cut == 0:
+        cut = 1
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut += 1
+    return cut
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+
+
+class ContentSpool:
+    """
+    Append-only on-disk list of (url, content) pairs, stored one JSON record
+    per line. Only the record being written or read is held in memory, and it
+    can be iterated any number of times. Without a path a temporary file is
+    used and removed on close().
+    """
+
+    def __init__(self, path=None):
+        self.temporary = path is None
+        if self.temporary:
+            fd, path = tempfile.mkstemp(prefix='content_spool_', suffix='.jsonl')
+            os.close(fd)
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._count = 0
+
+    def append(self, item):
+        """Store a (url, content) pair; same call as list.append for drop-in use"""
+        self._file.write(json.dumps(list(item), ensure_ascii=False) + '\n')
+        self._count += 1
+
+    def __iter__(self):
+        self._file.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                url, content = json.loads(line)
+                yield url, content
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
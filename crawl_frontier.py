@@ -0,0 +1,204 @@
+import hashlib
+import itertools
+import math
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Reduce a URL to a canonical form so trivially different links to the same
+    page are only crawled once: the fragment is dropped, scheme and host are
+    lowercased, default ports and trailing slashes are removed and query
+    parameters are sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.port and DEFAULT_PORTS.get(scheme) == parts.port:
+        netloc = netloc.rsplit(':', 1)[0]
+
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/') or '/'
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def url_fingerprint(url):
+    """64-bit fingerprint of a URL"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashedVisitedSet:
+    """
+    Visited set that stores a 64-bit fingerprint per URL instead of the URL
+    itself. Collisions are possible but vanishingly rare below billions of URLs.
+    """
+
+    def __init__(self):
+        self._fingerprints = set()
+
+    def add(self, url):
+        self._fingerprints.add(url_fingerprint(url))
+
+    def __contains__(self, url):
+        return url_fingerprint(url) in self._fingerprints
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+
+class BloomFilter:
+    """
+    Fixed-size visited set. Memory is decided up front from the expected
+    number of URLs and the acceptable false positive rate; a false positive
+    means a page is wrongly treated as already visited and skipped.
+    """
+
+    def __init__(self, capacity=10_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, url):
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, url):
+        new = False
+        for pos in self._positions(url):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self._count += 1
+
+    def __contains__(self, url):
+        for pos in self._positions(url):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def __len__(self):
+        return self._count
+
+
+def make_visited_set(kind='set', capacity=10_000_000, error_rate=0.001):
+    """
+    Create a visited set:
+        - 'set': exact, stores every URL
+        - 'hashed': exact up to 64-bit fingerprint collisions, ~4x smaller
+        - 'bloom': fixed memory for `capacity` URLs at `error_rate` false positives
+    """
+    if kind == 'set':
+        return set()
+    if kind == 'hashed':
+        return HashedVisitedSet()
+    if kind == 'bloom':
+        return BloomFilter(capacity, error_rate)
+    raise ValueError(f"Unknown visited set type: {kind}")
+
+
+class Frontier:
+    """
+    FIFO crawl frontier shared by the spiders. URLs are normalized on the way
+    in and only queued if they are neither visited nor already pending, so
+    each page is queued at most once and pops are O(1). A popped URL counts
+    as visited.
+
+    URLs can also be fed lazily from an iterable (e.g. a sitemap still being
+    read): a batch is taken from it whenever the queue runs dry. pop() and
+    bool() do that in place; a caller that must not block takes the batch on
+    another thread instead (see take_batch).
+
+    Each pending URL keeps the link depth it was found at (0 for seeds), which
+    pop_with_depth() hands back with it.
+    """
+
+    def __init__(self, urls=(), visited='set', capacity=10_000_000, error_rate=0.001):
+        self.queue = deque()
+        # Pending URL -> link depth
+        self.pending = {}
+        self.visited = make_visited_set(visited, capacity, error_rate)
+        self.sources = deque()
+        self.extend(urls)
+
+    def add(self, url, depth=0):
+        """Queue a URL; returns the normalized URL if it was new, otherwise None"""
+        url = normalize_url(url)
+        if url in self.pending or url in self.visited:
+            return None
+        self.pending[url] = depth
+        self.queue.append(url)
+        return url
+
+    def extend(self, urls):
+        """Queue several URLs; returns how many were new"""
+        return sum(1 for url in urls if self.add(url))
+
+    def feed(self, urls, batch_size=100, on_queued=None):
+        """
+        Queue URLs from an iterable lazily. on_queued(queued, exhausted) is
+        called after each batch with the URLs that were new and whether the
+        iterable has run out.
+        """
+        self.sources.append((iter(urls), batch_size, on_queued))
+
+    def needs_refill(self):
+        """Whether the queue is empty but a lazy source may still have URLs"""
+        return not self.queue and bool(self.sources)
+
+    def take_batch(self):
+        """
+        Read the next batch from the first lazy source, without queueing it;
+        hand the result to queue_batch. This blocks for as long as the source
+        does (a sitemap still downloading), so an event loop runs it on a
+        thread. Only one batch may be taken at a time.
+        """
+        source = self.sources[0]
+        return source, list(itertools.islice(source[0], source[1]))
+
+    def queue_batch(self, source, urls):
+        _, batch_size, on_queued = source
+        queued = [url for url in map(self.add, urls) if url]
+        exhausted = len(urls) < batch_size
+        if exhausted:
+            self.sources.remove(source)
+        if on_queued:
+            on_queued(queued, exhausted)
+
+    def _refill(self):
+        while self.needs_refill():
+            self.queue_batch(*self.take_batch())
+
+    def pop(self):
+        return self.pop_with_depth()[0]
+
+    def pop_with_depth(self):
+        self._refill()
+        url = self.queue.popleft()
+        depth = self.pending.pop(url)
+        self.visited.add(url)
+        return url, depth
+
+    def mark_visited(self, url):
+        self.visited.add(normalize_url(url))
+
+    def is_visited(self, url):
+        return normalize_url(url) in self.visited
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __bool__(self):
+        self._refill()
+        return bool(self.queue)
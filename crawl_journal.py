@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status TEXT NOT NULL, depth INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, content TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS content_hashes (hash TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS signatures (url TEXT PRIMARY KEY, signature TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS found (url TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS downloads (url TEXT PRIMARY KEY, status TEXT NOT NULL, file_hash TEXT, filename TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# URL status values
+PENDING = 'pending'
+DONE = 'done'
+
+
+class CrawlJournal:
+    """
+    SQLite journal of a crawl's progress: the frontier and per-URL status, the
+    content hashes and near-duplicate signatures used for dedup, the extracted
+    content of accepted pages, PDF links found and PDF downloads. Writes are
+    committed in batches, so a crash loses at most the last batch_size updates
+    and an interrupted run can be resumed from the journal.
+    """
+
+    def __init__(self, path, batch_size=200):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Journals written before link depth was recorded
+        if 'depth' not in [row[1] for row in self.conn.execute('PRAGMA table_info(urls)')]:
+            self.conn.execute('ALTER TABLE urls ADD COLUMN depth INTEGER NOT NULL DEFAULT 0')
+        self.pages = JournalPages(self)
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self.conn.execute(sql, params)
+            self._writes += 1
+            if self._writes >= self.batch_size:
+                self.conn.commit()
+                self._writes = 0
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+            self._writes = 0
+
+    def reset(self):
+        """Forget any previous run"""
+        with self._lock:
+            for table in ('urls', 'pages', 'content_hashes', 'signatures', 'found', 'downloads', 'meta'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.commit()
+            self._writes = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    # Run state
+
+    def get_meta(self, key, default=None):
+        rows = self._read('SELECT value FROM meta WHERE key = ?', (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_meta(self, key, value):
+        self._write('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def has_state(self):
+        return bool(self._read('SELECT 1 FROM meta LIMIT 1') or self._read('SELECT 1 FROM urls LIMIT 1'))
+
+    def is_interrupted(self, stage='crawl'):
+        return self.has_state() and not self.get_meta(f'{stage}_complete', False)
+
+    # Frontier
+
+    def add_pending(self, url, depth=0):
+        self._write('INSERT OR IGNORE INTO urls (url, status, depth) VALUES (?, ?, ?)', (url, PENDING, depth))
+
+    def mark_done(self, url, status=DONE):
+        self._write('INSERT OR REPLACE INTO urls (url, status, depth) '
+                    'VALUES (?, ?, COALESCE((SELECT depth FROM urls WHERE url = ?), 0))', (url, status, url))
+
+    def pending_with_depth(self):
+        """(url, link depth) of each URL still to visit, in the order they were queued"""
+        return self._read('SELECT url, depth FROM urls WHERE status = ? ORDER BY rowid', (PENDING,))
+
+    def visited_urls(self):
+        return [row[0] for row in self._read('SELECT url FROM urls WHERE status != ?', (PENDING,))]
+
+    # Dedup
+
+    def add_content_hash(self, content_hash):
+        self._write('INSERT OR IGNORE INTO content_hashes (hash) VALUES (?)', (content_hash,))
+
+    def content_hashes(self):
+        return {row[0] for row in self._read('SELECT hash FROM content_hashes')}
+
+    def add_signature(self, url, signature):
+        self._write('INSERT OR REPLACE INTO signatures (url, signature) VALUES (?, ?)', (url, json.dumps(signature)))
+
+    def signatures(self):
+        return [(row[0], json.loads(row[1])) for row in self._read('SELECT url, signature FROM signatures ORDER BY rowid')]
+
+    # PDF links found while spidering
+
+    def add_found(self, url):
+        self._write('INSERT OR IGNORE INTO found (url) VALUES (?)', (url,))
+
+    def found_urls(self):
+        return {row[0] for row in self._read('SELECT url FROM found')}
+
+    # PDF downloads
+
+    def record_download(self, url, status, file_hash=None, filename=None):
+        self._write('INSERT OR REPLACE INTO downloads (url, status, file_hash, filename) VALUES (?, ?, ?, ?)',
+                    (url, status, file_hash, filename))
+
+    def finished_downloads(self):
+        """URLs whose download completed, was a duplicate, or failed permanently"""
+        return {row[0] for row in self._read('SELECT url FROM downloads')}
+
+    def downloaded_hashes(self):
+        return {row[0] for row in self._read('SELECT file_hash FROM downloads WHERE file_hash IS NOT NULL')}
+
+
+class JournalPages:
+    """
+    The journal's accepted pages as a (url, content) sequence, usable anywhere
+    create_sitemap's streamed output is: append, iterate and len.
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+
+    def append(self, item):
+        url, content = item
+        self.journal._write('INSERT INTO pages (url, content) VALUES (?, ?)', (url, content))
+
+    def __iter__(self):
+        self.journal.commit()
+        # A separate cursor streams rows instead of fetching them all at once
+        cursor = sqlite3.connect(self.journal.path).execute('SELECT url, content FROM pages ORDER BY id')
+        try:
+            yield from cursor
+        finally:
+            cursor.connection.close()
+
+    def __len__(self):
+        return self.journal._read('SELECT COUNT(*) FROM pages')[0][0]
+
+
+def ask_to_resume(journal_path, stage='crawl', resume=False):
+    """
+    Decide whether to resume from an existing journal: always with resume
+    (e.g. --resume on the command line), otherwise ask when the previous run
+    did not finish.
+    """
+    if not os.path.exists(journal_path):
+        return False
+    if resume:
+        return True
+
+    journal = CrawlJournal(journal_path)
+    interrupted = journal.is_interrupted(stage)
+    journal.close()
+    if interrupted:
+        answer = input(f"A previous run recorded in {journal_path} did not finish. Resume it? (y/n): ")
+        return answer.lower() == 'y'
+    return False
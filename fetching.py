@@ -0,0 +1,179 @@
+import posixpath
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from http_cache import cached_get
+from request_scheduler import PoliteSession, default_scheduler
+
+# Default per-request timeout in seconds, matching the spiders' existing calls
+DEFAULT_TIMEOUT = 10
+
+# Largest page body read; longer ones are dropped once they pass it
+DEFAULT_MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Seconds allowed for reading a whole page body, however steadily it trickles in
+DEFAULT_READ_TIMEOUT = 30
+
+PAGE_CHUNK_SIZE = 64 * 1024
+
+# A URL pattern that served something other than HTML this many times, and
+# never HTML, is skipped from then on without a request
+PATTERN_SKIP_AFTER = 3
+
+_DIGITS = re.compile(r'\d+')
+
+
+def make_session(pool_size=10, polite=True, scheduler=None):
+    """
+    Create a requests Session that keeps connections alive between requests.
+
+    pool_size is the number of connections kept open per host; set it to at
+    least the number of threads that share the session.
+
+    A polite session sends every request through a RequestScheduler (robots.txt,
+    per-host rate limits, retries); by default the one shared by the process,
+    so all sessions see the same robots.txt rules and host limits.
+    """
+    if polite:
+        session = PoliteSession(scheduler or default_scheduler())
+    else:
+        session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class SkippedResponse(Exception):
+    """
+    A page not read past its headers (or at all): reason is 'pattern',
+    'content_type', 'too_large' or 'too_slow'
+    """
+
+    def __init__(self, url, reason, detail=''):
+        super().__init__(f"{url}: {reason} {detail}".strip())
+        self.url = url
+        self.reason = reason
+        self.detail = detail
+
+
+def url_pattern(url):
+    """
+    Host, directory with numbers generalized, extension and query keys of a
+    URL: /files/2023/report-4.ashx?id=9 and /files/2024/memo.ashx?id=12 share one
+    """
+    parsed = urlparse(url)
+    directory, name = posixpath.split(parsed.path)
+    keys = ','.join(sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)}))
+    return (parsed.netloc.lower(), _DIGITS.sub('0', directory), posixpath.splitext(name)[1].lower(), keys)
+
+
+class ContentTypeMemory:
+    """
+    Content types served per URL pattern (see url_pattern), so links to
+    downloads that carry no telling extension stop costing a request each.
+    Shared by the fetch threads of a crawl.
+    """
+
+    def __init__(self, skip_after=PATTERN_SKIP_AFTER):
+        self.skip_after = skip_after
+        self._lock = threading.Lock()
+        # pattern -> [HTML responses, other responses, last other content type]
+        self._patterns = {}
+        self.stats = Counter()
+
+    def should_skip(self, url):
+        with self._lock:
+            seen = self._patterns.get(url_pattern(url))
+            skip = seen is not None and seen[0] == 0 and seen[1] >= self.skip_after
+            if skip:
+                self.stats['pattern'] += 1
+            return skip
+
+    def record(self, url, is_html, content_type):
+        with self._lock:
+            seen = self._patterns.setdefault(url_pattern(url), [0, 0, None])
+            if is_html:
+                seen[0] += 1
+            else:
+                seen[1] += 1
+                seen[2] = content_type
+
+    def skipped_patterns(self):
+        """(pattern, content type) of each pattern now being skipped"""
+        with self._lock:
+            return [(pattern, seen[2]) for pattern, seen in self._patterns.items()
+                    if seen[0] == 0 and seen[1] >= self.skip_after]
+
+
+def is_html(response):
+    return 'text/html' in response.headers.get('Content-Type', '').lower()
+
+
+def read_body(response, max_bytes=DEFAULT_MAX_PAGE_BYTES, read_timeout=DEFAULT_READ_TIMEOUT):
+    """
+    Read a streamed response's body into it, so .content and .text work as
+    usual, giving up (and dropping the connection) once it is longer than
+    max_bytes or takes longer than read_timeout seconds
+    """
+    url = response.url
+    length = response.headers.get('Content-Length')
+    if max_bytes is not None and length and length.isdigit() and int(length) > max_bytes:
+        response.close()
+        raise SkippedResponse(url, 'too_large', f"{length} bytes")
+    deadline = time.monotonic() + read_timeout if read_timeout is not None else None
+    chunks = []
+    size = 0
+    try:
+        for chunk in response.iter_content(PAGE_CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise SkippedResponse(url, 'too_large', f"over {max_bytes} bytes")
+            if deadline is not None and time.monotonic() > deadline:
+                raise SkippedResponse(url, 'too_slow', f"{size} bytes in {read_timeout}s")
+    except SkippedResponse:
+        response.close()
+        raise
+    finally:
+        metrics.count('bytes_fetched', size)
+    response._content = b''.join(chunks)
+    return response
+
+
+def fetch_page(session, url, cache=None, content_types=None, max_bytes=DEFAULT_MAX_PAGE_BYTES,
+               read_timeout=DEFAULT_READ_TIMEOUT, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    GET a page, deciding from its headers whether the body is worth reading:
+    anything but HTML is dropped unread, and an HTML body is read up to
+    max_bytes within read_timeout seconds (see read_body). Raises
+    SkippedResponse for a page not read, including one whose URL pattern
+    content_types (a ContentTypeMemory) has learned serves no HTML, which is
+    not requested at all. Goes through cache like http_cache.cached_get.
+    """
+    if content_types is not None and content_types.should_skip(url):
+        metrics.count('pages_skipped', reason='pattern')
+        raise SkippedResponse(url, 'pattern')
+
+    def read(response):
+        html = is_html(response)
+        if content_types is not None and response.status_code == 200:
+            content_types.record(url, html, response.headers.get('Content-Type', ''))
+        if not html:
+            response.close()
+            raise SkippedResponse(url, 'content_type', response.headers.get('Content-Type', ''))
+        read_body(response, max_bytes, read_timeout)
+
+    kwargs.setdefault('allow_redirects', True)
+    try:
+        return cached_get(session, url, cache, read=read, stream=True, timeout=timeout, **kwargs)
+    except SkippedResponse as e:
+        metrics.count('pages_skipped', reason=e.reason)
+        raise
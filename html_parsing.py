@@ -0,0 +1,293 @@
+import threading
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# Parser backends: 'lxml' is several times faster than 'html5lib'; 'auto' uses
+# lxml when it is installed. Pages lxml fails on are parsed with html5lib.
+PARSERS = ('auto', 'lxml', 'html5lib')
+
+# Elements removed from the formatted content with everything inside them
+REMOVED_TAGS = {'script', 'style', 'nav'}
+# Elements kept in the formatted content; all others are unwrapped
+ALLOWED_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'b', 'strong', 'i', 'em', 'table', 'tr', 'td', 'th'}
+
+_local = threading.local()
+
+
+class ParsedPage:
+    """
+    Everything the crawl needs from a page: its declared language (the primary
+    subtag of <html lang> or a language meta tag, or None), its text, the raw
+    href of every link and, when asked for, its formatted content as a string.
+    soup is only set when the page was parsed with BeautifulSoup.
+    """
+
+    def __init__(self, lang, text, links, content=None, soup=None):
+        self.lang = lang
+        self.text = text
+        self.links = links
+        self.content = content
+        self.soup = soup
+
+
+def parse_page(html, parser='auto', extract_content=True):
+    """Parse a page with the chosen backend, falling back to html5lib"""
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown HTML parser: {parser}")
+    if parser != 'html5lib':
+        if lxml is None:
+            if parser == 'lxml':
+                raise ImportError("lxml is not installed")
+        else:
+            try:
+                page = parse_with_lxml(html, extract_content)
+                if page is not None:
+                    return page
+            except Exception:
+                pass
+    # Imported here so pages parsed with lxml never load BeautifulSoup and html5lib
+    from bs4 import BeautifulSoup
+    return parse_with_soup(BeautifulSoup(html, 'html5lib'), extract_content)
+
+
+def parse_with_soup(soup, extract_content=True):
+    """ParsedPage from a BeautifulSoup tree; extracting the content modifies the soup"""
+    lang = soup_language(soup)
+    text = soup.get_text()
+    links = [link['href'] for link in soup.find_all('a', href=True)]
+    content = None
+    if extract_content:
+        # Links and text have to be collected first, extraction strips the page down in place
+        extracted = extract_formatted_content(soup)
+        content = str(extracted) if extracted else None
+    return ParsedPage(lang, text, links, content, soup)
+
+
+def soup_language(soup):
+    html_lang = soup.find('html', attrs={'lang': True})
+    meta_lang = soup.find('meta', attrs={'http-equiv': 'content-language'}) or \
+                soup.find('meta', attrs={'name': 'language'})
+
+    if html_lang and html_lang.get('lang'):
+        return html_lang.get('lang').lower().split('-')[0]
+    elif meta_lang and meta_lang.get('content'):
+        return meta_lang.get('content').lower().split('-')[0]
+    return None
+
+
+def extract_formatted_content(soup):
+    # Remove script, style, and nav elements
+    for element in soup(["script", "style", "nav"]):
+        element.decompose()
+
+    # Extract the main content
+    main_content = soup.find('main') or soup.find('body')
+
+    if main_content:
+        # Preserve only specific tags
+        allowed_tags = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'b', 'strong', 'i', 'em', 'table', 'tr', 'td', 'th']
+        for tag in main_content.find_all(True):
+            if tag.name not in allowed_tags:
+                tag.unwrap()
+
+        # Convert table to simple format
+        for table in main_content.find_all('table'):
+            new_table = soup.new_tag('table')
+            for row in table.find_all('tr'):
+                new_row = soup.new_tag('tr')
+                for cell in row.find_all(['td', 'th']):
+                    new_cell = soup.new_tag('td')
+                    new_cell.string = cell.get_text(strip=True)
+                    new_row.append(new_cell)
+                new_table.append(new_row)
+            table.replace_with(new_table)
+
+        return main_content
+    return None
+
+
+def _lxml_parser():
+    # lxml parsers must not be shared between threads
+    if not hasattr(_local, 'parser'):
+        _local.parser = lxml.html.HTMLParser(encoding='utf-8')
+    return _local.parser
+
+
+def _escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _start_tag(element):
+    """Opening tag as BeautifulSoup would write it"""
+    parts = [element.tag]
+    for name, value in element.attrib.items():
+        if name == 'class':
+            value = ' '.join(value.split())
+        value = _escape_text(value)
+        if '"' in value:
+            if "'" in value:
+                value = '"' + value.replace('"', '&quot;') + '"'
+            else:
+                value = "'" + value + "'"
+        else:
+            value = '"' + value + '"'
+        parts.append(f'{name}={value}')
+    return '<' + ' '.join(parts) + '>'
+
+
+def _stripped_text(element):
+    """get_text(strip=True) of an element, leaving out script, style and nav"""
+    parts = []
+    removed = 0
+    for event, child in _walk(element):
+        if isinstance(child.tag, str) and child.tag in REMOVED_TAGS:
+            removed += 1 if event == 'start' else -1
+            if event == 'start' or removed:
+                continue
+        elif removed:
+            continue
+        if event == 'start' and isinstance(child.tag, str):
+            parts.append(child.text)
+        elif event == 'end' and child is not element:
+            parts.append(child.tail)
+    return ''.join(part.strip() for part in parts if part)
+
+
+def _simple_table(table):
+    rows = []
+    for row in table.iter('tr'):
+        cells = ''.join(
+            '<td>' + _escape_text(_stripped_text(cell)) + '</td>'
+            for cell in row.iter('td', 'th')
+        )
+        rows.append(f'<tr>{cells}</tr>')
+    return '<table>' + ''.join(rows) + '</table>'
+
+
+def _walk(root):
+    """('start', element) and ('end', element) events in document order, comments included"""
+    yield 'start', root
+    stack = [(root, iter(root))]
+    while stack:
+        parent, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield 'end', parent
+        else:
+            yield 'start', child
+            stack.append((child, iter(child)))
+
+
+def parse_with_lxml(html, extract_content=True):
+    """
+    ParsedPage from a single walk over an lxml tree: links, language tags,
+    text and formatted content are collected together. The content matches
+    what extract_formatted_content produces from the html5lib tree.
+    Returns None when the page has no document to walk.
+    """
+    root = lxml.html.document_fromstring(html.encode('utf-8'), parser=_lxml_parser())
+    if root is None:
+        return None
+
+    text_parts = []
+    links = []
+    meta_equiv = meta_name = None
+    body_parts = main_parts = None
+    active = []        # content buffers being written: body, and the first <main> while inside it
+    removed_depth = 0  # inside script/style/nav
+    table_depth = 0    # inside a table that was already written out
+    actions = []       # what was done at each open element, undone at its end
+
+    def add_text(text):
+        if text:
+            text_parts.append(text)
+            if active and not removed_depth and not table_depth:
+                escaped = _escape_text(text)
+                for buffer in active:
+                    buffer.append(escaped)
+
+    for event, element in _walk(root):
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments stay in the content like BeautifulSoup keeps them; their text is not page text
+            if event == 'start':
+                if tag is etree.Comment and active and not removed_depth and not table_depth:
+                    for buffer in active:
+                        buffer.append(f'<!--{element.text or ""}-->')
+            else:
+                add_text(element.tail)
+            continue
+
+        if event == 'start':
+            action = None
+            if tag == 'a' and element.get('href') is not None:
+                links.append(element.get('href'))
+            elif tag == 'meta':
+                if meta_equiv is None and element.get('http-equiv') == 'content-language':
+                    meta_equiv = element
+                if meta_name is None and element.get('name') == 'language':
+                    meta_name = element
+
+            if not extract_content:
+                pass
+            elif tag in REMOVED_TAGS:
+                removed_depth += 1
+                action = 'removed'
+            elif removed_depth:
+                pass
+            elif table_depth:
+                if tag == 'table':
+                    table_depth += 1
+                    action = 'table'
+            elif tag == 'body' and body_parts is None:
+                body_parts = [_start_tag(element)]
+                active.append(body_parts)
+                action = 'body'
+            elif tag == 'main' and main_parts is None:
+                main_parts = [_start_tag(element)]
+                active.append(main_parts)
+                action = 'main'
+            elif active and tag == 'table':
+                for buffer in active:
+                    buffer.append(_simple_table(element))
+                table_depth = 1
+                action = 'table'
+            elif active and tag in ALLOWED_TAGS:
+                for buffer in active:
+                    buffer.append(_start_tag(element))
+                action = 'tag'
+            actions.append(action)
+            add_text(element.text)
+        else:
+            action = actions.pop()
+            if action == 'removed':
+                removed_depth -= 1
+            elif action == 'table':
+                table_depth -= 1
+            elif action == 'tag':
+                for buffer in active:
+                    buffer.append(f'</{tag}>')
+            elif action in ('body', 'main'):
+                buffer = body_parts if action == 'body' else main_parts
+                buffer.append(f'</{tag}>')
+                active.remove(buffer)
+            add_text(element.tail)
+
+    lang = None
+    meta_lang = meta_equiv if meta_equiv is not None else meta_name
+    if root.tag == 'html' and root.get('lang'):
+        lang = root.get('lang').lower().split('-')[0]
+    elif meta_lang is not None and meta_lang.get('content'):
+        lang = meta_lang.get('content').lower().split('-')[0]
+
+    content = None
+    if extract_content:
+        content_parts = main_parts if main_parts is not None else body_parts
+        if content_parts is not None:
+            content = ''.join(content_parts)
+    return ParsedPage(lang, ''.join(text_parts), links, content)
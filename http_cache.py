@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers kept with each cache entry
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Content-Length')
+
+# Kinds of derived record, each kept apart so tools sharing a cache directory
+# never read each other's: a crawled page's analysis, a page's links (the PDF
+# spider) and a downloaded PDF
+DERIVED_KINDS = ('page', 'links', 'pdf')
+
+
+class HttpCache:
+    """
+    On-disk HTTP cache for incremental re-crawls. Each URL keeps its ETag and
+    Last-Modified validators, optionally its body, and optionally a "derived"
+    record per kind (see DERIVED_KINDS): whatever the caller computed from
+    the body last time (extracted content, links), so an unchanged page does
+    not even need re-parsing.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, url, suffix):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def entry(self, url):
+        return self._read_json(self._path(url, '.json'))
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a URL seen before"""
+        entry = self.entry(url)
+        headers = {}
+        if entry:
+            if entry['headers'].get('ETag'):
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def store(self, url, response, body=None):
+        """Record a 200 response; body is only kept when given"""
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        if not headers.get('ETag') and not headers.get('Last-Modified'):
+            # Nothing to revalidate with next time
+            return
+        entry = {
+            'url': url,
+            'final_url': response.url,
+            'headers': headers,
+            'encoding': response.encoding,
+            'size': len(body) if body is not None else int(headers.get('Content-Length') or 0),
+            'has_body': body is not None,
+        }
+        if body is not None:
+            self._write(self._path(url, '.body'), body)
+        self._write(self._path(url, '.json'), json.dumps(entry).encode('utf-8'))
+        # Any derived record belongs to the previous version of the page
+        for kind in DERIVED_KINDS:
+            try:
+                os.remove(self._path(url, f'.{kind}.derived.json'))
+            except OSError:
+                pass
+
+    def replay(self, url, not_modified):
+        """
+        Turn a 304 into the cached 200 response. The result has from_cache set;
+        its body is empty if the entry was stored without one.
+        """
+        entry = self.entry(url)
+        if entry is None:
+            return None
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['final_url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry['encoding']
+        response.request = not_modified.request
+        response._content = b''
+        if entry['has_body']:
+            try:
+                with open(self._path(url, '.body'), 'rb') as f:
+                    response._content = f.read()
+            except OSError:
+                return None
+        response.from_cache = True
+        response.cache_entry = entry
+        self.count('unchanged')
+        self.count('bytes_saved', entry['size'])
+        return response
+
+    def derived(self, url, kind):
+        return self._read_json(self._path(url, f'.{kind}.derived.json'))
+
+    def store_derived(self, url, kind, value):
+        self._write(self._path(url, f'.{kind}.derived.json'), json.dumps(value).encode('utf-8'))
+
+    def print_report(self):
+        requests_made = self.stats['requests']
+        unchanged = self.stats['unchanged']
+        print(f"\nHTTP cache: {unchanged} of {requests_made} requests were unchanged since the last run")
+        print(f"Data not downloaded again: {self.stats['bytes_saved'] / (1024 * 1024):.2f} MB")
+        if self.stats['reparse_skipped']:
+            print(f"Pages reused without re-parsing: {self.stats['reparse_skipped']}")
+
+
+def cached_get(session, url, cache=None, store_body=True, read=None, **kwargs):
+    """
+    GET through an HttpCache: sends the stored validators, turns a 304 back
+    into the cached response and stores new 200 responses. Without a cache
+    this is session.get.
+
+    read, for a streamed request, is called with each response fetched (not
+    one replayed from the cache) to read its body or reject it by raising,
+    before the response is stored.
+    """
+    if cache is None:
+        response = session.get(url, **kwargs)
+        if read is not None:
+            read(response)
+        return response
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    cache.count('requests')
+    response = session.get(url, headers={**headers, **cache.conditional_headers(url)}, **kwargs)
+
+    if response.status_code == 304:
+        response.close()
+        cached = cache.replay(url, response)
+        if cached is not None:
+            return cached
+        # The cached body went missing; fetch it again unconditionally
+        response = session.get(url, headers=headers, **kwargs)
+
+    if read is not None:
+        read(response)
+    if response.status_code == 200:
+        cache.store(url, response, response.content if store_body else None)
+    return response
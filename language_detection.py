@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import threading
+
+# fastText language identification model, https://fasttext.cc/docs/en/language-identification.html
+FASTTEXT_MODEL_PATH = "lid.176.bin"
+
+# fastText only looks at a single line; the start of a page is plenty to identify it
+FASTTEXT_MAX_CHARS = 1000
+
+_model = None
+_model_path = FASTTEXT_MODEL_PATH
+_model_lock = threading.Lock()
+
+
+def get_fasttext_model(path=None):
+    """
+    The fastText model, loaded on first use and then shared by everything in
+    this process. Nothing is loaded by importing this module.
+    """
+    global _model, _model_path
+    with _model_lock:
+        if _model is None:
+            import fasttext
+            _model_path = path or _model_path
+            _model = fasttext.load_model(_model_path)
+        return _model
+
+
+def init_fasttext_worker(path=FASTTEXT_MODEL_PATH):
+    """Pool initializer: load the model once per worker process, not per task"""
+    get_fasttext_model(path)
+
+
+def fasttext_available(path=FASTTEXT_MODEL_PATH):
+    # Checked without importing it, which would load the native extension
+    return importlib.util.find_spec('fasttext') is not None and os.path.exists(path)
+
+
+def predict_english(texts, path=None):
+    """Classify a batch of texts in one fastText call; returns a list of bools"""
+    lines = [text.strip().replace("\n", " ")[:FASTTEXT_MAX_CHARS] for text in texts]
+    if not lines:
+        return []
+    labels, _ = get_fasttext_model(path).predict(lines)
+    return [bool(label) and label[0] == "__label__en" for label in labels]
+
+
+class FastTextDetector:
+    """Content language detector backed by the fastText model"""
+
+    name = "fastText"
+
+    def __init__(self, model_path=FASTTEXT_MODEL_PATH):
+        self.model_path = model_path
+
+    def is_english(self, text):
+        return self.is_english_batch([text])[0]
+
+    def is_english_batch(self, texts):
+        try:
+            return predict_english(texts, self.model_path)
+        except Exception:
+            return [False] * len(texts)
+
+
+class LangdetectDetector:
+    """Content language detector backed by langdetect; slower, but pure Python"""
+
+    name = "langdetect"
+
+    def is_english(self, text):
+        from langdetect import detect, LangDetectException
+        try:
+            return detect(text) == 'en'
+        except LangDetectException:
+            return False
+
+    def is_english_batch(self, texts):
+        return [self.is_english(text) for text in texts]
+
+
+def make_detector(kind='auto', model_path=FASTTEXT_MODEL_PATH):
+    """
+    Create a content language detector:
+        - 'fasttext': the fastText model at model_path
+        - 'langdetect': langdetect
+        - 'auto': fastText if it is installed and the model is present, else langdetect
+    An object with is_english(text) and is_english_batch(texts) can be used as well.
+    """
+    if not isinstance(kind, str):
+        return kind
+    if kind == 'auto':
+        kind = 'fasttext' if fasttext_available(model_path) else 'langdetect'
+    if kind == 'fasttext':
+        return FastTextDetector(model_path)
+    if kind == 'langdetect':
+        return LangdetectDetector()
+    raise ValueError(f"Unknown language detector: {kind}")
@@ -0,0 +1,389 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ENV_VARIABLE = 'CONTENT_SLURPERS_METRICS'
+ENV_INTERVAL = 'CONTENT_SLURPERS_METRICS_INTERVAL'
+
+PROMETHEUS_PREFIX = 'content_slurpers_'
+
+
+def metric_key(name, labels):
+    """'name{label="value",...}' with the labels sorted, as used in snapshots"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in sorted(labels.items())) + '}'
+
+
+def split_key(key):
+    """(name, labels string) of a metric_key"""
+    name, _, labels = key.partition('{')
+    return name, labels.rstrip('}')
+
+
+class Histogram:
+    """Latency distribution over fixed buckets, with count, sum, min and max"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            if count and seen + count >= rank:
+                low, high = max(lower, self.min), min(bound, self.max)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class Metrics:
+    """Counters, gauges and histograms, keyed by name and labels; safe to use from any thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def count(self, name, value=1, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[metric_key(name, labels)] = value
+
+    def add(self, name, delta, **labels):
+        """Move a gauge up or down, e.g. requests in flight"""
+        key = metric_key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name, seconds, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            return {
+                'time': now,
+                'elapsed': round(now - self.started, 3),
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {key: histogram.snapshot() for key, histogram in self.histograms.items()},
+            }
+
+
+class JsonLinesSink:
+    """Appends every snapshot to a file as one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, snapshot, final=False):
+        record = dict(snapshot, final=final)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def close(self):
+        pass
+
+
+class PrometheusTextSink:
+    """
+    Keeps a file in the Prometheus text exposition format up to date, e.g.
+    for node_exporter's textfile collector. The file is replaced atomically.
+    """
+
+    def __init__(self, path, prefix=PROMETHEUS_PREFIX):
+        self.path = path
+        self.prefix = prefix
+
+    def render(self, snapshot):
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for key, value in sorted(snapshot['counters'].items()):
+            name, labels = split_key(key)
+            name = f'{self.prefix}{name}_total'
+            declare(name, 'counter')
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        for key, value in sorted(snapshot['gauges'].items()):
+            name, labels = split_key(key)
+            name = self.prefix + name
+            declare(name, 'gauge')
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        for key, histogram in sorted(snapshot['histograms'].items()):
+            name, labels = split_key(key)
+            name = self.prefix + name
+            declare(name, 'histogram')
+            separator = ',' if labels else ''
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{name}_sum{suffix} {histogram["sum"]}')
+            lines.append(f'{name}_count{suffix} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def emit(self, snapshot, final=False):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.render(snapshot))
+        os.replace(temporary, self.path)
+
+    def close(self):
+        pass
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    return f'{seconds * 1000:.0f}ms' if seconds < 1 else f'{seconds:.1f}s'
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+
+
+class LiveSummarySink:
+    """Writes a short summary line per snapshot: stage latencies, bytes, queue depth, in-flight requests, errors"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def summary(self, snapshot):
+        parts = []
+        for key, histogram in sorted(snapshot['histograms'].items()):
+            name, labels = split_key(key)
+            label = labels.split('=', 1)[-1].strip('"') if name == 'stage_seconds' else key
+            parts.append(f"{label} n={histogram['count']} p50={format_seconds(histogram['p50'])} "
+                         f"p90={format_seconds(histogram['p90'])}")
+        counters = snapshot['counters']
+        gauges = snapshot['gauges']
+        transferred = sum(value for key, value in counters.items() if split_key(key)[0] == 'bytes_fetched')
+        errors = sum(value for key, value in counters.items() if split_key(key)[0] == 'errors')
+        parts.append(f"fetched {format_bytes(transferred)}")
+        if 'queue_depth' in gauges:
+            parts.append(f"queue {gauges['queue_depth']}")
+        if 'requests_in_flight' in gauges:
+            parts.append(f"in flight {gauges['requests_in_flight']}")
+        parts.append(f"errors {errors}")
+        return f"[metrics {snapshot['elapsed']:.0f}s] " + ' | '.join(parts)
+
+    def emit(self, snapshot, final=False):
+        from tqdm import tqdm
+
+        # tqdm.write keeps any progress bar intact
+        tqdm.write(self.summary(snapshot), file=self.stream)
+
+    def close(self):
+        pass
+
+
+# The process's metrics. Code records through the module functions below, like
+# the logging module, and whoever runs a tool decides where the numbers go by
+# adding sinks (or with configure_from_env, from CONTENT_SLURPERS_METRICS, e.g.
+# "jsonl:crawl.metrics.jsonl,prometheus:crawl.prom,live"). Until a sink is
+# added nothing is written anywhere.
+_metrics = Metrics()
+_sinks = []
+_reporter = None
+_reporter_stop = threading.Event()
+# Per thread, the list capture_stages collects stage timings into
+_captured = threading.local()
+
+
+def count(name, value=1, **labels):
+    _metrics.count(name, value, **labels)
+
+
+def gauge(name, value, **labels):
+    _metrics.gauge(name, value, **labels)
+
+
+def add(name, delta, **labels):
+    _metrics.add(name, delta, **labels)
+
+
+def observe(name, seconds, **labels):
+    _metrics.observe(name, seconds, **labels)
+
+
+@contextmanager
+def stage(name):
+    """Time the block into the stage_seconds histogram for stage `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        _metrics.observe('stage_seconds', seconds, stage=name)
+        stages = getattr(_captured, 'stages', None)
+        if stages is not None:
+            stages.append((name, seconds))
+
+
+@contextmanager
+def capture_stages():
+    """
+    Also collect the (stage, seconds) pairs timed with stage() on this thread
+    during the block, into the list it yields. A worker process's registry
+    never reaches the sinks, so workers send these back for the parent to
+    observe.
+    """
+    stages = _captured.stages = []
+    try:
+        yield stages
+    finally:
+        _captured.stages = None
+
+
+def error(stage_name, exception):
+    """Count an error by stage and exception type"""
+    _metrics.count('errors', stage=stage_name, type=type(exception).__name__)
+
+
+def snapshot():
+    return _metrics.snapshot()
+
+
+def reset():
+    global _metrics
+    _metrics = Metrics()
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+
+def emit(final=False):
+    """Send the current snapshot to every sink"""
+    if not _sinks:
+        return
+    current = _metrics.snapshot()
+    for sink in list(_sinks):
+        try:
+            sink.emit(current, final)
+        except Exception as e:
+            print(f"Error writing metrics to {type(sink).__name__}: {str(e)}", file=sys.stderr)
+
+
+def _report(interval):
+    while not _reporter_stop.wait(interval):
+        emit()
+
+
+def start_reporting(interval=10.0):
+    """Emit a snapshot to the sinks every interval seconds from a background thread"""
+    global _reporter
+    stop_reporting()
+    _reporter_stop.clear()
+    _reporter = threading.Thread(target=_report, args=(interval,), daemon=True)
+    _reporter.start()
+
+
+def stop_reporting():
+    global _reporter
+    if _reporter is not None:
+        _reporter_stop.set()
+        _reporter.join()
+        _reporter = None
+
+
+def shutdown():
+    """Stop reporting, emit a final snapshot and close the sinks"""
+    stop_reporting()
+    emit(final=True)
+    while _sinks:
+        _sinks.pop().close()
+
+
+def make_sink(spec):
+    """
+    A sink from a short description:
+        - 'jsonl:PATH': JsonLinesSink
+        - 'prometheus:PATH': PrometheusTextSink
+        - 'live': LiveSummarySink on stderr
+    """
+    kind, _, path = spec.strip().partition(':')
+    if kind == 'jsonl' and path:
+        return JsonLinesSink(path)
+    if kind == 'prometheus' and path:
+        return PrometheusTextSink(path)
+    if kind == 'live':
+        return LiveSummarySink()
+    raise ValueError(f"Unknown metrics sink: {spec}")
+
+
+def configure(specs, interval=10.0):
+    """Add a sink per spec (see make_sink) and start periodic reporting; returns the sinks"""
+    sinks = [add_sink(make_sink(spec)) for spec in specs if spec.strip()]
+    if sinks:
+        start_reporting(interval)
+    return sinks
+
+
+def configure_from_env():
+    """configure() from CONTENT_SLURPERS_METRICS (comma-separated sinks) and CONTENT_SLURPERS_METRICS_INTERVAL"""
+    value = os.environ.get(ENV_VARIABLE, '')
+    if not value.strip():
+        return []
+    interval = float(os.environ.get(ENV_INTERVAL, '10'))
+    return configure(value.split(','), interval)
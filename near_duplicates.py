@@ -0,0 +1,132 @@
+import hashlib
+import re
+
+# Signature length; the similarity estimate is within about +-0.05 at 128
+NUM_PERM = 128
+# Words per shingle
+SHINGLE_SIZE = 5
+# Pages at least `threshold` similar are found this often by the LSH lookup
+LSH_RECALL = 0.9
+
+# Added to a borrowed value per bucket of distance when densifying
+_DENSIFY_OFFSET = 1 << 58
+
+WORD_RE = re.compile(r'\w+')
+
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """64-bit hashes of the overlapping shingle_size-word runs of text"""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    count = max(1, len(words) - shingle_size + 1)
+    return {
+        int.from_bytes(hashlib.blake2b(' '.join(words[i:i + shingle_size]).encode('utf-8'),
+                                       digest_size=8).digest(), 'big')
+        for i in range(count)
+    }
+
+
+def minhash_signature(text, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE):
+    """
+    MinHash signature of text, or None if it has no words. Uses one-permutation
+    hashing: each shingle hash lands in one of num_perm buckets, which keep
+    their minimum, so the cost is linear in the text rather than num_perm
+    passes over it. Empty buckets borrow from the next filled one so short
+    texts still get comparable signatures.
+    """
+    mins = [None] * num_perm
+    for h in shingle_hashes(text, shingle_size):
+        bucket, value = h % num_perm, h // num_perm
+        if mins[bucket] is None or value < mins[bucket]:
+            mins[bucket] = value
+
+    if all(value is None for value in mins):
+        return None
+    signature = []
+    for i in range(num_perm):
+        distance = 0
+        while mins[(i + distance) % num_perm] is None:
+            distance += 1
+        signature.append(mins[(i + distance) % num_perm] + distance * _DENSIFY_OFFSET)
+    return tuple(signature)
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of the texts two signatures were made from"""
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def lsh_bands(threshold, num_perm=NUM_PERM, recall=LSH_RECALL):
+    """
+    (bands, rows) for the LSH index: the most rows per band (fewest false
+    candidates) that still makes a pair at `threshold` a candidate with
+    probability `recall`.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index of documents. query() finds an indexed document whose
+    estimated similarity to a signature is at least `threshold` by looking
+    only at documents sharing an LSH band with it, so lookups stay fast with
+    hundreds of thousands of documents indexed.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self.buckets = {}
+        self.signatures = {}
+
+    def signature(self, text):
+        return minhash_signature(text, self.num_perm, self.shingle_size)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def query(self, signature):
+        """Key of an indexed near-duplicate of signature, or None"""
+        if signature is None:
+            return None
+        signature = tuple(signature)
+        checked = set()
+        for band_key in self._band_keys(signature):
+            for key in self.buckets.get(band_key, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                if similarity(signature, self.signatures[key]) >= self.threshold:
+                    return key
+        return None
+
+    def add(self, key, signature):
+        if signature is None:
+            return
+        signature = tuple(signature)
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def check(self, key, text):
+        """
+        Return the key of an indexed near-duplicate of text, or index text
+        under key and return None.
+        """
+        signature = self.signature(text)
+        duplicate = self.query(signature)
+        if duplicate is None:
+            self.add(key, signature)
+        return duplicate
+
+    def __len__(self):
+        return len(self.signatures)
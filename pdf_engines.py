@@ -0,0 +1,352 @@
+import importlib
+import mmap
+import time
+from collections import Counter
+
+import metrics
+
+DEFAULT_ENGINE = 'pypdf2'
+
+# Pages each engine extracts when a PDF is probed for the fastest engine
+PROBE_PAGES = 1
+
+# A result with text on fewer than this share of its pages is retried with the next engine
+MIN_TEXT_PAGE_SHARE = 0.5
+
+# Page attributes inherited from the page tree when a page has none of its own
+INHERITED_PAGE_ATTRIBUTES = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+
+class PdfEngine:
+    """
+    Extracts the text of a PDF page by page. Engines implement page_count and
+    extract_pages; large PDFs are split with page_ranges and extract_range,
+    which an engine can override to carry its own details for each range.
+    """
+
+    name = None
+    module = None
+
+    @classmethod
+    def available(cls):
+        try:
+            importlib.import_module(cls.module)
+        except ImportError:
+            return False
+        return True
+
+    def page_count(self, pdf_path):
+        raise NotImplementedError
+
+    def extract_pages(self, pdf_path, start=0, stop=None):
+        """Text of pages start to stop - 1 (to the end when stop is None), one string per page"""
+        raise NotImplementedError
+
+    def page_ranges(self, pdf_path, pages_per_task):
+        """(start, stop, detail) of each range of pages_per_task pages; detail is passed to extract_range"""
+        count = self.page_count(pdf_path)
+        return [(start, min(start + pages_per_task, count), None) for start in range(0, count, pages_per_task)]
+
+    def extract_range(self, pdf_path, start, stop, detail):
+        return self.extract_pages(pdf_path, start, stop)
+
+
+class PyPDF2Engine(PdfEngine):
+    """PyPDF2: pure Python and always installed, but slow and weak on multi-column layouts"""
+
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def page_count(self, pdf_path):
+        return len(self.page_references(pdf_path))
+
+    def extract_pages(self, pdf_path, start=0, stop=None):
+        import PyPDF2
+        with open(pdf_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            return [page.extract_text() for page in reader.pages[start:stop]]
+
+    @staticmethod
+    def open_mapped(pdf_path):
+        """
+        (PdfReader, mmap) over a read-only memory map of pdf_path; close the
+        map when done. The file is paged in from the OS cache as it is parsed
+        rather than read into each process, so pool workers share one copy.
+        """
+        import PyPDF2
+        with open(pdf_path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return PyPDF2.PdfReader(mapped), mapped
+
+    def page_references(self, pdf_path):
+        """(object number, generation) of each page of pdf_path, in order"""
+        reader, mapped = self.open_mapped(pdf_path)
+        try:
+            return [(page.indirect_reference.idnum, page.indirect_reference.generation) for page in reader.pages]
+        finally:
+            del reader
+            mapped.close()
+
+    def page_ranges(self, pdf_path, pages_per_task):
+        references = self.page_references(pdf_path)
+        ranges = []
+        for start in range(0, len(references), pages_per_task):
+            chunk = references[start:start + pages_per_task]
+            ranges.append((start, start + len(chunk), chunk))
+        return ranges
+
+    def extract_range(self, pdf_path, start, stop, references):
+        """
+        Text of the pages at references (from page_references). Each range
+        gets a fresh reader, so only its pages' objects are held in memory.
+        """
+        reader, mapped = self.open_mapped(pdf_path)
+        try:
+            return [load_page(reader, idnum, generation).extract_text() for idnum, generation in references]
+        finally:
+            del reader
+            mapped.close()
+
+
+def load_page(reader, idnum, generation):
+    """
+    The page at an object reference, without flattening the whole page tree
+    the way reader.pages does (which would cost every range of a large PDF
+    time in proportion to the whole document)
+    """
+    from PyPDF2 import PageObject
+    from PyPDF2.generic import IndirectObject, NameObject
+    reference = IndirectObject(idnum, generation, reader)
+    page = PageObject(reader, reference)
+    page.update(reference.get_object())
+    node = page
+    while '/Parent' in node and any(attribute not in page for attribute in INHERITED_PAGE_ATTRIBUTES):
+        node = node['/Parent'].get_object()
+        for attribute in INHERITED_PAGE_ATTRIBUTES:
+            if attribute not in page and attribute in node:
+                page[NameObject(attribute)] = node[attribute]
+    return page
+
+
+class PdfiumEngine(PdfEngine):
+    """pypdfium2, the PDFium library Chrome uses: fast, and reads pages without loading the whole file"""
+
+    name = 'pypdfium2'
+    module = 'pypdfium2'
+
+    def page_count(self, pdf_path):
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract_pages(self, pdf_path, start=0, stop=None):
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            texts = []
+            for number in range(start, len(pdf) if stop is None else min(stop, len(pdf))):
+                page = pdf[number]
+                text_page = page.get_textpage()
+                texts.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+            return texts
+        finally:
+            pdf.close()
+
+
+class PyMuPDFEngine(PdfEngine):
+    """PyMuPDF (MuPDF): usually the fastest, with good reading order"""
+
+    name = 'pymupdf'
+    module = 'fitz'
+
+    def page_count(self, pdf_path):
+        import fitz
+        with fitz.open(pdf_path) as document:
+            return document.page_count
+
+    def extract_pages(self, pdf_path, start=0, stop=None):
+        import fitz
+        with fitz.open(pdf_path) as document:
+            stop = document.page_count if stop is None else min(stop, document.page_count)
+            return [document[number].get_text() for number in range(start, stop)]
+
+
+class PdfminerEngine(PdfEngine):
+    """pdfminer.six: pure Python and slower, but analyses layout, so multi-column text comes out in order"""
+
+    name = 'pdfminer'
+    module = 'pdfminer'
+
+    def page_count(self, pdf_path):
+        from pdfminer.pdfpage import PDFPage
+        with open(pdf_path, 'rb') as file:
+            return sum(1 for page in PDFPage.get_pages(file))
+
+    def extract_pages(self, pdf_path, start=0, stop=None):
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        if start or stop is not None:
+            stop = self.page_count(pdf_path) if stop is None else stop
+            layouts = extract_pages(pdf_path, page_numbers=set(range(start, stop)), maxpages=stop)
+        else:
+            layouts = extract_pages(pdf_path)
+        return [''.join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+                for layout in layouts]
+
+
+ENGINE_CLASSES = {engine.name: engine for engine in (PyPDF2Engine, PdfiumEngine, PyMuPDFEngine, PdfminerEngine)}
+
+
+def make_engines(spec=DEFAULT_ENGINE):
+    """
+    The engines to extract with, in order of preference:
+        - an engine name: 'pypdf2', 'pypdfium2', 'pymupdf' or 'pdfminer'
+        - several, as a list or comma-separated
+        - 'auto': every engine that is installed
+    Objects with PdfEngine's methods can be given as well. With more than one
+    engine, each PDF is probed for the fastest (see extract_with_fallback).
+    """
+    if isinstance(spec, str):
+        if spec == 'auto':
+            return [engine() for engine in ENGINE_CLASSES.values() if engine.available()]
+        spec = [name.strip() for name in spec.split(',') if name.strip()]
+    engines = []
+    for item in spec:
+        if not isinstance(item, str):
+            engines.append(item)
+        elif item in ENGINE_CLASSES:
+            engines.append(ENGINE_CLASSES[item]())
+        else:
+            raise ValueError(f"Unknown PDF engine: {item}")
+    if not engines:
+        raise ValueError(f"No PDF engine in: {spec}")
+    return engines
+
+
+def text_page_share(pages):
+    return sum(1 for page in pages if page.strip()) / len(pages) if pages else 0.0
+
+
+def run_engine(engine, kind, attempts, func, *args):
+    """
+    func(*args) for engine, timed and added to attempts as (engine name,
+    kind, seconds, outcome, error message), the outcome being 'ok', 'empty'
+    (too little text) or 'error'. Returns (pages, exception).
+    """
+    started = time.perf_counter()
+    try:
+        pages = func(*args)
+    except Exception as e:
+        attempts.append((engine.name, kind, time.perf_counter() - started, 'error', f"{type(e).__name__}: {str(e)}"))
+        return None, e
+    outcome = 'ok' if text_page_share(pages) >= MIN_TEXT_PAGE_SHARE else 'empty'
+    attempts.append((engine.name, kind, time.perf_counter() - started, outcome, None))
+    return pages, None
+
+
+def rank_engines(pdf_path, engines, attempts, probe_pages=PROBE_PAGES):
+    """
+    engines ordered for pdf_path: each extracts its first probe_pages pages,
+    then those that found text come first, fastest first. Engines that failed
+    the probe are dropped, unless all did.
+    """
+    if len(engines) < 2:
+        return list(engines)
+    ranked = []
+    for position, engine in enumerate(engines):
+        pages, error = run_engine(engine, 'probe', attempts, engine.extract_pages, pdf_path, 0, probe_pages)
+        if error is None:
+            ranked.append((attempts[-1][3] != 'ok', attempts[-1][2], position, engine))
+    if not ranked:
+        return list(engines)
+    return [engine for empty, seconds, position, engine in sorted(ranked)]
+
+
+def _first_with_text(calls, attempts):
+    """
+    Make (engine, func, args) calls in turn until one returns text on at least
+    MIN_TEXT_PAGE_SHARE of its pages. Returns (pages, engine name) of that one,
+    or of the one with the most text if none did; raises the last error if
+    every call failed.
+    """
+    best = None
+    last_error = None
+    for engine, func, args in calls:
+        pages, error = run_engine(engine, 'extract', attempts, func, *args)
+        if error is not None:
+            last_error = error
+        elif attempts[-1][3] == 'ok':
+            return pages, engine.name
+        elif best is None or text_page_share(pages) > text_page_share(best[0]):
+            best = (pages, engine.name)
+    if best is None:
+        raise last_error
+    return best
+
+
+def extract_with_fallback(pdf_path, engines, probe_pages=PROBE_PAGES):
+    """
+    Page texts of pdf_path as (pages, engine name, attempts; see run_engine).
+    With several engines they are ranked by rank_engines, and each is tried
+    in turn until one extracts text without error.
+    """
+    attempts = []
+    ranked = rank_engines(pdf_path, engines, attempts, probe_pages)
+    pages, name = _first_with_text([(engine, engine.extract_pages, (pdf_path,)) for engine in ranked], attempts)
+    return pages, name, attempts
+
+
+def extract_range_with_fallback(pdf_path, engines, start, stop, detail):
+    """
+    extract_with_fallback for pages start to stop - 1, with engines already
+    ranked; detail comes from the first engine's page_ranges.
+    """
+    attempts = []
+    calls = [(engines[0], engines[0].extract_range, (pdf_path, start, stop, detail))]
+    calls += [(engine, engine.extract_pages, (pdf_path, start, stop)) for engine in engines[1:]]
+    pages, name = _first_with_text(calls, attempts)
+    return pages, name, attempts
+
+
+class EngineStats:
+    """Time and outcomes per engine over a run, also recorded as metrics"""
+
+    def __init__(self):
+        self.seconds = Counter()
+        self.runs = Counter()
+        self.used = Counter()
+
+    def record(self, description, attempts, engine_name=None):
+        for position, (name, kind, seconds, outcome, error) in enumerate(attempts):
+            metrics.observe('pdf_engine_seconds', seconds, engine=name, kind=kind)
+            metrics.count('pdf_engine_runs', engine=name, kind=kind, outcome=outcome)
+            self.seconds[name, kind] += seconds
+            self.runs[name, kind, outcome] += 1
+            if kind == 'extract' and outcome != 'ok' and position < len(attempts) - 1:
+                problem = f"failed ({error})" if error else "found too little text"
+                print(f"{name} {problem} on {description}, trying the next engine")
+        if engine_name:
+            self.used[engine_name] += 1
+
+    def print_summary(self):
+        names = sorted({name for name, kind in self.seconds})
+        if not names:
+            return
+        print("PDF engines:")
+        for name in names:
+            runs = sum(self.runs[name, 'extract', outcome] for outcome in ('ok', 'empty', 'error'))
+            line = (f"  {name}: used {self.used[name]} times, {runs} extractions in "
+                    f"{self.seconds[name, 'extract']:.2f}s")
+            if self.seconds[name, 'probe']:
+                line += f", probing {self.seconds[name, 'probe']:.2f}s"
+            problems = self.runs[name, 'extract', 'error'] + self.runs[name, 'probe', 'error']
+            if problems:
+                line += f", {problems} errors"
+            if self.runs[name, 'extract', 'empty']:
+                line += f", {self.runs[name, 'extract', 'empty']} with too little text"
+            print(line)
@@ -0,0 +1,159 @@
+import codecs
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+
+# Kept in the converted directory, next to the PDFs
+MANIFEST_FILENAME = '.pdf_manifest.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS texts (hash TEXT PRIMARY KEY, engine TEXT, length INTEGER NOT NULL, text BLOB NOT NULL);
+"""
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Compressed bytes decompressed at a time when a cached text is streamed
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def hash_file(path):
+    """md5 of the file's content, as Single_Domain_PDF_Scraper computes while downloading"""
+    file_hash = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class PdfManifest:
+    """
+    SQLite manifest of a PDF collection: each file's size, mtime and content
+    hash, and the extracted text of each content hash, zlib-compressed. A file
+    whose size and mtime are unchanged is not read again, and one that was
+    renamed or copied is read but not extracted again. Writes are committed in
+    batches like CrawlJournal's.
+    """
+
+    def __init__(self, path, batch_size=50):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self.conn.execute(sql, params)
+            self._writes += 1
+            if self._writes >= self.batch_size:
+                self.conn.commit()
+                self._writes = 0
+
+    def _read_one(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+            self._writes = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Files
+
+    def file_hash(self, pdf_path):
+        """Content hash of pdf_path: the recorded one if its size and mtime are unchanged, else read and recorded"""
+        stat = os.stat(pdf_path)
+        row = self._read_one('SELECT size, mtime_ns, hash FROM files WHERE path = ?', (os.path.abspath(pdf_path),))
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        file_hash = hash_file(pdf_path)
+        self._record(pdf_path, stat, file_hash)
+        return file_hash
+
+    def record_file(self, pdf_path, file_hash):
+        """Record a hash already computed, e.g. while downloading the file"""
+        self._record(pdf_path, os.stat(pdf_path), file_hash)
+
+    def _record(self, pdf_path, stat, file_hash):
+        self._write('INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)',
+                    (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns, file_hash))
+
+    def prune(self, pdf_paths):
+        """Forget files other than pdf_paths, and texts no remaining file has"""
+        keep = {os.path.abspath(pdf_path) for pdf_path in pdf_paths}
+        with self._lock:
+            gone = [(path,) for (path,) in self.conn.execute('SELECT path FROM files') if path not in keep]
+            self.conn.executemany('DELETE FROM files WHERE path = ?', gone)
+            self.conn.execute('DELETE FROM texts WHERE hash NOT IN (SELECT hash FROM files)')
+            self.conn.commit()
+            self._writes = 0
+        return len(gone)
+
+    # Texts
+
+    def has_text(self, file_hash, engine_names=None):
+        """Whether text is cached for file_hash, extracted by one of engine_names if given"""
+        row = self._read_one('SELECT engine FROM texts WHERE hash = ?', (file_hash,))
+        return row is not None and (engine_names is None or row[0] in engine_names)
+
+    def text(self, file_hash):
+        row = self._read_one('SELECT text FROM texts WHERE hash = ?', (file_hash,))
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def iter_text(self, file_hash):
+        """The cached text in pieces, so a large one is never held decompressed in full"""
+        row = self._read_one('SELECT text FROM texts WHERE hash = ?', (file_hash,))
+        if row is None:
+            return
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        compressed = row[0]
+        for offset in range(0, len(compressed), STREAM_CHUNK_SIZE):
+            piece = decoder.decode(decompressor.decompress(compressed[offset:offset + STREAM_CHUNK_SIZE]))
+            if piece:
+                yield piece
+        piece = decoder.decode(decompressor.flush(), final=True)
+        if piece:
+            yield piece
+
+    def store_text(self, file_hash, text, engine=None):
+        data = text.encode('utf-8')
+        self._store(file_hash, engine, len(data), zlib.compress(data))
+
+    def store_pieces(self, file_hash, pieces, engine=None, failures=()):
+        """
+        Pass pieces of a text through, compressing them on the way, and store
+        the text once the last piece has gone by, unless failures (a list that
+        is filled in meanwhile, e.g. with page ranges that failed) is not empty
+        """
+        compressor = zlib.compressobj()
+        compressed = []
+        length = 0
+        for piece in pieces:
+            data = piece.encode('utf-8')
+            length += len(data)
+            compressed.append(compressor.compress(data))
+            yield piece
+        if not failures:
+            compressed.append(compressor.flush())
+            self._store(file_hash, engine, length, b''.join(compressed))
+
+    def _store(self, file_hash, engine, length, compressed):
+        self._write('INSERT OR REPLACE INTO texts (hash, engine, length, text) VALUES (?, ?, ?, ?)',
+                    (file_hash, engine, length, compressed))
@@ -0,0 +1,316 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+import metrics
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Responses that mean the host wants fewer requests
+THROTTLE_STATUSES = {429, 503}
+
+
+class RobotsDisallowed(requests.RequestException):
+    """Raised for a request robots.txt does not allow"""
+
+
+class RobotsCache:
+    """
+    robots.txt rules per host, fetched once and kept for the run. A missing
+    robots.txt (4xx) allows everything, 401/403 disallows everything, and an
+    unreachable one allows everything rather than stopping the crawl.
+    """
+
+    def __init__(self, fetch, timeout=10):
+        self.fetch = fetch
+        self.timeout = timeout
+        self._parsers = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def parser(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin in self._parsers:
+            return self._parsers[origin]
+
+        # One fetch per host even when several threads ask at once
+        with self._lock:
+            host_lock = self._host_locks.setdefault(origin, threading.Lock())
+        with host_lock:
+            if origin not in self._parsers:
+                self._parsers[origin] = self._load(origin)
+        return self._parsers[origin]
+
+    def _load(self, origin):
+        parser = RobotFileParser(origin + '/robots.txt')
+        try:
+            response = self.fetch(origin + '/robots.txt', timeout=self.timeout)
+        except requests.RequestException:
+            parser.allow_all = True
+            return parser
+
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            lines = response.text.splitlines()
+            parser.parse(lines)
+            parser.crawl_delays = parse_crawl_delays(lines)
+        parser.modified()
+        return parser
+
+    def allowed(self, url, user_agent):
+        return self.parser(url).can_fetch(user_agent, url)
+
+    def crawl_delay(self, url, user_agent):
+        """Seconds to wait between requests, from Crawl-delay or Request-rate"""
+        parser = self.parser(url)
+        # RobotFileParser only understands whole seconds, which rules out "Crawl-delay: 0.5"
+        delays = getattr(parser, 'crawl_delays', {})
+        agent = user_agent.split('/')[0].lower()
+        for name, delay in delays.items():
+            if name != '*' and name in agent:
+                return delay
+        if '*' in delays:
+            return delays['*']
+        rate = parser.request_rate(user_agent)
+        if rate and rate.requests:
+            return rate.seconds / rate.requests
+        return None
+
+    def sitemaps(self, url):
+        return self.parser(url).site_maps() or []
+
+
+def parse_crawl_delays(lines):
+    """Crawl-delay in seconds per user agent named in robots.txt lines"""
+    delays = {}
+    agents = []
+    in_rules = False
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        field, value = (part.strip() for part in line.split(':', 1))
+        field = field.lower()
+        if field == 'user-agent':
+            if in_rules:
+                # A User-agent after rules starts a new group
+                agents, in_rules = [], False
+            agents.append(value.lower())
+        else:
+            in_rules = True
+            if field == 'crawl-delay':
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for agent in agents:
+                    delays[agent] = delay
+    return delays
+
+
+class HostBucket:
+    """
+    Token bucket for one host whose rate adapts to how the host copes: it
+    grows by 10% (at least 0.25/s) while responses are quick, is cut by 20% on slow responses
+    and halved when the host throttles us or stops answering.
+    """
+
+    def __init__(self, rate=4.0, burst=4, min_rate=0.2, max_rate=20.0, latency_target=2.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.latency_target = latency_target
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def limit(self, max_rate):
+        """Cap the rate, e.g. from a robots.txt Crawl-delay"""
+        with self.lock:
+            self.max_rate = min(self.max_rate, max_rate)
+            self.min_rate = min(self.min_rate, self.max_rate)
+            self.rate = min(self.rate, self.max_rate)
+            # A crawl delay is a gap between every two requests, so no bursts
+            self.burst = 1
+            self.tokens = min(self.tokens, self.burst)
+
+    def record(self, latency, throttled=False):
+        with self.lock:
+            if throttled:
+                self.rate = max(self.min_rate, self.rate / 2)
+            elif latency > self.latency_target:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+            else:
+                self.rate = min(self.max_rate, self.rate + max(0.25, self.rate * 0.1))
+
+    def pause(self, seconds):
+        """Hold back every request to this host, e.g. for a Retry-After"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def retry_after_seconds(response):
+    """Retry-After of a response in seconds (delay or HTTP date form), or None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RequestScheduler:
+    """
+    Decides when a request may go out: robots.txt is respected (with its
+    Crawl-delay), every host has its own adaptive token bucket, and
+    throttled or failed requests are retried with exponential backoff,
+    waiting at least as long as a Retry-After header asks.
+    """
+
+    def __init__(self, respect_robots=True, max_retries=3, backoff=1.0, max_backoff=60.0,
+                 max_retry_after=300.0, rate=4.0, burst=4, min_rate=0.2, max_rate=20.0, latency_target=2.0):
+        self.respect_robots = respect_robots
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.bucket_settings = dict(rate=rate, burst=burst, min_rate=min_rate, max_rate=max_rate,
+                                    latency_target=latency_target)
+        # robots.txt files are fetched on a plain session, outside the scheduling
+        self.robots = RobotsCache(requests.Session().get)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url, session):
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is not None:
+                return bucket
+            bucket = self._buckets[host] = HostBucket(**self.bucket_settings)
+
+        if self.respect_robots:
+            delay = self.robots.crawl_delay(url, user_agent(session))
+            if delay:
+                bucket.limit(1 / delay)
+        return bucket
+
+    def allowed(self, url, session):
+        return not self.respect_robots or self.robots.allowed(url, user_agent(session))
+
+    def send(self, session, method, url, send):
+        """Run send() for a request to url, waiting for its turn and retrying as needed"""
+        if not self.allowed(url, session):
+            raise RobotsDisallowed(f"Disallowed by robots.txt: {url}")
+        bucket = self.bucket(url, session)
+
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                metrics.observe('rate_limit_wait_seconds', wait)
+                time.sleep(wait)
+
+            started = time.monotonic()
+            metrics.add('requests_in_flight', 1)
+            try:
+                response = send()
+            except requests.exceptions.SSLError as e:
+                metrics.error('fetch', e)
+                # Retrying will not fix a certificate or protocol mismatch
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.error('fetch', e)
+                bucket.record(time.monotonic() - started, throttled=True)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                latency = time.monotonic() - started
+                metrics.observe('stage_seconds', latency, stage='fetch')
+                metrics.count('responses', status=response.status_code)
+                failed = response.status_code in RETRY_STATUSES
+                bucket.record(latency, throttled=response.status_code in THROTTLE_STATUSES)
+                if not failed or attempt >= self.max_retries:
+                    return response
+
+                delay = self._backoff(attempt)
+                retry_after = retry_after_seconds(response)
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, self.max_retry_after))
+                    bucket.pause(delay)
+                response.close()
+            finally:
+                metrics.add('requests_in_flight', -1)
+
+            attempt += 1
+            metrics.count('retries')
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from several threads from lining up
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def user_agent(session):
+    return session.headers.get('User-Agent', '*')
+
+
+class PoliteSession(requests.Session):
+    """requests Session whose every request goes through a RequestScheduler"""
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        send = lambda: super(PoliteSession, self).request(method, url, *args, **kwargs)
+        response = self.scheduler.send(self, method, url, send)
+        if not kwargs.get('stream'):
+            # Streamed bodies are counted by whoever reads them
+            metrics.count('bytes_fetched', len(response.content))
+        return response
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """The scheduler shared by every polite session in this process"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+
+def set_default_scheduler(scheduler):
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = scheduler
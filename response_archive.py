@@ -0,0 +1,177 @@
+import gzip
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers describing the transfer rather than the body as it was stored: urllib3
+# has already undone any content coding, so they no longer apply
+TRANSFER_HEADERS = ('Content-Encoding', 'Transfer-Encoding', 'Content-Length')
+
+# Each record is its own gzip member, so any record can be read from its offset
+COMPRESS_LEVEL = 6
+
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+
+def index_path(archive_path):
+    return archive_path + '.idx'
+
+
+class ArchivedResponse:
+    """One response read back from an archive"""
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def to_response(self):
+        """
+        A requests Response, so .text decodes the body exactly as it was during
+        the crawl. It has from_archive set, as nothing was downloaded.
+        """
+        response = Response()
+        response.url = self.url
+        response.status_code = self.status
+        response.reason = self.reason
+        response.headers = self.headers
+        response.encoding = get_encoding_from_headers(self.headers)
+        response._content = self.body
+        response.from_archive = True
+        return response
+
+
+def format_record(url, response):
+    """A WARC/1.1 response record holding the status line, headers and (decoded) body of a response"""
+    body = response.content
+    lines = [f"HTTP/1.1 {response.status_code} {response.reason or ''}".rstrip()]
+    lines += [f"{name}: {value}" for name, value in response.headers.items() if name not in TRANSFER_HEADERS]
+    lines.append(f"Content-Length: {len(body)}")
+    block = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body
+    header = '\r\n'.join([
+        'WARC/1.1',
+        'WARC-Type: response',
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        f"WARC-Target-URI: {url}",
+        'Content-Type: application/http;msgtype=response',
+        f"Content-Length: {len(block)}",
+    ])
+    return header.encode('utf-8') + b'\r\n\r\n' + block + b'\r\n\r\n'
+
+
+def parse_record(data):
+    """ArchivedResponse of an uncompressed WARC response record"""
+    header, _, rest = data.partition(b'\r\n\r\n')
+    fields = dict(line.split(': ', 1) for line in header.decode('utf-8').split('\r\n')[1:])
+    block = rest[:int(fields['Content-Length'])]
+    http_header, _, body = block.partition(b'\r\n\r\n')
+    lines = http_header.decode('utf-8').split('\r\n')
+    _, status, *reason = lines[0].split(' ', 2)
+    headers = CaseInsensitiveDict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    return ArchivedResponse(fields['WARC-Target-URI'], int(status), reason[0] if reason else '', headers, body)
+
+
+class ResponseArchive:
+    """
+    Writes fetched responses to a WARC-style archive, one gzip member per
+    record, with an index next to it (archive path + '.idx') giving each
+    record's URL, offset, compressed length, status and content type, one
+    tab-separated line each. Safe to write from several threads. With append
+    a resumed crawl adds to the archive instead of starting it over.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab' if append else 'wb')
+        self._index = open(index_path(path), 'a' if append else 'w')
+        self.records = 0
+
+    def write(self, url, response):
+        data = gzip.compress(format_record(url, response), COMPRESS_LEVEL)
+        content_type = response.headers.get('Content-Type', '').replace('\t', ' ')
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(data)
+            self._index.write(f"{url}\t{offset}\t{len(data)}\t{response.status_code}\t{content_type}\n")
+            self.records += 1
+        return offset, len(data)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_record(f, offset, length):
+    """The record at offset of an open archive file"""
+    f.seek(offset)
+    return parse_record(gzip.decompress(f.read(length)))
+
+
+def scan_archive(path):
+    """(offset, length, ArchivedResponse) of each record, read straight through the archive"""
+    with open(path, 'rb') as f:
+        offset = 0
+        pending = b''
+        while True:
+            if not pending:
+                pending = f.read(SCAN_CHUNK_SIZE)
+                if not pending:
+                    return
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            start = offset
+            parts = []
+            while not decompressor.eof:
+                if not pending:
+                    pending = f.read(SCAN_CHUNK_SIZE)
+                    if not pending:
+                        # A record cut short by an interrupted crawl
+                        return
+                parts.append(decompressor.decompress(pending))
+                offset += len(pending) - len(decompressor.unused_data)
+                pending = decompressor.unused_data
+            yield start, offset - start, parse_record(b''.join(parts))
+
+
+def read_index(path):
+    """
+    (url, offset, length, status, content type) of each record, from the
+    index, or rebuilt by scanning the archive when the index is missing or
+    does not cover it (e.g. after an interrupted crawl)
+    """
+    entries = []
+    try:
+        with open(index_path(path), 'r') as f:
+            for line in f:
+                url, offset, length, status, content_type = line.rstrip('\n').split('\t')
+                entries.append((url, int(offset), int(length), int(status), content_type))
+    except (OSError, ValueError):
+        entries = None
+    size = os.path.getsize(path)
+    if entries is not None and (entries[-1][1] + entries[-1][2] if entries else 0) == size:
+        return entries
+
+    print(f"Rebuilding the index of {path}...")
+    entries = [(record.url, offset, length, record.status, record.headers.get('Content-Type', ''))
+               for offset, length, record in scan_archive(path)]
+    with open(index_path(path), 'w') as f:
+        for url, offset, length, status, content_type in entries:
+            f.write(f"{url}\t{offset}\t{length}\t{status}\t{content_type}\n")
+    return entries
@@ -0,0 +1,235 @@
+import gzip
+import io
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+from fetching import DEFAULT_TIMEOUT
+
+# Where sites usually put their sitemap, in the order they are preferred
+SITEMAP_PATHS = ['/sitemap.xml', '/sitemap_index.xml', '/sitemap-index.xml', '/sitemapindex.xml',
+                 '/sitemap.php', '/sitemap']
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class _Stopped(Exception):
+    """The consumer went away; workers stop parsing"""
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_lastmod(value):
+    """W3C datetime (a date, or a date and time with offset) as an aware datetime, or None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    else:
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_english_entry(loc, alternates):
+    """
+    Decide from a sitemap entry's hreflang alternates whether the page is
+    English: by the alternate that points at the page itself when there is
+    one, otherwise by whether any alternate is English. None when they do
+    not say, for pages without alternates or whose own alternate is
+    x-default (which names no language); those are kept and left to the
+    page-level language detection.
+    """
+    if not alternates:
+        return None
+    for hreflang, href in alternates:
+        if href == loc:
+            if hreflang.lower() == 'x-default':
+                return None
+            return hreflang.lower().startswith('en')
+    return any(hreflang.lower().startswith('en') for hreflang, href in alternates)
+
+
+def open_stream(response):
+    """The body of a streamed sitemap response as a file, gunzipping .xml.gz sitemaps on the fly"""
+    response.raw.decode_content = True
+    # urllib3 closes the body at its end by default, which breaks reading it through a BufferedReader
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def iter_entries(stream):
+    """
+    Parse a sitemap or sitemap index incrementally, yielding
+    ('url', loc, lastmod, alternates) and ('sitemap', loc, lastmod, None)
+    entries while memory stays flat however large the file is.
+    """
+    root = None
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+
+        name = local_name(element.tag)
+        if name not in ('url', 'sitemap'):
+            continue
+        loc = lastmod = None
+        alternates = []
+        for child in element:
+            child_name = local_name(child.tag)
+            if child_name == 'loc' and child.text:
+                loc = child.text.strip()
+            elif child_name == 'lastmod' and child.text:
+                lastmod = child.text.strip()
+            elif child_name == 'link' and child.get('hreflang'):
+                alternates.append((child.get('hreflang'), child.get('href')))
+        if loc:
+            yield name, loc, lastmod, (alternates if name == 'url' else None)
+        # Entries are direct children of the root; drop the ones handled
+        root.clear()
+
+
+class SitemapReader:
+    """
+    Enumerates the pages of one or more sitemaps. Child sitemaps of an index
+    are fetched by a pool of workers and parsed as they download, and page
+    URLs come out of urls() as soon as they are parsed, so a crawl can start
+    on them before the enumeration is done.
+
+    since skips entries (and whole child sitemaps) whose lastmod is older;
+    entries without a lastmod are always kept.
+    """
+
+    def __init__(self, session, workers=8, since=None, queue_size=10000):
+        self.session = session
+        self.workers = workers
+        self.since = parse_lastmod(since)
+        self.queue_size = queue_size
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _modified(self, lastmod):
+        if self.since is None:
+            return True
+        parsed = parse_lastmod(lastmod)
+        return parsed is None or parsed >= self.since
+
+    def urls(self, sitemap_urls):
+        results = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        seen = set()
+        pending = 0
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise _Stopped()
+
+        def read(sitemap_url):
+            try:
+                with self.session.get(sitemap_url, timeout=DEFAULT_TIMEOUT, stream=True) as response:
+                    response.raise_for_status()
+                    for kind, loc, lastmod, alternates in iter_entries(open_stream(response)):
+                        if not self._modified(lastmod):
+                            self.count('not_modified')
+                        elif kind == 'sitemap':
+                            put(('sitemap', loc))
+                        elif is_english_entry(loc, alternates) is False:
+                            self.count('not_english')
+                        else:
+                            put(('url', loc))
+            except _Stopped:
+                pass
+            except Exception as e:
+                self.count('errors')
+                print(f"Error reading sitemap {sitemap_url}: {str(e)}")
+            finally:
+                if not stop.is_set():
+                    put(('done', sitemap_url))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for sitemap_url in sitemap_urls:
+                if sitemap_url not in seen:
+                    seen.add(sitemap_url)
+                    pending += 1
+                    executor.submit(read, sitemap_url)
+
+            while pending:
+                kind, value = results.get()
+                if kind == 'url':
+                    self.count('urls')
+                    yield value
+                elif kind == 'sitemap':
+                    if value not in seen:
+                        seen.add(value)
+                        pending += 1
+                        executor.submit(read, value)
+                else:
+                    pending -= 1
+                    self.count('sitemaps')
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+
+def robots_sitemaps(session, origin):
+    """Sitemap URLs listed in an origin's robots.txt"""
+    scheduler = getattr(session, 'scheduler', None)
+    if scheduler is not None:
+        return scheduler.robots.sitemaps(origin + '/')
+    try:
+        response = session.get(origin + '/robots.txt', timeout=DEFAULT_TIMEOUT)
+    except Exception:
+        return []
+    if response.status_code != 200:
+        return []
+    return [line.split(':', 1)[1].strip() for line in response.text.splitlines()
+            if line.lower().startswith('sitemap:') and line.split(':', 1)[1].strip()]
+
+
+def find_sitemaps(session, domain, scheme='https'):
+    """
+    Sitemaps of a site: those its robots.txt lists, or else the first of the
+    usual locations that answers, probing all of them at once.
+    """
+    origin = f"{scheme}://{domain}"
+    listed = robots_sitemaps(session, origin)
+    if listed:
+        return listed
+
+    def probe(url):
+        try:
+            # Only the status matters; stream so the body is not downloaded
+            with session.get(url, timeout=DEFAULT_TIMEOUT, stream=True) as response:
+                return response.status_code == 200
+        except Exception:
+            return False
+
+    candidates = [origin + path for path in SITEMAP_PATHS]
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        found = list(executor.map(probe, candidates))
+    return [url for url, ok in zip(candidates, found) if ok][:1]
@@ -0,0 +1,420 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Only the standard library is imported up front so --help and small jobs start
+# at once; the tools (requests, lxml, PyPDF2, ...) are imported by the commands.
+
+# Crawl modes: follow links across the whole domain, read the site's sitemaps
+# (spidering when it has none), or fetch only the pages the homepage links to
+MODES = ('spider', 'sitemap', 'homepage')
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+class CrawlConfig:
+    """
+    Settings for crawling one site into chunked HTML files, for crawl_site
+    and crawl_many. The defaults match the interactive script.
+
+    url is the start page; a bare domain gets https://. output is the base
+    filename of the chunk files, where "{domain}" stands for the site's
+    domain (default "<domain>_content"). journal_dir keeps a journal per
+    domain there so an interrupted crawl can be resumed (None for no journal),
+    along with the URL path prefixes the crawl learned are not English,
+    and cache_dir an HTTP cache (None for no cache). max_depth, max_pages and
+    max_bytes limit the crawl, and max_page_bytes the size of any one page;
+    the other settings are create_sitemap's (see crawl_options).
+
+    With pdf_folder ("{domain}" is replaced too) the same crawl also
+    downloads the site's PDFs there as their links turn up, on pdf_workers
+    threads, instead of spidering the site a second time; pdf_text_output
+    then extracts their text as well (see PdfDownloadQueue).
+
+    archive ("{domain}" is replaced too) keeps every page fetched in a
+    compressed WARC-style archive, for the replay command.
+    """
+
+    def __init__(self, url, mode='spider', concurrency=8, per_host_limit=4, output=None, max_depth=None,
+                 max_pages=None, max_bytes=None, journal_dir='.', resume=False, cache_dir='.http_cache',
+                 near_duplicate_threshold=None, language_detector='auto', parser='auto', sitemap_since=None,
+                 visited_set='set', two_pass=True, max_page_bytes=5 * 1024 * 1024, pdf_folder=None, pdf_workers=8,
+                 pdf_text_output=None, extraction_workers=None, engine='pypdf2', parse_workers=0,
+                 archive=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown crawl mode: {mode}")
+        self.url = url if '://' in url else 'https://' + url
+        self.mode = mode
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.output = output
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.journal_dir = journal_dir
+        self.resume = resume
+        self.cache_dir = cache_dir
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.language_detector = language_detector
+        self.parser = parser
+        self.sitemap_since = sitemap_since
+        self.visited_set = visited_set
+        self.two_pass = two_pass
+        self.max_page_bytes = max_page_bytes
+        self.pdf_folder = pdf_folder
+        self.pdf_workers = pdf_workers
+        self.pdf_text_output = pdf_text_output
+        self.extraction_workers = extraction_workers
+        self.engine = engine
+        self.parse_workers = parse_workers
+        self.archive = archive
+
+    @property
+    def domain(self):
+        return urlparse(self.url).netloc
+
+    def output_base(self):
+        return (self.output or '{domain}_content').replace('{domain}', self.domain.replace(':', '_'))
+
+    def pdf_paths(self):
+        """(folder, text output) for the site's PDFs, with "{domain}" replaced"""
+        domain = self.domain.replace(':', '_')
+        return (self.pdf_folder.replace('{domain}', domain) if self.pdf_folder else None,
+                self.pdf_text_output.replace('{domain}', domain) if self.pdf_text_output else None)
+
+    def archive_path(self):
+        return self.archive.replace('{domain}', self.domain.replace(':', '_')) if self.archive else None
+
+    def crawl_options(self, homepage_links=None):
+        """The Web_to_Single_HTML_File_Spider.CrawlOptions for create_sitemap"""
+        from Web_to_Single_HTML_File_Spider import CrawlOptions
+
+        return CrawlOptions(
+            use_existing_sitemap=self.mode == 'sitemap', homepage_only=self.mode == 'homepage',
+            homepage_links=homepage_links, concurrency=self.concurrency, per_host_limit=self.per_host_limit,
+            visited_set=self.visited_set, journal_path=self.journal_path(), resume=self.resume,
+            cache_dir=self.cache_dir, language_detector=self.language_detector,
+            near_duplicate_threshold=self.near_duplicate_threshold, parser=self.parser,
+            sitemap_since=self.sitemap_since, max_depth=self.max_depth, max_pages=self.max_pages,
+            max_bytes=self.max_bytes, max_page_bytes=self.max_page_bytes,
+            url_language_path=self.url_language_path(), parse_workers=self.parse_workers,
+            archive_path=self.archive_path())
+
+    def journal_path(self):
+        if self.journal_dir is None:
+            return None
+        # Same name the interactive script uses, so either can resume the other's crawl
+        return os.path.join(self.journal_dir, f"{self.domain.replace(':', '_')}.journal.sqlite")
+
+    def url_language_path(self):
+        if self.journal_dir is None:
+            return None
+        return os.path.join(self.journal_dir, f"{self.domain.replace(':', '_')}.url_languages.json")
+
+
+def crawl_site(config, session=None, executor=None):
+    """
+    Crawl one site as configured and write its English content to chunk
+    files, downloading its PDFs in the same pass if configured. Returns a
+    dict with the url, output base filename, pages written, PDFs downloaded
+    and seconds taken. session and executor are shared with other crawls by
+    crawl_many.
+    """
+    import Web_to_Single_HTML_File_Spider as spider
+
+    started = time.perf_counter()
+    pdf_queue = None
+    pdf_folder, pdf_text_output = config.pdf_paths()
+    if pdf_folder:
+        from Single_Domain_PDF_Scraper import PdfDownloadQueue
+        pdf_queue = PdfDownloadQueue(pdf_folder, config.pdf_workers, config.resume, pdf_text_output,
+                                     config.extraction_workers, config.engine)
+    homepage_links = None
+    if config.mode == 'homepage':
+        print(f"\nAnalyzing homepage: {config.url}")
+        homepage_links = spider.get_homepage_links(config.url, config.domain, session)
+        print(f"Found {len(homepage_links)} unique content links on homepage")
+
+    try:
+        sitemap = spider.create_sitemap(config.url, config.crawl_options(homepage_links),
+                                        on_pdf=pdf_queue.add if pdf_queue else None, session=session,
+                                        executor=executor)
+
+        print("\nProcessing content...")
+        # PDFs still downloading meanwhile
+        pages = spider.process_content(sitemap, config.output_base(), two_pass=config.two_pass)
+    finally:
+        pdfs = pdf_queue.close() if pdf_queue else 0
+    return {'url': config.url, 'output': config.output_base(), 'pages': pages, 'pdfs': pdfs,
+            'seconds': round(time.perf_counter() - started, 3), 'error': None}
+
+
+def crawl_many(configs, max_targets=4, pool_size=32):
+    """
+    Crawl several sites at once in this process, max_targets at a time.
+    The crawls share one connection pool and one pool of pool_size fetch
+    threads, as well as the process's rate limits, robots.txt rules and
+    language model. Returns crawl_site's result for each config, in order;
+    a crawl that failed has its error message under 'error'.
+    """
+    from fetching import make_session
+
+    session = make_session(pool_size=pool_size)
+
+    def crawl(config):
+        try:
+            return crawl_site(config, session, fetch_executor)
+        except Exception as e:
+            print(f"Error crawling {config.url}: {str(e)}")
+            return {'url': config.url, 'output': config.output_base(), 'pages': 0, 'pdfs': 0, 'seconds': None,
+                    'error': f"{type(e).__name__}: {str(e)}"}
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as fetch_executor, \
+                ThreadPoolExecutor(max_workers=max_targets) as targets:
+            return list(targets.map(crawl, configs))
+    finally:
+        session.close()
+
+
+def parse_size(value):
+    """A byte count such as 500, 64KB, 10MB or 1.5GB"""
+    text = value.strip().upper()
+    number = text.rstrip('KMGB')
+    unit = text[len(number):]
+    try:
+        if unit not in SIZE_UNITS:
+            raise ValueError(unit)
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a size: {value}")
+
+
+def read_targets(path):
+    """URLs listed one per line in a file, skipping blank lines and # comments"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def add_limit_arguments(parser):
+    parser.add_argument('--max-depth', type=int, help="follow links at most this many clicks from the start page")
+    parser.add_argument('--max-pages', type=int, help="stop after fetching this many pages")
+    parser.add_argument('--max-bytes', type=parse_size, help="stop after downloading this much, e.g. 200MB")
+    parser.add_argument('--max-page-size', type=parse_size, default='5MB',
+                        help="abandon pages larger than this (0 for no limit); non-HTML is never downloaded")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='slurp.py', description="Spider websites and PDFs for text, without prompts.")
+    parser.add_argument('--metrics', action='append', default=[], metavar='SINK',
+                        help="send metrics to jsonl:PATH, prometheus:PATH or live (repeatable)")
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help="seconds between metrics reports")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crawl = commands.add_parser('crawl', help="crawl sites into chunked HTML files (Web_to_Single_HTML_File_Spider)")
+    crawl.add_argument('urls', nargs='*', metavar='URL', help="start page or domain of each site")
+    crawl.add_argument('--targets', help="file listing more sites, one URL per line")
+    crawl.add_argument('--mode', choices=MODES, default='spider',
+                       help="spider the whole domain, use its sitemap, or only the homepage's links")
+    crawl.add_argument('--concurrency', type=int, default=8, help="pages fetched at once per site")
+    crawl.add_argument('--per-host-limit', type=int, default=4, help="requests open to one host at once")
+    crawl.add_argument('--output', help='base filename of the output; "{domain}" is replaced by the domain')
+    add_limit_arguments(crawl)
+    crawl.add_argument('--parallel-targets', type=int, default=4, help="sites crawled at the same time")
+    crawl.add_argument('--pool-size', type=int, default=32, help="fetch threads and connections shared by all sites")
+    crawl.add_argument('--journal-dir', default='.', help="where each site's resumable journal is kept")
+    crawl.add_argument('--no-journal', action='store_true', help="keep no journal")
+    crawl.add_argument('--resume', action='store_true', help="continue interrupted crawls from their journals")
+    crawl.add_argument('--cache-dir', default='.http_cache', help="HTTP cache directory")
+    crawl.add_argument('--no-cache', action='store_true', help="keep no HTTP cache")
+    crawl.add_argument('--near-duplicate-threshold', type=float,
+                       help="also drop pages at least this similar to one already kept, e.g. 0.9 "
+                            "(default: exact duplicates only)")
+    crawl.add_argument('--language-detector', choices=('auto', 'fasttext', 'langdetect'), default='auto')
+    crawl.add_argument('--parser', choices=('auto', 'lxml', 'html5lib'), default='auto')
+    crawl.add_argument('--parse-workers', type=int, default=0,
+                       help="processes per site that parse and analyze pages while threads fetch (0 for none)")
+    crawl.add_argument('--sitemap-since', help="with --mode sitemap, skip entries last modified before this date")
+    crawl.add_argument('--visited-set', choices=('set', 'hashed', 'bloom'), default='set')
+    crawl.add_argument('--report', help="write a JSON summary of the crawls here")
+    crawl.add_argument('--pdf-folder', help='also download the PDFs the crawl finds into this folder, in the same '
+                                            'pass; "{domain}" is replaced by the domain')
+    crawl.add_argument('--pdf-workers', type=int, default=8, help="PDFs downloaded at once per site")
+    crawl.add_argument('--pdf-text-output', help="with --pdf-folder, also extract the PDFs' text into this file")
+    crawl.add_argument('--extraction-workers', type=int, help="extraction processes (default: one per CPU)")
+    crawl.add_argument('--engine', default='pypdf2', help="PDF extraction engine(s) for --pdf-text-output, see convert")
+    crawl.add_argument('--archive', help='also write every page fetched to this compressed WARC archive (e.g. '
+                                         '"{domain}.warc.gz"), to replay later without re-crawling')
+
+    pdfs = commands.add_parser('pdfs', help="download a site's PDFs (Single_Domain_PDF_Scraper)")
+    pdfs.add_argument('urls', nargs='+', metavar='URL', help="start page or domain of each site")
+    pdfs.add_argument('--folder', default='{domain}_pdfs', help='folder to save to; "{domain}" is replaced by the domain')
+    pdfs.add_argument('--workers', type=int, default=8, help="PDFs downloaded at once")
+    pdfs.add_argument('--resume', action='store_true', help="continue interrupted runs from their journals")
+    pdfs.add_argument('--parallel-targets', type=int, default=4, help="sites handled at the same time")
+    pdfs.add_argument('--text-output', help='also extract the PDFs\' text, as they download, into this file; '
+                                            '"{domain}" is replaced by the domain')
+    pdfs.add_argument('--extraction-workers', type=int, help="extraction processes (default: one per CPU)")
+    pdfs.add_argument('--engine', default='pypdf2', help="PDF extraction engine(s) for --text-output, see convert")
+    add_limit_arguments(pdfs)
+
+    replay = commands.add_parser('replay', help="process a crawl's --archive again into chunked HTML files, offline")
+    replay.add_argument('archive', help="archive written by crawl --archive")
+    replay.add_argument('--output', required=True, help="base filename of the output")
+    replay.add_argument('--workers', type=int, default=0, help="processes that parse and analyze pages (0 for none)")
+    replay.add_argument('--near-duplicate-threshold', type=float,
+                        help="also drop pages at least this similar to one already kept, e.g. 0.9 "
+                             "(default: exact duplicates only)")
+    replay.add_argument('--language-detector', choices=('auto', 'fasttext', 'langdetect'), default='auto')
+    replay.add_argument('--parser', choices=('auto', 'lxml', 'html5lib'), default='auto')
+
+    convert = commands.add_parser('convert', help="extract the text of a folder of PDFs (PDF_Text_Converter)")
+    convert.add_argument('directory', help="folder searched for PDFs, subfolders included")
+    convert.add_argument('--output', required=True, help="output text file; numbered files are added past 5MB")
+    convert.add_argument('--workers', type=int, help="extraction processes (default: one per CPU)")
+    convert.add_argument('--timeout', type=float, default=300, help="seconds allowed per PDF")
+    convert.add_argument('--near-duplicate-threshold', type=float,
+                         help="also drop PDFs at least this similar to one already output, e.g. 0.9 "
+                              "(default: exact duplicates only)")
+    convert.add_argument('--large-pdf-size', type=parse_size, default='10MB',
+                         help="PDFs this large are split into page ranges extracted in parallel (0 for never)")
+    convert.add_argument('--pages-per-task', type=int, default=50, help="pages per range of a large PDF")
+    convert.add_argument('--engine', default='pypdf2',
+                         help="pypdf2, pypdfium2, pymupdf or pdfminer; several (comma-separated) or 'auto' for "
+                              "all installed ones picks the fastest per PDF")
+    convert.add_argument('--no-manifest', action='store_true',
+                         help="extract every PDF again instead of only those new or changed since the last run")
+    return parser
+
+
+def run_crawl_command(args):
+    urls = list(args.urls)
+    if args.targets:
+        urls.extend(read_targets(args.targets))
+    if not urls:
+        raise SystemExit("crawl: give at least one URL or a --targets file")
+
+    output = args.output
+    if output and len(urls) > 1 and '{domain}' not in output:
+        # Several sites must not write to the same files
+        output += '_{domain}'
+    pdf_folder, pdf_text_output = args.pdf_folder, args.pdf_text_output
+    if pdf_text_output and not pdf_folder:
+        raise SystemExit("crawl: --pdf-text-output needs --pdf-folder")
+    if len(urls) > 1:
+        if pdf_folder and '{domain}' not in pdf_folder:
+            pdf_folder = os.path.join(pdf_folder, '{domain}')
+        if pdf_text_output and '{domain}' not in pdf_text_output:
+            root, ext = os.path.splitext(pdf_text_output)
+            pdf_text_output = f"{root}_{{domain}}{ext}"
+    archive = args.archive
+    if archive and len(urls) > 1 and '{domain}' not in archive:
+        archive = f"{{domain}}_{os.path.basename(archive)}"
+        if os.path.dirname(args.archive):
+            archive = os.path.join(os.path.dirname(args.archive), archive)
+    configs = [
+        CrawlConfig(url, mode=args.mode, concurrency=args.concurrency, per_host_limit=args.per_host_limit,
+                    output=output, max_depth=args.max_depth, max_pages=args.max_pages, max_bytes=args.max_bytes,
+                    journal_dir=None if args.no_journal else args.journal_dir, resume=args.resume,
+                    cache_dir=None if args.no_cache else args.cache_dir,
+                    near_duplicate_threshold=args.near_duplicate_threshold or None,
+                    language_detector=args.language_detector, parser=args.parser,
+                    sitemap_since=args.sitemap_since, visited_set=args.visited_set,
+                    max_page_bytes=args.max_page_size or None, pdf_folder=pdf_folder, pdf_workers=args.pdf_workers,
+                    pdf_text_output=pdf_text_output, extraction_workers=args.extraction_workers, engine=args.engine,
+                    parse_workers=args.parse_workers, archive=archive)
+        for url in urls
+    ]
+    if len(configs) == 1:
+        results = [crawl_site(configs[0])]
+    else:
+        results = crawl_many(configs, args.parallel_targets, args.pool_size)
+
+    print("\nCrawl summary:")
+    for result in results:
+        if result['error']:
+            print(f"  {result['url']}: failed ({result['error']})")
+        else:
+            pdfs = f", {result['pdfs']} PDFs downloaded" if args.pdf_folder else ''
+            print(f"  {result['url']}: {result['pages']} pages saved to {result['output']}{pdfs} in {result['seconds']}s")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result['error'] for result in results) else 0
+
+
+def run_pdfs_command(args):
+    import Single_Domain_PDF_Scraper as pdf_scraper
+
+    def scrape(url):
+        url = url if '://' in url else 'https://' + url
+        domain = urlparse(url).netloc.replace(':', '_')
+        folder = args.folder.replace('{domain}', domain)
+        text_output = args.text_output.replace('{domain}', domain) if args.text_output else None
+        try:
+            pdf_scraper.scrape_pdfs(url, folder, args.resume, args.workers, args.max_depth, args.max_pages,
+                                    args.max_bytes, text_output, args.extraction_workers, args.engine,
+                                    args.max_page_size or None)
+            return None
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            return e
+
+    with ThreadPoolExecutor(max_workers=args.parallel_targets) as targets:
+        errors = list(targets.map(scrape, args.urls))
+    return 1 if any(errors) else 0
+
+
+def run_replay_command(args):
+    import Web_to_Single_HTML_File_Spider as spider
+
+    started = time.perf_counter()
+    options = spider.CrawlOptions(language_detector=args.language_detector,
+                                  near_duplicate_threshold=args.near_duplicate_threshold or None,
+                                  parser=args.parser, parse_workers=args.workers)
+    sitemap = spider.replay_archive(args.archive, options)
+    print("\nProcessing content...")
+    pages = spider.process_content(sitemap, args.output, two_pass=True)
+    print(f"\n{pages} pages saved to {args.output} in {round(time.perf_counter() - started, 3)}s")
+    return 0
+
+
+def run_convert_command(args):
+    import PDF_Text_Converter as pdf_converter
+
+    pdf_converter.convert_directory(args.directory, args.output, args.workers, args.timeout,
+                                    args.near_duplicate_threshold or None, args.large_pdf_size or None,
+                                    args.pages_per_task, args.engine, not args.no_manifest)
+    print(f"Text extraction complete. Output saved to {args.output} (and possibly additional numbered files)")
+    return 0
+
+
+COMMANDS = {'crawl': run_crawl_command, 'pdfs': run_pdfs_command, 'replay': run_replay_command,
+            'convert': run_convert_command}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        import metrics
+        metrics.configure(args.metrics, args.metrics_interval)
+    try:
+        return COMMANDS[args.command](args)
+    finally:
+        if args.metrics:
+            metrics.shutdown()
+
+
+if __name__ == "__main__":
+    import metrics
+    # Sinks from CONTENT_SLURPERS_METRICS, on top of any --metrics
+    metrics.configure_from_env()
+    try:
+        sys.exit(main())
+    finally:
+        metrics.shutdown()
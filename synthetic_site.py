@@ -0,0 +1,307 @@
+import hashlib
+import http.server
+import os
+import random
+import textwrap
+import threading
+import time
+from collections import Counter
+
+# Vocabulary for the generated text; langdetect and fastText tell these apart easily
+WORDS = {
+    'en': "the of and to in is that for it as with was on be by this are from at or have an they which one "
+          "you were her all she there would their we him been has when who will more no if out so said what "
+          "up its about into than them can only other new some could time these two may then do first any my "
+          "now such like our over man me even most made after also did many before must through back years "
+          "where much your way well down should because each just those people how too little state good very "
+          "make world still own see men work long get here between both life being under never day same another "
+          "know while last might us great old year off come since against go came right used take three".split(),
+    'fr': "le de un être et à il avoir ne je son que se qui ce dans en du elle au pour pas que vous par sur "
+          "faire plus dire me on mon lui nous comme mais pouvoir avec tout y aller voir en bien où sans tu ou "
+          "leur homme si deux mari moi vouloir te femme venir quand grand celui notre devoir là jour prendre "
+          "même votre rien petit encore aussi quelque dont tout mer trouver donner temps ça peu même falloir "
+          "sous parler alors main chose ton mettre vie savoir yeux passer autre après regarder toujours puis "
+          "jamais cela aimer non heure croire cent monde donc enfant fois seul autre entre vers chez demander".split(),
+    'de': "der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch es an werden "
+          "aus er hat dass sie nach wird bei einer um am sind noch wie einem über einen so zum war haben nur "
+          "oder aber vor zur bis mehr durch man sein wurde sei hatte kann gegen vom können schon wenn habe "
+          "seine ihre dann unter wir soll ich eines jahr zwei jahren diese dieser wieder keine seiner worden "
+          "will zwischen immer millionen ersten was sagte gibt alle diesem seit muss wurden beim doch jedoch".split(),
+    'es': "de la que el en y a los se del las un por con no una su para es al lo como más pero sus le ya o "
+          "este sí porque esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos "
+          "durante todos uno les ni contra otros ese eso ante ellos e esto mí antes algunos qué unos yo otro "
+          "otras otra él tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas algo".split(),
+}
+
+SECTIONS = ['news', 'products', 'support', 'about', 'blog', 'docs']
+
+
+def make_text(rng, language, words):
+    """words random words of a language, as sentences"""
+    vocabulary = WORDS[language]
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = ' '.join(rng.choice(vocabulary) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        remaining -= length
+    return ' '.join(sentences)
+
+
+def _pdf_string(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages, lines_per_page=45):
+    """
+    A minimal PDF with one page per string in pages, set in Helvetica, that
+    PyPDF2 and the other extractors can read back. Long texts are wrapped and
+    cut to lines_per_page lines.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = ' '.join(f"{3 + i * 2} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + len(pages) * 2
+    for i, text in enumerate(pages):
+        lines = textwrap.wrap(text, 90)[:lines_per_page]
+        stream = "BT /F1 11 Tf 50 750 Td 14 TL " + ' '.join(f"({_pdf_string(line)}) '" for line in lines) + " ET"
+        stream = stream.encode('latin-1', 'replace')
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + i * 2} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b''.join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def pick_language(rng, languages):
+    return rng.choices(list(languages), weights=list(languages.values()))[0]
+
+
+def make_pdf_corpus(directory, count=50, pages=5, words=300, duplicate_ratio=0.1, languages=None, seed=0):
+    """
+    Write count synthetic PDFs under directory (spread over a few
+    subdirectories, like a downloaded site) and return (paths, total pages,
+    total bytes). A duplicate_ratio share of them repeat an earlier PDF's text.
+    """
+    rng = random.Random(seed)
+    languages = languages or {'en': 1.0}
+    documents = []
+    paths = []
+    total_pages = total_bytes = 0
+    for i in range(count):
+        if documents and rng.random() < duplicate_ratio:
+            page_texts = rng.choice(documents)
+        else:
+            language = pick_language(rng, languages)
+            page_texts = [make_text(rng, language, words) for _ in range(pages)]
+            documents.append(page_texts)
+        folder = os.path.join(directory, SECTIONS[i % len(SECTIONS)])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"document_{i}.pdf")
+        data = make_pdf(page_texts)
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+        total_pages += len(page_texts)
+        total_bytes += len(data)
+    return paths, total_pages, total_bytes
+
+
+class SyntheticSite:
+    """
+    A generated website served from a local thread, for benchmarks. Every
+    page has the same navigation and footer, a few paragraphs of text and
+    fan_out links to other pages; pdf_ratio of the pages also link a PDF.
+
+    languages maps language codes to their share of the pages. A
+    duplicate_ratio share of the pages repeat an earlier page's text, and
+    declare_language of the pages carry <html lang>, so the rest need content
+    language detection. With language_paths, non-English pages live under
+    /<language>/ as on many real sites. robots.txt lists /sitemap.xml.
+
+    Pages and PDFs are generated on request from the seed, so memory does not
+    grow with the page count. served counts requests and bytes by kind.
+    """
+
+    def __init__(self, pages=500, fan_out=5, duplicate_ratio=0.1, languages=None, pdf_ratio=0.1, pdf_pages=3,
+                 words=300, declare_language=0.5, language_paths=False, delay=0.0, seed=0):
+        self.pages = pages
+        self.fan_out = fan_out
+        self.duplicate_ratio = duplicate_ratio
+        self.languages = languages or {'en': 0.9, 'fr': 0.1}
+        self.pdf_ratio = pdf_ratio
+        self.pdf_pages = pdf_pages
+        self.words = words
+        self.declare_language = declare_language
+        self.language_paths = language_paths
+        self.delay = delay
+        self.seed = seed
+        self.served = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+        rng = random.Random(seed)
+        self.page_languages = [pick_language(rng, self.languages) for _ in range(pages)]
+        # Page 0 is the homepage and always original
+        self.duplicate_of = [None] + [
+            rng.randrange(i) if rng.random() < duplicate_ratio else None for i in range(1, pages)
+        ]
+        self.pdf_links = [i for i in range(pages) if rng.random() < pdf_ratio]
+        self._pdf_set = set(self.pdf_links)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def path(self, i):
+        language = self.page_languages[i]
+        if self.language_paths and language != 'en':
+            return f"/{language}/{SECTIONS[i % len(SECTIONS)]}/page-{i}.html"
+        return f"/{SECTIONS[i % len(SECTIONS)]}/page-{i}.html"
+
+    def _page_number(self, path):
+        name = path.rsplit('/', 1)[-1]
+        if path == '/':
+            return 0
+        if name.startswith('page-') and name.endswith('.html'):
+            number = name[5:-5]
+            if number.isdigit() and int(number) < self.pages and self.path(int(number)) == path:
+                return int(number)
+        return None
+
+    def page_text(self, i):
+        source = self.duplicate_of[i] if self.duplicate_of[i] is not None else i
+        rng = random.Random(f"{self.seed}-text-{source}")
+        paragraphs = max(1, self.words // 100)
+        return [make_text(rng, self.page_languages[source], self.words // paragraphs) for _ in range(paragraphs)]
+
+    def page_html(self, i):
+        rng = random.Random(f"{self.seed}-links-{i}")
+        language = self.page_languages[i]
+        declared = random.Random(f"{self.seed}-lang-{i}").random() < self.declare_language
+        links = ''.join(f'<li><a href="{self.path(rng.randrange(self.pages))}">Related page</a></li>'
+                        for _ in range(self.fan_out))
+        if i in self._pdf_set:
+            links += f'<li><a href="/files/document-{i}.pdf">Download the PDF</a></li>'
+        menu = ''.join(f'<a href="{self.path(k)}">{SECTIONS[k].title()}</a>'
+                       for k in range(min(len(SECTIONS), self.pages)))
+        paragraphs = ''.join(f'<p>{paragraph}</p>' for paragraph in self.page_text(i))
+        table = (f'<table><tr><th>Item</th><th>Value</th></tr><tr><td>Page</td><td>{i}</td></tr></table>'
+                 if i % 5 == 0 else '')
+        lang = f' lang="{language}"' if declared else ''
+        return (f'<!DOCTYPE html><html{lang}><head><meta charset="utf-8"><title>Page {i}</title>'
+                f'<style>body {{ font-family: sans-serif; }}</style></head><body>'
+                f'<nav>{menu}</nav><header><p>Example Site - Serving synthetic content since 2001</p></header>'
+                f'<main><h1>Page {i}</h1>{paragraphs}{table}<ul>{links}</ul></main>'
+                f'<footer><p>Copyright Example Site. All rights reserved.</p></footer>'
+                f'<script>var page = {i};</script></body></html>')
+
+    def pdf_bytes(self, i):
+        rng = random.Random(f"{self.seed}-pdf-{i}")
+        language = self.page_languages[i]
+        return make_pdf([make_text(rng, language, self.words) for _ in range(self.pdf_pages)])
+
+    def sitemap_xml(self):
+        urls = ''.join(f'<url><loc>{self.url.rstrip("/")}{self.path(i)}</loc></url>' for i in range(self.pages))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+    def response_for(self, path):
+        """(kind, content type, body) for a request path, or None for a 404"""
+        path = path.split('?', 1)[0].split('#', 1)[0]
+        if path == '/robots.txt':
+            return 'robots', 'text/plain', f"User-agent: *\nSitemap: {self.url}sitemap.xml\n".encode()
+        if path == '/sitemap.xml':
+            return 'sitemap', 'application/xml', self.sitemap_xml().encode('utf-8')
+        if path.startswith('/files/document-') and path.endswith('.pdf'):
+            number = path[len('/files/document-'):-4]
+            if number.isdigit() and int(number) in self._pdf_set:
+                return 'pdf', 'application/pdf', self.pdf_bytes(int(number))
+            return None
+        i = self._page_number(path)
+        if i is None:
+            return None
+        return 'page', 'text/html; charset=utf-8', self.page_html(i).encode('utf-8')
+
+    def count(self, kind, size):
+        with self._lock:
+            self.served[kind] += 1
+            self.served[kind + '_bytes'] += size
+
+    def start(self):
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def _make_handler(site):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are sent separately; with Nagle's algorithm every keep-alive response stalls ~40ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.respond(send_body=False)
+
+        def do_GET(self):
+            self.respond(send_body=True)
+
+        def respond(self, send_body):
+            if site.delay:
+                time.sleep(site.delay)
+            found = site.response_for(self.path)
+            if found is None:
+                kind, content_type, body, status = 'missing', 'text/plain', b'Not found', 404
+            else:
+                (kind, content_type, body), status = found, 200
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if status == 200 and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                site.count('not_modified', 0)
+                return
+
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if status == 200:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            # Counted before sending, so a client that has the response always sees it counted
+            site.count(kind if send_body else 'head', len(body) if send_body else 0)
+            if send_body:
+                self.wfile.write(body)
+
+    return Handler
@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_writer import ChunkWriter, TextChunkWriter, utf8_boundary
+
+
+def read_chunks(filenames):
+    contents = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            contents.append(f.read())
+    return contents
+
+
+def test_utf8_boundary():
+    data = 'aé€😀'.encode('utf-8')
+    # a | é (2 bytes) | € (3 bytes) | 😀 (4 bytes)
+    assert [utf8_boundary(data, i) for i in range(1, len(data))] == [1, 1, 3, 3, 3, 6, 6, 6, 6]
+    # Inside the first character, the cut moves past it
+    assert utf8_boundary('😀a'.encode('utf-8'), 0) == 4
+    assert utf8_boundary('😀a'.encode('utf-8'), 2) == 4
+
+
+def test_rotates_at_tag_boundaries(tmp_path):
+    base = str(tmp_path / 'out')
+    pages = [f'<p>page {i} {"x" * 30}</p>' for i in range(10)]
+    with ChunkWriter(base, chunk_size=100) as writer:
+        for page in pages:
+            writer.write(page)
+    chunks = read_chunks(writer.filenames)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith(b'<html><body>') and chunk.endswith(b'</body></html>')
+        body = chunk[len(b'<html><body>'):-len(b'</body></html>')]
+        assert len(body) <= 100
+        assert body.endswith(b'>')
+    assert b''.join(chunk[len(b'<html><body>'):-len(b'</body></html>')] for chunk in chunks) == \
+        ''.join(pages).encode('utf-8')
+
+
+def test_long_span_cut_outside_characters(tmp_path):
+    text = 'é' * 75
+    with ChunkWriter(str(tmp_path / 'out'), chunk_size=100) as writer:
+        writer.write(text)
+    bodies = [chunk[len(b'<html><body>'):-len(b'</body></html>')] for chunk in read_chunks(writer.filenames)]
+    assert [len(body) for body in bodies] == [100, 50]
+    assert ''.join(body.decode('utf-8') for body in bodies) == text
+
+
+def test_text_output_single_file(tmp_path):
+    output = str(tmp_path / 'out.txt')
+    with TextChunkWriter(output, chunk_size=1000) as writer:
+        writer.write('one\ntwo\n')
+    assert writer.filenames == [output]
+
+    with TextChunkWriter(output, chunk_size=10) as writer:
+        writer.write('one\ntwo\nthree\nfour\n')
+    assert [os.path.basename(name) for name in writer.filenames] == ['out_1.txt', 'out_2.txt', 'out_3.txt']
+    assert all(chunk.endswith(os.linesep.encode()) for chunk in read_chunks(writer.filenames))
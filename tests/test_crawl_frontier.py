@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from crawl_frontier import BloomFilter, Frontier, HashedVisitedSet, make_visited_set, normalize_url
+
+
+def test_normalize_url():
+    assert normalize_url('HTTPS://Example.COM:443/docs/?b=2&a=1#intro') == 'https://example.com/docs?a=1&b=2'
+    assert normalize_url('http://example.com:80') == 'http://example.com/'
+    assert normalize_url('http://example.com:8080/a/') == 'http://example.com:8080/a'
+    assert normalize_url(' https://example.com/a?x= ') == 'https://example.com/a?x='
+
+
+@pytest.mark.parametrize('kind', ['set', 'hashed', 'bloom'])
+def test_visited_sets(kind):
+    visited = make_visited_set(kind, capacity=1000, error_rate=0.001)
+    urls = [f'https://example.com/page-{i}' for i in range(500)]
+    for url in urls:
+        visited.add(url)
+    assert all(url in visited for url in urls)
+    assert len(visited) == 500
+    unseen = sum(f'https://example.com/other-{i}' in visited for i in range(1000))
+    # Only the Bloom filter has false positives, at about its error rate
+    assert unseen <= (10 if kind == 'bloom' else 0)
+
+
+def test_visited_set_types():
+    assert isinstance(make_visited_set('hashed'), HashedVisitedSet)
+    assert isinstance(make_visited_set('bloom', capacity=100), BloomFilter)
+    with pytest.raises(ValueError):
+        make_visited_set('list')
+
+
+@pytest.mark.parametrize('kind', ['set', 'hashed', 'bloom'])
+def test_frontier_queues_each_url_once(kind):
+    frontier = Frontier(['https://example.com/', 'https://example.com/#top'], visited=kind)
+    assert len(frontier) == 1
+    assert frontier.add('https://example.com/a/', 1) == 'https://example.com/a'
+    assert frontier.add('https://example.com/a') is None
+    assert frontier.pop_with_depth() == ('https://example.com/', 0)
+    assert frontier.add('https://example.com') is None
+    assert frontier.pop_with_depth() == ('https://example.com/a', 1)
+    assert frontier.is_visited('https://EXAMPLE.com/a/')
+    assert not frontier
+
+
+def test_frontier_feed():
+    frontier = Frontier()
+    batches = []
+    frontier.feed((f'https://example.com/{i}' for i in range(5)), batch_size=2,
+                  on_queued=lambda queued, exhausted: batches.append((len(queued), exhausted)))
+    assert [frontier.pop() for _ in range(5)] == [f'https://example.com/{i}' for i in range(5)]
+    assert not frontier
+    assert batches == [(2, False), (2, False), (1, True)]
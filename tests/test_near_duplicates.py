@@ -0,0 +1,59 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from near_duplicates import NUM_PERM, LSH_RECALL, NearDuplicateIndex, lsh_bands, minhash_signature, similarity
+
+
+def words(count, seed):
+    rng = random.Random(seed)
+    return [f'w{rng.randrange(100000)}' for _ in range(count)]
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.7, 0.8, 0.9, 0.95])
+def test_lsh_bands(threshold):
+    bands, rows = lsh_bands(threshold)
+    assert bands * rows <= NUM_PERM
+    assert 1 - (1 - threshold ** rows) ** bands >= LSH_RECALL
+    # One more row per band would miss the recall
+    more_bands = NUM_PERM // (rows + 1)
+    assert 1 - (1 - threshold ** (rows + 1)) ** more_bands < LSH_RECALL
+
+
+def test_higher_threshold_fewer_candidates():
+    assert lsh_bands(0.95)[1] >= lsh_bands(0.9)[1] >= lsh_bands(0.5)[1]
+
+
+def test_signature_similarity():
+    text = ' '.join(words(1000, 1))
+    assert minhash_signature('') is None
+    assert similarity(minhash_signature(text), minhash_signature(text.upper())) == 1.0
+
+    # Changing 1 word in 200 leaves about 0.95 of the shingles shared
+    changed = words(1000, 1)
+    for i in range(0, 1000, 200):
+        changed[i] = 'changed'
+    estimate = similarity(minhash_signature(text), minhash_signature(' '.join(changed)))
+    assert 0.85 <= estimate <= 1.0
+    assert similarity(minhash_signature(text), minhash_signature(' '.join(words(1000, 2)))) < 0.1
+
+
+def test_index_threshold():
+    index = NearDuplicateIndex(threshold=0.9)
+    base = words(1000, 3)
+    assert index.check('base', ' '.join(base)) is None
+
+    near = list(base)
+    near[500] = 'changed'
+    assert index.check('near', ' '.join(near)) == 'base'
+
+    # Half the words replaced is well below the threshold
+    far = base[:500] + words(500, 4)
+    assert index.check('far', ' '.join(far)) is None
+    assert len(index) == 2
+    assert index.check('empty', '') is None
+    assert len(index) == 2
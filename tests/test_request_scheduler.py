@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+from email.utils import formatdate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import request_scheduler
+from request_scheduler import (RequestScheduler, RobotsCache, RobotsDisallowed, parse_crawl_delays,
+                               retry_after_seconds)
+
+ROBOTS = """User-agent: *
+Disallow: /private/
+Crawl-delay: 0.5
+
+User-agent: slowbot
+Crawl-delay: 10
+"""
+
+
+def make_response(status=200, text='', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers or {})
+    response._content = text.encode('utf-8')
+    response._content_consumed = True
+    response.encoding = 'utf-8'
+    return response
+
+
+def robots_fetch(status=200, text=ROBOTS):
+    def fetch(url, timeout=None):
+        return make_response(status, text)
+    return fetch
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(make_response(503)) is None
+    assert retry_after_seconds(make_response(503, headers={'Retry-After': '120'})) == 120
+    assert retry_after_seconds(make_response(503, headers={'Retry-After': 'soon'})) is None
+    later = retry_after_seconds(make_response(503, headers={'Retry-After': formatdate(time.time() + 60, usegmt=True)}))
+    assert 55 <= later <= 60
+    earlier = retry_after_seconds(make_response(503, headers={'Retry-After': formatdate(time.time() - 60, usegmt=True)}))
+    assert earlier == 0.0
+
+
+def test_parse_crawl_delays():
+    assert parse_crawl_delays(ROBOTS.splitlines()) == {'*': 0.5, 'slowbot': 10.0}
+
+
+def test_robots_rules():
+    robots = RobotsCache(robots_fetch())
+    assert robots.allowed('https://example.com/page', 'crawler/1.0')
+    assert not robots.allowed('https://example.com/private/page', 'crawler/1.0')
+    assert robots.crawl_delay('https://example.com/', 'crawler/1.0') == 0.5
+    assert robots.crawl_delay('https://example.com/', 'SlowBot/2.0') == 10.0
+
+
+@pytest.mark.parametrize('status, allowed', [(404, True), (401, False), (403, False)])
+def test_robots_status(status, allowed):
+    robots = RobotsCache(robots_fetch(status, ''))
+    assert robots.allowed('https://example.com/page', '*') is allowed
+
+
+def test_robots_unreachable():
+    def fetch(url, timeout=None):
+        raise requests.ConnectionError(url)
+    assert RobotsCache(fetch).allowed('https://example.com/page', '*')
+
+
+def scheduler(monkeypatch, sleeps, **kwargs):
+    # Sleeps are recorded and move a fake clock on instead of waiting
+    clock = [time.monotonic()]
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr(request_scheduler.time, 'sleep', sleep)
+    monkeypatch.setattr(request_scheduler.time, 'monotonic', lambda: clock[0])
+    scheduler = RequestScheduler(rate=1000, burst=100, max_rate=1000, **kwargs)
+    scheduler.robots = RobotsCache(robots_fetch(404, ''))
+    return scheduler
+
+
+def test_retry_after_honored(monkeypatch):
+    sleeps = []
+    responses = [make_response(429, headers={'Retry-After': '30'}), make_response(200)]
+    response = scheduler(monkeypatch, sleeps, backoff=0.01).send(
+        requests.Session(), 'GET', 'https://example.com/', lambda: responses.pop(0))
+    assert response.status_code == 200
+    assert sleeps == [30.0]
+
+
+def test_retry_after_capped(monkeypatch):
+    sleeps = []
+    responses = [make_response(503, headers={'Retry-After': '3600'}), make_response(200)]
+    scheduler(monkeypatch, sleeps, max_retry_after=60).send(
+        requests.Session(), 'GET', 'https://example.com/', lambda: responses.pop(0))
+    assert sleeps[0] == 60.0
+
+
+def test_retries_give_up(monkeypatch):
+    sleeps = []
+    sent = []
+
+    def send():
+        sent.append(1)
+        return make_response(500)
+    response = scheduler(monkeypatch, sleeps, max_retries=2, backoff=0.01).send(
+        requests.Session(), 'GET', 'https://example.com/', send)
+    assert response.status_code == 500
+    assert len(sent) == 3
+
+
+def test_robots_disallowed(monkeypatch):
+    sleeps = []
+    polite = scheduler(monkeypatch, sleeps)
+    polite.robots = RobotsCache(robots_fetch())
+    with pytest.raises(RobotsDisallowed):
+        polite.send(requests.Session(), 'GET', 'https://example.com/private/x', lambda: make_response())
+    # Crawl-delay: 0.5 limits the host to 2 requests a second
+    assert polite.bucket('https://example.com/', requests.Session()).rate == 2.0
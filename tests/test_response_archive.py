@@ -0,0 +1,101 @@
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from response_archive import ResponseArchive, index_path, read_index, read_record, scan_archive
+
+
+def make_response(body, content_type='text/html; charset=utf-8', status=200, reason='OK'):
+    response = Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type, 'Content-Encoding': 'gzip',
+                                            'ETag': '"abc"'})
+    response._content = body
+    return response
+
+
+PAGES = [
+    ('https://example.com/', make_response('<p>héllo</p>'.encode('utf-8')), '<p>héllo</p>'),
+    ('https://example.com/missing', make_response(b'gone', 'text/plain', 404, 'Not Found'), 'gone'),
+    ('https://example.com/latin', make_response('<p>café</p>'.encode('latin-1'), 'text/html; charset=iso-8859-1'),
+     '<p>café</p>'),
+]
+
+
+def write_archive(path):
+    with ResponseArchive(path) as archive:
+        for url, response, _ in PAGES:
+            archive.write(url, response)
+    return archive
+
+
+def test_write_and_read(tmp_path):
+    path = str(tmp_path / 'crawl.warc.gz')
+    archive = write_archive(path)
+    assert archive.records == 3
+
+    entries = read_index(path)
+    assert [(url, status) for url, _, _, status, _ in entries] == \
+        [('https://example.com/', 200), ('https://example.com/missing', 404), ('https://example.com/latin', 200)]
+    with open(path, 'rb') as f:
+        for (url, offset, length, status, content_type), (_, original, text) in zip(entries, PAGES):
+            record = read_record(f, offset, length)
+            assert record.url == url
+            assert record.body == original.content
+            assert record.headers['ETag'] == '"abc"'
+            # The body is stored decoded, so the transfer headers are dropped
+            assert 'Content-Encoding' not in record.headers
+            response = record.to_response()
+            # Decoded with the charset the page was served with
+            assert response.text == text
+            assert response.from_archive
+
+    # Each record is a gzip member of its own, so the whole file is one gzip stream too
+    with gzip.open(path, 'rb') as f:
+        assert f.read().count(b'WARC/1.1\r\n') == 3
+
+
+def test_scan_matches_index(tmp_path):
+    path = str(tmp_path / 'crawl.warc.gz')
+    write_archive(path)
+    scanned = [(record.url, offset, length) for offset, length, record in scan_archive(path)]
+    assert scanned == [(url, offset, length) for url, offset, length, _, _ in read_index(path)]
+
+
+def test_append(tmp_path):
+    path = str(tmp_path / 'crawl.warc.gz')
+    write_archive(path)
+    with ResponseArchive(path, append=True) as archive:
+        archive.write('https://example.com/more', make_response(b'<p>more</p>'))
+    assert [entry[0] for entry in read_index(path)][-2:] == ['https://example.com/latin', 'https://example.com/more']
+
+
+def test_index_rebuilt(tmp_path):
+    path = str(tmp_path / 'crawl.warc.gz')
+    write_archive(path)
+    expected = read_index(path)
+
+    os.remove(index_path(path))
+    assert read_index(path) == expected
+    assert os.path.exists(index_path(path))
+
+    # An index that stops short of the archive, as after an interrupted crawl
+    with open(index_path(path), 'w') as f:
+        f.write('\t'.join(map(str, expected[0])) + '\n')
+    assert read_index(path) == expected
+
+
+def test_truncated_record_skipped(tmp_path):
+    path = str(tmp_path / 'crawl.warc.gz')
+    write_archive(path)
+    entries = read_index(path)
+    with open(path, 'r+b') as f:
+        f.truncate(entries[-1][1] + entries[-1][2] // 2)
+    os.remove(index_path(path))
+    assert [entry[0] for entry in read_index(path)] == ['https://example.com/', 'https://example.com/missing']
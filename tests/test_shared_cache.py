@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Web_to_Single_HTML_File_Spider as spider
+from http_cache import HttpCache
+from request_scheduler import RequestScheduler, set_default_scheduler
+from synthetic_site import SyntheticSite
+
+
+def crawl(site, **kwargs):
+    pages = spider.create_sitemap(site.url, spider.CrawlOptions(language_detector='langdetect', **kwargs))
+    return sorted((url, str(content)) for url, content in pages)
+
+
+def test_cache_shared_between_crawl_modes(tmp_path):
+    set_default_scheduler(RequestScheduler(rate=1000, burst=200, max_rate=2000))
+    cache_dir = str(tmp_path / 'cache')
+    with SyntheticSite(pages=60, languages={'en': 1.0}) as site:
+        uncached = crawl(site)
+        # A sitemap crawl follows no links, so its cached results hold none
+        crawl(site, use_existing_sitemap=True, cache_dir=cache_dir)
+        assert crawl(site, cache_dir=cache_dir) == uncached
+        assert crawl(site, cache_dir=cache_dir, near_duplicate_threshold=0.9) == \
+            crawl(site, near_duplicate_threshold=0.9)
+
+
+def test_derived_kinds_kept_apart(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    cache.store_derived('https://example.com/', 'links', ['/a', '/b'])
+    assert cache.derived('https://example.com/', 'page') is None
+    assert cache.derived('https://example.com/', 'links') == ['/a', '/b']
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import slurp
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('500', 500),
+    ('500B', 500),
+    ('64KB', 64 * 1024),
+    ('64kb', 64 * 1024),
+    (' 10MB ', 10 * 1024 ** 2),
+    ('1.5GB', int(1.5 * 1024 ** 3)),
+])
+def test_parse_size(value, expected):
+    assert slurp.parse_size(value) == expected
+
+
+@pytest.mark.parametrize('value', ['', 'MB', '10TB', '10K', 'ten'])
+def test_parse_size_rejects(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        slurp.parse_size(value)
+
+
+def test_size_arguments():
+    args = slurp.build_parser().parse_args(['crawl', 'example.com', '--max-bytes', '200MB'])
+    assert args.max_bytes == 200 * 1024 ** 2
+    assert args.max_page_size == 5 * 1024 ** 2
+    with pytest.raises(SystemExit):
+        slurp.build_parser().parse_args(['crawl', 'example.com', '--max-bytes', 'lots'])
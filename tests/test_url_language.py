@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from url_language import UrlLanguageClassifier, classify_url
+
+# What is_likely_english_url, which classify_url replaced, returned for these URLs
+BASELINE = [
+    ('https://en.example.com/x', True),
+    ('https://fr.example.com/x', False),
+    ('https://example.com/de/x', False),
+    ('https://example.com/en-gb/', True),
+    ('https://example.com/EN/page', None),
+    ('https://example.com/a?lang=fr', False),
+    ('https://example.com/a?locale=en_US', True),
+    ('https://example.com/a?language=de-DE', None),
+    ('https://example.co.uk/x', True),
+    ('https://example.de/x', False),
+    ('https://example.com.mx/a', None),
+    ('https://example.com/doc-en.pdf', True),
+    ('https://example.com/doc_fr.html', False),
+    ('https://example.com/guide-english.html', True),
+    ('https://example.com/blog/post', None),
+    ('https://example.com/', None),
+    ('https://example.in/', False),
+    ('https://x.y.com/a/b-es.html?lang=xx', False),
+    ('https://www.example.com/about', None),
+    ('https://es.example.mx/', False),
+    ('https://example.com/fr', False),
+    ('https://example.com/french/x', None),
+]
+
+
+@pytest.mark.parametrize('url, expected', BASELINE)
+def test_classify_url_matches_baseline(url, expected):
+    assert classify_url(url) is expected
+
+
+def test_classify_batch_matches_classify_url():
+    urls = [url for url, _ in BASELINE]
+    assert UrlLanguageClassifier().classify_batch(urls) == [classify_url(url) for url in urls]
+
+
+def test_learned_prefixes(tmp_path):
+    path = str(tmp_path / 'languages.json')
+    classifier = UrlLanguageClassifier(path, min_pages=3)
+    for i in range(3):
+        classifier.record(f'https://example.com/intl/news/{i}.html', False, 'content')
+    # Pages decided by their URL teach nothing
+    classifier.record('https://example.com/blog/a.html', False, 'url')
+    assert classifier.classify('https://example.com/intl/other.html') is False
+    assert classifier.classify('https://example.com/blog/b.html') is None
+    # The fixed patterns still come first
+    assert classifier.classify('https://example.com/intl/page-en.html') is True
+    classifier.save()
+    assert UrlLanguageClassifier(path, min_pages=3).classify('https://example.com/intl/x.html') is False
+
+    classifier.record('https://example.com/intl/news/english.html', True, 'html_tag')
+    assert classifier.classify('https://example.com/intl/news/x.html') is None
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import parse_qs, urlparse
+
+# Language codes and names as they appear in subdomains, first path segments and query parameters
+ENGLISH_SUBDOMAINS = frozenset(['en', 'eng', 'english'])
+NON_ENGLISH_SUBDOMAINS = frozenset(['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl',
+                                    'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he',
+                                    'id', 'vi', 'uk', 'hi', 'espanol', 'francais', 'deutsch'])
+ENGLISH_PATH_PREFIXES = frozenset(['en', 'eng', 'english', 'en-us', 'en-gb', 'en-au', 'en-ca'])
+NON_ENGLISH_PATH_PREFIXES = frozenset(['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl',
+                                       'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he',
+                                       'id', 'vi', 'uk', 'hi', 'es-mx', 'fr-ca', 'pt-br'])
+NON_ENGLISH_PARAMS = frozenset(['es', 'fr', 'de', 'it', 'ru', 'zh', 'ja', 'ko', 'pt', 'ar', 'nl',
+                                'sv', 'da', 'no', 'fi', 'pl', 'tr', 'cs', 'hu', 'th', 'el', 'he',
+                                'id', 'vi', 'uk', 'hi'])
+LANGUAGE_PARAMS = ('lang', 'locale', 'language')
+
+# Country TLDs, without the dot
+ENGLISH_TLDS = frozenset(['us', 'uk', 'ca', 'au', 'nz', 'ie', 'za'])
+NON_ENGLISH_TLDS = frozenset(['mx', 'es', 'fr', 'de', 'it', 'ru', 'cn', 'jp', 'kr', 'br', 'pt',
+                              'sa', 'nl', 'se', 'dk', 'no', 'fi', 'pl', 'tr', 'cz', 'hu', 'th',
+                              'gr', 'il', 'id', 'vn', 'ua', 'in'])
+
+# Language suffixes in file names: report-en.pdf, page_fr.html
+ENGLISH_FILENAME = re.compile(r'[-_]en\.|-english\.')
+NON_ENGLISH_FILENAME = re.compile(r'[-_](?:es|fr|de|it|ru|zh|ja|ko|pt)\.')
+
+# Pages under one path prefix that must come back non-English, with none
+# English, before the rest of the prefix is skipped unfetched
+LEARN_MIN_PAGES = 5
+
+# Path segments in the longest prefix learned: /news/ and /news/fr-articles/
+LEARN_MAX_DEPTH = 2
+
+# Where a crawl's verdict on a page comes from, and whether it can be learned from
+LEARNED_SOURCES = ('html_tag', 'content')
+
+
+@lru_cache(maxsize=1024)
+def tld_language(netloc):
+    """True, False or None from a host's country TLD"""
+    labels = netloc.rsplit('@', 1)[-1].split(':', 1)[0].split('.')
+    if labels[-1] in ENGLISH_TLDS:
+        return True
+    # example.com.mx is usually a Spanish-speaking market's copy of an English site
+    if labels[-1] in NON_ENGLISH_TLDS and not (len(labels) > 2 and labels[-2] == 'com'):
+        return False
+    return None
+
+
+def classify_url(url):
+    """
+    Whether a URL is likely to point to English content from its patterns
+    alone: True, False, or None when the URL does not tell
+    """
+    parsed = urlparse(url)
+    path = parsed.path.strip('/')
+    first, _, _ = path.partition('/')
+
+    netloc = parsed.netloc.lower()
+    subdomain = netloc.split('.', 1)[0]
+    if subdomain in ENGLISH_SUBDOMAINS:
+        return True
+    if subdomain in NON_ENGLISH_SUBDOMAINS:
+        return False
+
+    if first in ENGLISH_PATH_PREFIXES:
+        return True
+    if first in NON_ENGLISH_PATH_PREFIXES:
+        return False
+
+    if parsed.query:
+        params = parse_qs(parsed.query)
+        for name in LANGUAGE_PARAMS:
+            for value in params.get(name, ()):
+                value = value.lower()
+                if value.startswith('en') or value == 'english':
+                    return True
+                if value in NON_ENGLISH_PARAMS:
+                    return False
+
+    language = tld_language(netloc)
+    if language is not None:
+        return language
+
+    if path:
+        filename = path.rsplit('/', 1)[-1]
+        if ENGLISH_FILENAME.search(filename):
+            return True
+        if NON_ENGLISH_FILENAME.search(filename):
+            return False
+    return None
+
+
+def path_prefixes(url, max_depth=LEARN_MAX_DEPTH):
+    """/a/ and /a/b/ for https://host/a/b/c.html; never the site root or the page itself"""
+    segments = urlparse(url).path.strip('/').split('/')[:-1]
+    return ['/' + '/'.join(segments[:depth]) + '/' for depth in range(1, min(len(segments), max_depth) + 1)]
+
+
+class UrlLanguageClassifier:
+    """
+    URL language classifier for one crawl: classify_url's fixed patterns, plus
+    path prefixes learned as the crawl goes. Once min_pages pages under a
+    prefix have been found non-English by their HTML lang tags or content,
+    and none English, its other URLs are classified non-English too, so they
+    are never downloaded. With a path, the learned prefixes are loaded from
+    and saved to a JSON file, so the next crawl of the domain starts with them.
+    """
+
+    def __init__(self, path=None, min_pages=LEARN_MIN_PAGES, max_depth=LEARN_MAX_DEPTH):
+        self.path = path
+        self.min_pages = min_pages
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        # prefix -> [English pages, non-English pages]
+        self.prefixes = {}
+        self.blocked = set()
+        self.stats = Counter()
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for prefix, counts in saved.get('prefixes', {}).items():
+            self.prefixes[prefix] = list(counts)
+            self._decide(prefix)
+        if self.blocked:
+            print(f"Skipping {len(self.blocked)} path prefixes learned to be non-English: "
+                  f"{', '.join(sorted(self.blocked)[:5])}{' ...' if len(self.blocked) > 5 else ''}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps({'min_pages': self.min_pages, 'prefixes': self.prefixes})
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+
+    def _decide(self, prefix):
+        english, non_english = self.prefixes[prefix]
+        if english == 0 and non_english >= self.min_pages:
+            self.blocked.add(prefix)
+        else:
+            self.blocked.discard(prefix)
+
+    def learned(self, url):
+        """False when the URL is under a prefix learned to be non-English, else None"""
+        if not self.blocked:
+            return None
+        for prefix in path_prefixes(url, self.max_depth):
+            if prefix in self.blocked:
+                return False
+        return None
+
+    def classify(self, url):
+        """classify_url, falling back on the learned prefixes when the patterns do not tell"""
+        language = classify_url(url)
+        if language is None:
+            language = self.learned(url)
+            if language is False:
+                with self._lock:
+                    self.stats['learned'] += 1
+        return language
+
+    def classify_batch(self, urls):
+        """classify for each of a list of URLs, e.g. a batch read from a sitemap"""
+        results = [classify_url(url) for url in urls]
+        if self.blocked:
+            learned = 0
+            for i, url in enumerate(urls):
+                if results[i] is None and self.learned(url) is False:
+                    results[i] = False
+                    learned += 1
+            with self._lock:
+                self.stats['learned'] += learned
+        return results
+
+    def record(self, url, is_english, source):
+        """Learn from a page whose language was decided by source, 'html_tag' or 'content'"""
+        if source not in LEARNED_SOURCES:
+            return
+        with self._lock:
+            for prefix in path_prefixes(url, self.max_depth):
+                counts = self.prefixes.setdefault(prefix, [0, 0])
+                counts[0 if is_english else 1] += 1
+                was_blocked = prefix in self.blocked
+                self._decide(prefix)
+                if prefix in self.blocked and not was_blocked:
+                    self.stats['prefixes_learned'] += 1